@@ -1,19 +1,51 @@
 
 import os
+import json
+import base64
 import traceback
 import time
 import uuid
+import hashlib
+import re
+import tempfile
+import mimetypes
+import csv
+import io
+import unicodedata
+import queue
+import zlib
+import heapq
+import select
+import itertools
 import psycopg2
-import psycopg2.pool
 import psycopg2.extras
+import psycopg2.extensions
 import bcrypt
 import secrets
-from flask import Flask, request, jsonify, g, send_from_directory
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from flask import Flask, Response, request, jsonify, g, send_file
 from flask_cors import CORS
 from functools import wraps
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
+from urllib.parse import quote
 import datetime
 from flask.json.provider import DefaultJSONProvider
+from migraciones import pending_migrations, VERSIONED_TABLES, VERSIONS_CHANNEL
+
+try:
+    import orjson
+except ImportError:  # opcional: sin orjson se usa el encoder estándar
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # opcional: sin brotli sólo se ofrece gzip
+    brotli = None
 
 # -----------------------
 # CONFIGURACIÓN
@@ -33,7 +65,44 @@ class CustomJSONProvider(DefaultJSONProvider):
             return obj.isoformat()
         return super().default(obj)
 
-app.json = CustomJSONProvider(app)
+    def _timed(self, encode, *args, **kwargs):
+        t = current_timings.get()
+        if t is None:
+            return encode(*args, **kwargs)
+        t0 = time.perf_counter()
+        try:
+            return encode(*args, **kwargs)
+        finally:
+            t.serialize += time.perf_counter() - t0
+
+    def dumps(self, obj, **kwargs):
+        return self._timed(super().dumps, obj, **kwargs)
+
+class OrjsonJSONProvider(CustomJSONProvider):
+    """
+    Mismo formato con orjson: date, datetime y UUID se codifican en C sin pasar
+    por default(), que queda sólo para Decimal y otros tipos raros (como en
+    Flask). Las claves salen en el orden de las columnas del SELECT y la
+    respuesta se arma directo en bytes, sin pasar por str.
+    """
+    sort_keys = False
+
+    def _encode(self, obj):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS)
+
+    def dumps(self, obj, **kwargs):
+        return self._timed(self._encode, obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s) if not kwargs else super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._timed(self._encode, obj) + b"\n", mimetype=self.mimetype)
+
+# JSON_BACKEND=stdlib fuerza el encoder estándar aunque orjson esté instalado
+JSON_BACKEND = os.getenv("JSON_BACKEND", "orjson")
+app.json = OrjsonJSONProvider(app) if orjson is not None and JSON_BACKEND == "orjson" else CustomJSONProvider(app)
 
 # Configurar Uploads
 UPLOAD_FOLDER = os.path.join(os.getcwd(), 'uploads')
@@ -41,24 +110,303 @@ if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
-CORS(app)
+EXPOSED_HEADERS = ["X-Data-Version", "X-Cache", "X-Sync-Token"]
+CORS(app, expose_headers=EXPOSED_HEADERS)
 
 print("Backend GWP (Gestión Consultorías) iniciando...")
 
 # Pool de conexiones
 connection_pool = None
-active_sessions = {} # { token: user_id }
+
+# -----------------------
+# MÉTRICAS: TIEMPOS POR REQUEST
+# -----------------------
+# Cada request lleva un RequestTimings (en un ContextVar, uno por thread) que
+# acumulan el pool, los cursores, el proveedor JSON y la compresión: espera
+# por conexión, ejecución SQL, lectura de filas, serialización y compresión.
+# Fuera de un request (bench, indexer.py) el ContextVar está vacío y los
+# cursores no miden nada.
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))  # 0 = sin log de requests lentos
+SLOW_LOG_MAX_STATEMENTS = 50
+SLOW_LOG_PARAMS_CHARS = 500
+
+class RequestTimings:
+    __slots__ = ("pool_wait", "sql", "fetch", "serialize", "compress", "queries", "rows", "statements")
+
+    def __init__(self, keep_statements=False):
+        self.pool_wait = self.sql = self.fetch = self.serialize = self.compress = 0.0
+        self.queries = self.rows = 0
+        # El texto SQL sólo se guarda si el log de lentos está activo
+        self.statements = [] if keep_statements else None
+
+    def add_query(self, query, params, elapsed):
+        self.sql += elapsed
+        self.queries += 1
+        if self.statements is not None and len(self.statements) < SLOW_LOG_MAX_STATEMENTS:
+            self.statements.append((query, params, elapsed))
+
+current_timings = contextvars.ContextVar("current_timings", default=None)
+
+_timed_cursor_classes = {}
+
+def timed_cursor_class(base):
+    """Subclase de base (cursor, DictCursor, RealDictCursor...) que cronometra execute/fetch."""
+    cls = _timed_cursor_classes.get(base)
+    if cls is not None:
+        return cls
+
+    class TimedCursor(base):
+        def execute(self, query, vars=None):
+            t = current_timings.get()
+            if t is None:
+                return super().execute(query, vars)
+            t0 = time.perf_counter()
+            try:
+                return super().execute(query, vars)
+            finally:
+                t.add_query(query, vars, time.perf_counter() - t0)
+
+        def executemany(self, query, vars_list):
+            t = current_timings.get()
+            if t is None:
+                return super().executemany(query, vars_list)
+            t0 = time.perf_counter()
+            try:
+                return super().executemany(query, vars_list)
+            finally:
+                t.add_query(query, "<executemany>", time.perf_counter() - t0)
+
+        def copy_expert(self, sql, file, size=8192):
+            t = current_timings.get()
+            if t is None:
+                return super().copy_expert(sql, file, size)
+            t0 = time.perf_counter()
+            try:
+                return super().copy_expert(sql, file, size)
+            finally:
+                t.add_query(sql, None, time.perf_counter() - t0)
+
+        def _timed_fetch(self, fetch, *args):
+            t = current_timings.get()
+            if t is None:
+                return fetch(*args)
+            t0 = time.perf_counter()
+            result = fetch(*args)
+            t.fetch += time.perf_counter() - t0
+            if isinstance(result, list):
+                t.rows += len(result)
+            elif result is not None:
+                t.rows += 1
+            return result
+
+        def fetchone(self):
+            return self._timed_fetch(super().fetchone)
+
+        def fetchmany(self, size=None):
+            return self._timed_fetch(super().fetchmany, size if size is not None else self.arraysize)
+
+        def fetchall(self):
+            return self._timed_fetch(super().fetchall)
+
+    TimedCursor.__name__ = f"Timed{base.__name__}"
+    _timed_cursor_classes[base] = TimedCursor
+    return TimedCursor
+
+class TimedConnection(psycopg2.extensions.connection):
+    """Conexión del pool: todo cursor que abre es un TimedCursor del tipo pedido."""
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get("cursor_factory") or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs["cursor_factory"] = timed_cursor_class(base)
+        return super().cursor(*args, **kwargs)
 
 # -----------------------
 # DATABASE POOL
 # -----------------------
+# Pool propio sobre psycopg2: cuando están todas las conexiones en uso la
+# petición espera hasta DB_POOL_TIMEOUT en vez de fallar con PoolError; las
+# conexiones que vuelven con una transacción abierta o fallida se limpian con
+# rollback; las que pasaron mucho tiempo ociosas se validan con un SELECT 1 y
+# las que superan DB_POOL_MAX_LIFETIME se reciclan.
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_IDLE_CHECK = float(os.getenv("DB_POOL_IDLE_CHECK", "30"))
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "3600"))
+
+class PoolTimeout(Exception):
+    pass
+
+class Histogram:
+    """Histograma acumulable (buckets en segundos) para métricas internas."""
+    def __init__(self, buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {"buckets": list(self.buckets), "counts": list(self.counts),
+                    "sum": self.sum, "count": self.count}
+
+class ConnectionPool:
+    def __init__(self, dsn, minconn, maxconn, timeout):
+        self.dsn = dsn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.cond = threading.Condition()
+        self.idle = deque()       # (conn, devuelta_en)
+        self.born = {}            # id(conn) -> creada_en
+        self.checked_out = {}     # id(conn) -> tomada_en
+        self.size = 0
+        self.waiting = 0
+        self.counters = {"checkouts": 0, "timeouts": 0, "created": 0, "recycled": 0,
+                         "broken": 0, "rollbacks": 0}
+        self.wait_time = Histogram()
+        self.checkout_duration = Histogram()
+        for _ in range(minconn):
+            conn = self._connect()
+            self.idle.append((conn, time.monotonic()))
+            self.size += 1
+            self.counters["created"] += 1
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, connection_factory=TimedConnection)
+        self.born[id(conn)] = time.monotonic()
+        return conn
+
+    def _discard(self, conn):
+        self.born.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < DB_POOL_IDLE_CHECK:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        conn = None
+        with self.cond:
+            while True:
+                if self.idle:
+                    conn, idle_since = self.idle.pop()
+                    break
+                if self.size < self.maxconn:
+                    self.size += 1  # reservar el lugar; conectar fuera del lock
+                    idle_since = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.counters["timeouts"] += 1
+                    raise PoolTimeout(f"Sin conexiones libres tras {timeout:.1f}s")
+                self.waiting += 1
+                try:
+                    self.cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+
+        try:
+            if conn is not None and not self._healthy(conn, idle_since):
+                with self.cond:
+                    self.counters["broken"] += 1
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+                with self.cond:
+                    self.counters["created"] += 1
+        except Exception:
+            with self.cond:
+                self.size -= 1
+                self.cond.notify()
+            raise
+
+        now = time.monotonic()
+        self.wait_time.observe(now - start)
+        with self.cond:
+            self.counters["checkouts"] += 1
+            self.checked_out[id(conn)] = now
+        return conn
+
+    def putconn(self, conn):
+        taken_at = self.checked_out.pop(id(conn), None)
+        if taken_at is not None:
+            self.checkout_duration.observe(time.monotonic() - taken_at)
+
+        keep = not conn.closed
+        rolled_back = recycled = False
+        if keep and conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            # Transacción abierta o fallida: no contaminar al siguiente usuario
+            try:
+                conn.rollback()
+                rolled_back = True
+            except psycopg2.Error:
+                keep = False
+        if keep and time.monotonic() - self.born.get(id(conn), 0) > DB_POOL_MAX_LIFETIME:
+            recycled = True
+            keep = False
+
+        with self.cond:
+            self.counters["rollbacks"] += rolled_back
+            self.counters["recycled"] += recycled
+            if keep:
+                self.idle.append((conn, time.monotonic()))
+            else:
+                self._discard(conn)
+                self.size -= 1
+            self.cond.notify()
+
+    def stats(self):
+        with self.cond:
+            return {
+                "size": self.size,
+                "max": self.maxconn,
+                "idle": len(self.idle),
+                "in_use": len(self.checked_out),
+                "waiting": self.waiting,
+                **self.counters,
+                "wait_time": self.wait_time.snapshot(),
+                "checkout_duration": self.checkout_duration.snapshot(),
+            }
+
+    def closeall(self):
+        with self.cond:
+            while self.idle:
+                self._discard(self.idle.pop()[0])
+                self.size -= 1
+
 def init_connection_pool():
     global connection_pool
     try:
-        connection_pool = psycopg2.pool.ThreadedConnectionPool(
-            minconn=1,
-            maxconn=10,
-            dsn=DB_CONNECTION_STRING
+        connection_pool = ConnectionPool(
+            DB_CONNECTION_STRING,
+            minconn=DB_POOL_MIN,
+            maxconn=DB_POOL_MAX,
+            timeout=DB_POOL_TIMEOUT
         )
         print("Pool de conexiones DB inicializado.")
     except Exception as e:
@@ -67,50 +415,1126 @@ def init_connection_pool():
 def get_db_connection():
     if not connection_pool:
         init_connection_pool()
-    return connection_pool.getconn()
+    if not connection_pool:
+        raise PoolTimeout("Pool de conexiones no disponible")
+    t = current_timings.get()
+    if t is None:
+        return connection_pool.getconn()
+    t0 = time.perf_counter()
+    try:
+        return connection_pool.getconn()
+    finally:
+        t.pool_wait += time.perf_counter() - t0
 
 def release_db_connection(conn):
     if connection_pool and conn:
         connection_pool.putconn(conn)
 
+@contextmanager
+def db_connection():
+    """Toma una conexión del pool y la devuelve (con rollback si quedó sucia) al salir."""
+    conn = get_db_connection()
+    try:
+        yield conn
+    finally:
+        release_db_connection(conn)
+
 init_connection_pool()
 
+# -----------------------
+# ERRORES
+# -----------------------
+def error_response(e):
+    """Respuesta JSON para una excepción capturada en un handler."""
+    if isinstance(e, InvalidParameter):
+        return jsonify({"error": str(e)}), 400
+    if isinstance(e, (PoolTimeout, PasswordBusy)):
+        # Saturación: que el cliente reintente en vez de tratarlo como fallo
+        resp = jsonify({"error": str(e)})
+        resp.status_code = 503
+        resp.headers["Retry-After"] = "1"
+        return resp
+    return jsonify({"error": str(e)}), 500
+
+# -----------------------
+# SESIONES
+# -----------------------
+# Las sesiones viven en un almacén compartido (Postgres por defecto, Redis
+# opcional) para sobrevivir reinicios y poder repartirse entre workers. Delante
+# hay una caché local LRU+TTL: validar un token es una búsqueda en memoria y
+# sólo va al almacén cuando la entrada local vence. La expiración es deslizante
+# y los "visto por última vez" se acumulan y se escriben en lote cada
+# SESSION_TOUCH_INTERVAL segundos, no en cada request. Cuándo se extendió por
+# última vez se deduce de expires_at (= extensión + SESSION_TTL), así vale
+# igual para una entrada recién leída del almacén que para una de la caché.
+# Un logout en otro worker puede tardar hasta SESSION_CACHE_TTL en verse aquí.
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "postgres")  # postgres | redis | memory
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(12 * 3600)))
+SESSION_CACHE_TTL = int(os.getenv("SESSION_CACHE_TTL", "30"))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+SESSION_TOUCH_INTERVAL = int(os.getenv("SESSION_TOUCH_INTERVAL", "20"))
+SESSION_TICKET_TTL = int(os.getenv("SESSION_TICKET_TTL", "30"))
+if SESSION_TOUCH_INTERVAL >= SESSION_CACHE_TTL:
+    # Si no, una sesión activa podría pasar un intervalo completo sólo con aciertos de caché
+    print(f"AVISO: SESSION_TOUCH_INTERVAL ({SESSION_TOUCH_INTERVAL}) debe ser menor que "
+          f"SESSION_CACHE_TTL ({SESSION_CACHE_TTL}): se usa {max(1, SESSION_CACHE_TTL // 2)}")
+    SESSION_TOUCH_INTERVAL = max(1, SESSION_CACHE_TTL // 2)
+
+def hash_token(token):
+    # En el almacén sólo se guarda el hash: una copia de la tabla no sirve para entrar
+    return hashlib.sha256(token.encode()).hexdigest()
+
+class PostgresSessionStore:
+    def create(self, token_hash, user_id, expires_at):
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO sesiones (token_hash, usuario_id, expires_at)
+                VALUES (%s, %s, to_timestamp(%s))
+            """, (token_hash, user_id, expires_at))
+            conn.commit()
+
+    def get(self, token_hash):
+        """(user_id, expires_at) o None si no existe o venció."""
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT usuario_id, extract(epoch FROM expires_at)
+                FROM sesiones WHERE token_hash = %s AND expires_at > now()
+            """, (token_hash,))
+            row = cur.fetchone()
+        return (row[0], float(row[1])) if row else None
+
+    def delete(self, token_hash):
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM sesiones WHERE token_hash = %s", (token_hash,))
+            conn.commit()
+
+    def create_ticket(self, ticket_hash, token_hash, expires_at):
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO tickets_sesion (ticket_hash, token_hash, expires_at)
+                VALUES (%s, %s, to_timestamp(%s))
+            """, (ticket_hash, token_hash, expires_at))
+            conn.commit()
+
+    def consume_ticket(self, ticket_hash):
+        """token_hash de la sesión del ticket, o None; el ticket se borra igual."""
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                DELETE FROM tickets_sesion WHERE ticket_hash = %s
+                RETURNING token_hash, expires_at > now()
+            """, (ticket_hash,))
+            row = cur.fetchone()
+            conn.commit()
+        return row[0] if row and row[1] else None
+
+    def touch_many(self, touches):
+        """touches: {token_hash: nuevo expires_at}. Una sola sentencia."""
+        with db_connection() as conn, conn.cursor() as cur:
+            psycopg2.extras.execute_values(cur, """
+                UPDATE sesiones AS s
+                SET last_seen_at = now(), expires_at = to_timestamp(v.expires_at)
+                FROM (VALUES %s) AS v(token_hash, expires_at)
+                WHERE s.token_hash = v.token_hash
+            """, list(touches.items()), template="(%s, %s::double precision)",
+                page_size=len(touches))
+            cur.execute("DELETE FROM sesiones WHERE expires_at < now()")
+            cur.execute("DELETE FROM tickets_sesion WHERE expires_at < now()")
+            conn.commit()
+
+class RedisSessionStore:
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def _key(self, token_hash):
+        return f"gwp:sesion:{token_hash}"
+
+    def create(self, token_hash, user_id, expires_at):
+        self.client.set(self._key(token_hash), user_id, exat=int(expires_at))
+
+    def get(self, token_hash):
+        pipe = self.client.pipeline()
+        pipe.get(self._key(token_hash))
+        pipe.ttl(self._key(token_hash))
+        user_id, ttl = pipe.execute()
+        if user_id is None or ttl < 0:
+            return None
+        return int(user_id), time.time() + ttl
+
+    def delete(self, token_hash):
+        self.client.delete(self._key(token_hash))
+
+    def create_ticket(self, ticket_hash, token_hash, expires_at):
+        self.client.set(f"gwp:ticket:{ticket_hash}", token_hash, exat=int(expires_at))
+
+    def consume_ticket(self, ticket_hash):
+        # MULTI/EXEC: leer y borrar en un paso, así sólo un request lo usa
+        pipe = self.client.pipeline()
+        pipe.get(f"gwp:ticket:{ticket_hash}")
+        pipe.delete(f"gwp:ticket:{ticket_hash}")
+        token_hash, _ = pipe.execute()
+        return token_hash.decode() if token_hash else None
+
+    def touch_many(self, touches):
+        pipe = self.client.pipeline()
+        for token_hash, expires_at in touches.items():
+            pipe.expireat(self._key(token_hash), int(expires_at))
+        pipe.execute()
+
+class MemorySessionStore:
+    """Reemplazo local de Redis (desarrollo o un solo proceso)."""
+    def __init__(self):
+        self.data = {}
+        self.tickets = {}
+        self.lock = threading.Lock()
+
+    def create(self, token_hash, user_id, expires_at):
+        with self.lock:
+            self.data[token_hash] = (user_id, expires_at)
+
+    def get(self, token_hash):
+        with self.lock:
+            entry = self.data.get(token_hash)
+            if entry and entry[1] <= time.time():
+                del self.data[token_hash]
+                entry = None
+        return entry
+
+    def delete(self, token_hash):
+        with self.lock:
+            self.data.pop(token_hash, None)
+
+    def create_ticket(self, ticket_hash, token_hash, expires_at):
+        with self.lock:
+            self.tickets[ticket_hash] = (token_hash, expires_at)
+
+    def consume_ticket(self, ticket_hash):
+        with self.lock:
+            entry = self.tickets.pop(ticket_hash, None)
+            now = time.time()
+            for k in [k for k, v in self.tickets.items() if v[1] <= now]:
+                del self.tickets[k]
+        return entry[0] if entry and entry[1] > now else None
+
+    def touch_many(self, touches):
+        now = time.time()
+        with self.lock:
+            for token_hash, expires_at in touches.items():
+                if token_hash in self.data:
+                    self.data[token_hash] = (self.data[token_hash][0], expires_at)
+            for token_hash in [k for k, v in self.data.items() if v[1] <= now]:
+                del self.data[token_hash]
+
+def make_session_store():
+    if SESSION_BACKEND == "redis":
+        try:
+            return RedisSessionStore(REDIS_URL)
+        except ImportError:
+            print("Paquete redis no instalado: sesiones en memoria local.")
+            return MemorySessionStore()
+    if SESSION_BACKEND == "memory":
+        return MemorySessionStore()
+    return PostgresSessionStore()
+
+class SessionManager:
+    def __init__(self, store):
+        self.store = store
+        self.cache = OrderedDict()  # token_hash -> [user_id, expires_at, cached_until]
+        self.pending = {}           # token_hash -> expires_at a escribir en el almacén
+        self.lock = threading.Lock()
+        self.flusher = None
+
+    def create(self, user_id):
+        token = secrets.token_hex(32)
+        now = time.time()
+        expires_at = now + SESSION_TTL
+        token_hash = hash_token(token)
+        self.store.create(token_hash, user_id, expires_at)
+        with self.lock:
+            self._cache_put(token_hash, user_id, expires_at, now)
+        return token
+
+    def validate(self, token):
+        """user_id si el token es válido (y extiende su expiración), si no None."""
+        return self.validate_hash(hash_token(token))
+
+    def validate_hash(self, token_hash):
+        now = time.time()
+        user_id = self._validate_cached(token_hash, now)
+        if user_id is not None:
+            return user_id
+
+        found = self.store.get(token_hash)
+        with self.lock:
+            if not found:
+                self.cache.pop(token_hash, None)
+                return None
+            user_id, expires_at = found
+            entry = self._cache_put(token_hash, user_id, expires_at, now)
+            self._slide(token_hash, entry, now)
+            return user_id
+
+    def validate_cached(self, token):
+        """
+        Como validate pero sólo con la caché local, sin tocar el almacén: None
+        también si hay que consultarlo. Para el event loop de asgi.py.
+        """
+        return self._validate_cached(hash_token(token), time.time())
+
+    def _validate_cached(self, token_hash, now):
+        with self.lock:
+            entry = self.cache.get(token_hash)
+            if entry and entry[2] > now and entry[1] > now:
+                self.cache.move_to_end(token_hash)
+                self._slide(token_hash, entry, now)
+                return entry[0]
+        return None
+
+    def create_ticket(self, token):
+        """
+        Ticket de un solo uso que vale SESSION_TICKET_TTL segundos por la sesión
+        de token. Para URLs (EventSource no manda headers): el token de sesión
+        no debe quedar en logs de proxies ni en el historial.
+        """
+        ticket = secrets.token_urlsafe(32)
+        self.store.create_ticket(hash_token(ticket), hash_token(token), time.time() + SESSION_TICKET_TTL)
+        return ticket
+
+    def consume_ticket(self, ticket):
+        """token_hash de la sesión del ticket (que deja de servir), o None."""
+        return self.store.consume_ticket(hash_token(ticket))
+
+    def revoke(self, token):
+        token_hash = hash_token(token)
+        with self.lock:
+            self.cache.pop(token_hash, None)
+            self.pending.pop(token_hash, None)
+        self.store.delete(token_hash)
+
+    def _cache_put(self, token_hash, user_id, expires_at, now):
+        # Llamar con self.lock tomado
+        entry = [user_id, expires_at, now + SESSION_CACHE_TTL]
+        self.cache[token_hash] = entry
+        self.cache.move_to_end(token_hash)
+        while len(self.cache) > SESSION_CACHE_SIZE:
+            self.cache.popitem(last=False)
+        return entry
+
+    def _slide(self, token_hash, entry, now):
+        # Como mucho una extensión por sesión y por intervalo de escritura
+        if entry[1] - now > SESSION_TTL - SESSION_TOUCH_INTERVAL:
+            return
+        entry[1] = now + SESSION_TTL
+        self.pending[token_hash] = entry[1]
+        if self.flusher is None or not self.flusher.is_alive():
+            # Se arranca perezosamente para que exista en cada worker tras el fork
+            self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self.flusher.start()
+
+    def flush(self):
+        with self.lock:
+            touches, self.pending = self.pending, {}
+        if touches:
+            try:
+                self.store.touch_many(touches)
+            except Exception:
+                traceback.print_exc()
+                with self.lock:
+                    for k, v in touches.items():
+                        self.pending.setdefault(k, v)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(SESSION_TOUCH_INTERVAL)
+            self.flush()
+
+sessions = SessionManager(make_session_store())
+
 # -----------------------
 # MIDDLEWARE & AUTH
 # -----------------------
+def get_request_token():
+    auth = request.headers.get("Authorization", "")
+    return auth.split(" ")[1] if " " in auth else auth
+
 def session_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        auth = request.headers.get("Authorization", "")
-        token = auth.split(" ")[1] if " " in auth else auth
-        
-        if not token or token not in active_sessions:
+        token = get_request_token()
+        if not token:
+            return jsonify({"message": "Unauthorized"}), 401
+        try:
+            current_user_id = sessions.validate(token)
+        except Exception as e:
+            traceback.print_exc()
+            return error_response(e)
+        if current_user_id is None:
             return jsonify({"message": "Unauthorized"}), 401
             
         # Pasar el user_id a la función
-        current_user_id = active_sessions[token]
         return f(current_user_id, *args, **kwargs)
     return decorated
 
+# -----------------------
+# LISTADOS: PAGINACIÓN KEYSET
+# -----------------------
+# Paginación opcional: sin ?limit ni ?cursor se responde el array completo
+# (comportamiento histórico). Con ellos se responde
+# {"items": [...], "next_cursor": "...", "total": n} y la página siguiente se
+# busca con una comparación de fila sobre las claves de orden (seek), sin OFFSET.
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+
+# Cada orden: (claves, descendente). Clave = (expresión SQL, campo en la fila, tipo SQL).
+# La última clave siempre es el id para que el orden sea total y el cursor estable.
+# fecha_estimada admite NULL: se ordena como 'infinity' (equivale a NULLS LAST).
+ORDER_BY_ID = ((("id", "id", "integer"),), False)
+ORDER_PLAN = ((("p.id", "id", "integer"),), False)
+ORDER_HITOS = ((("COALESCE(h.fecha_estimada, 'infinity'::date)", "fecha_estimada", "date"),
+                ("h.id", "id", "integer")), False)
+ORDER_DOCS = ((("d.created_at", "created_at", "timestamptz"), ("d.id", "id", "integer")), True)
+ORDER_OBS = ((("o.created_at", "created_at", "timestamptz"), ("o.id", "id", "integer")), True)
+ORDER_REPO = ((("r.created_at", "created_at", "timestamptz"), ("r.id", "id", "integer")), True)
+
+class InvalidParameter(ValueError):
+    pass
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token, n_keys):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except Exception:
+        raise InvalidParameter("Cursor inválido")
+    if not isinstance(values, list) or len(values) != n_keys:
+        raise InvalidParameter("Cursor inválido")
+    return values
+
+def get_page_args(args=None):
+    """Lee limit/cursor/total de la query string (o de args). None si el cliente no pagina."""
+    if args is None:
+        args = request.args
+    if "limit" not in args and "cursor" not in args:
+        return None
+    limit = args.get("limit", DEFAULT_PAGE_LIMIT, type=int) or DEFAULT_PAGE_LIMIT
+    return {
+        "limit": max(1, min(limit, MAX_PAGE_LIMIT)),
+        "cursor": args.get("cursor") or None,
+        "total": args.get("total", "").lower() in ("1", "true", "yes"),
+    }
+
+def _cursor_value(row, field):
+    value = row[field]
+    if value is None:
+        return "infinity"
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+def build_list_sql(select_sql, order, conditions=(), params=()):
+    """Compone select_sql (sin WHERE/ORDER BY) con condiciones y orden. Devuelve (query, params)."""
+    keys, descending = order
+    direction = "DESC" if descending else "ASC"
+    query = select_sql
+    if conditions:
+        query += f" WHERE {' AND '.join(conditions)}"
+    query += " ORDER BY " + ", ".join(f"{expr} {direction}" for expr, _, _ in keys)
+    return query, list(params)
+
+def prepare_list_query(select_sql, order, page=None, conditions=(), params=()):
+    """
+    Consultas de query_list sin ejecutarlas: (count_query o None, count_params,
+    query, params). Las usa también el modo ASGI (asgi.py) con asyncpg.
+    """
+    keys, descending = order
+    conditions = list(conditions)
+    params = list(params)
+
+    count_query, count_params = None, ()
+    if page and page["total"]:
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        count_query, count_params = f"SELECT COUNT(*) AS total FROM ({select_sql}{where}) t", tuple(params)
+
+    if page and page["cursor"]:
+        values = decode_cursor(page["cursor"], len(keys))
+        lhs = ", ".join(expr for expr, _, _ in keys)
+        # Los valores viajan como texto y se convierten en SQL: así sirven igual
+        # para psycopg2 y para asyncpg, que no acepta un int o un str donde
+        # infiere un parámetro date/timestamptz
+        rhs = ", ".join(f"%s::text::{sql_type}" for _, _, sql_type in keys)
+        conditions.append(f"({lhs}) {'<' if descending else '>'} ({rhs})")
+        params.extend(str(v) for v in values)
+
+    query, params = build_list_sql(select_sql, order, conditions, params)
+    if page:
+        query += " LIMIT %s"
+        params.append(page["limit"] + 1)
+    return count_query, count_params, query, tuple(params)
+
+def page_result(rows, order, page, total=None):
+    """Sin page, las filas tal cual; con page, el sobre {"items", "next_cursor"[, "total"]}."""
+    if not page:
+        return rows
+    keys, _ = order
+    next_cursor = None
+    if len(rows) > page["limit"]:
+        rows = rows[:page["limit"]]
+        last = rows[-1]
+        next_cursor = encode_cursor([_cursor_value(last, field) for _, field, _ in keys])
+
+    result = {"items": rows, "next_cursor": next_cursor}
+    if total is not None:
+        result["total"] = total
+    return result
+
+def query_list(cur, select_sql, order, page=None, conditions=(), params=()):
+    """
+    Ejecuta select_sql (sin WHERE/ORDER BY) con las condiciones y el orden dados.
+    Sin page devuelve la lista de filas; con page devuelve el sobre paginado.
+    """
+    count_query, count_params, query, params = prepare_list_query(select_sql, order, page, conditions, params)
+    total = None
+    if count_query:
+        cur.execute(count_query, count_params)
+        total = cur.fetchone()["total"]
+    cur.execute(query, params)
+    return page_result(cur.fetchall(), order, page, total)
+
+# -----------------------
+# LISTADOS: STREAMING (CURSOR EN SERVIDOR)
+# -----------------------
+# Con "Accept: application/x-ndjson" o ?stream=1 la lista se lee con un cursor
+# con nombre (DECLARE ... CURSOR) de a STREAM_ITERSIZE filas y se emite a medida
+# que llega, en vez de materializar todo el resultado antes del primer byte.
+STREAM_ITERSIZE = int(os.getenv("STREAM_ITERSIZE", "2000"))
+STREAM_CHUNK_ROWS = 500
+
+def get_stream_format():
+    """'ndjson', 'json' o None según lo que pida el cliente."""
+    if "application/x-ndjson" in request.headers.get("Accept", ""):
+        return "ndjson"
+    if request.args.get("stream", "").lower() in ("1", "true", "yes"):
+        return "json"
+    return None
+
+def release_once(fn):
+    done = []
+
+    def release():
+        if not done:
+            done.append(True)
+            fn()
+    return release
+
+def closing_response(body, release, **kwargs):
+    """
+    Response para un cuerpo en streaming que retiene una conexión (y a veces un
+    thread). release corre una sola vez: desde el finally del generador al
+    terminar o cortarse el stream, o desde response.close() si el cuerpo nunca
+    se itera. Werkzeug no lo itera en HEAD ni en 204/304, y cerrar un
+    generador que no arrancó no ejecuta su finally.
+    """
+    resp = Response(body, **kwargs)
+    resp.call_on_close(release)
+    return resp
+
+def stream_list(select_sql, order, fmt, conditions=(), params=()):
+    """
+    Devuelve una Response que emite la lista fila a fila. La conexión queda
+    tomada mientras dura el stream y vuelve al pool al terminar, cuando el
+    cliente corta o al cerrarse la respuesta sin enviar el cuerpo (HEAD).
+    """
+    query, params = build_list_sql(select_sql, order, conditions, params)
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor(name=f"stream_{uuid.uuid4().hex}",
+                          cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.itersize = STREAM_ITERSIZE
+        # El DECLARE se ejecuta aquí: un error de SQL todavía puede responder 500
+        cur.execute(query, tuple(params))
+    except Exception:
+        release_db_connection(conn)
+        raise
+
+    dumps = app.json.dumps
+
+    @release_once
+    def release():
+        try:
+            cur.close()
+        except Exception:
+            pass
+        # El pool hace rollback de la transacción del cursor con nombre
+        release_db_connection(conn)
+
+    def generate():
+        try:
+            if fmt == "json":
+                yield "["
+            first = True
+            chunk = []
+            for row in cur:
+                if fmt == "ndjson":
+                    chunk.append(dumps(row) + "\n")
+                else:
+                    chunk.append(dumps(row) if first else "," + dumps(row))
+                    first = False
+                if len(chunk) >= STREAM_CHUNK_ROWS:
+                    yield "".join(chunk)
+                    chunk = []
+            if chunk:
+                yield "".join(chunk)
+            if fmt == "json":
+                yield "]"
+        except Exception:
+            # Ya se enviaron cabeceras: sólo queda registrar y cortar el stream
+            traceback.print_exc()
+        finally:
+            release()
+
+    mimetype = "application/x-ndjson" if fmt == "ndjson" else "application/json"
+    return closing_response(generate(), release, mimetype=mimetype, headers={"X-Accel-Buffering": "no"})
+
+# -----------------------
+# HASH DE CONTRASEÑAS (BCRYPT)
+# -----------------------
+# bcrypt corre en un pool de procesos acotado, fuera de los threads de request.
+# Si ya hay BCRYPT_MAX_PENDING operaciones en curso la petición se rechaza con
+# 503 en vez de encolarse detrás de trabajo de CPU.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(os.cpu_count() or 2)))
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", str(BCRYPT_WORKERS * 4)))
+BCRYPT_TIMEOUT = float(os.getenv("BCRYPT_TIMEOUT", "5"))
+
+class PasswordBusy(Exception):
+    pass
+
+_bcrypt_pool = None
+_bcrypt_pool_lock = threading.Lock()
+_bcrypt_slots = threading.BoundedSemaphore(BCRYPT_MAX_PENDING)
+
+def _bcrypt_hash(password, rounds):
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+def _bcrypt_check(password, hashed):
+    return bcrypt.checkpw(password.encode(), hashed.encode())
+
+def get_bcrypt_pool():
+    global _bcrypt_pool
+    # Perezoso: el pool se crea en cada worker después del fork de gunicorn
+    with _bcrypt_pool_lock:
+        if _bcrypt_pool is None:
+            _bcrypt_pool = ProcessPoolExecutor(max_workers=BCRYPT_WORKERS)
+        return _bcrypt_pool
+
+def run_bcrypt(fn, *args):
+    if not _bcrypt_slots.acquire(blocking=False):
+        raise PasswordBusy("Servidor ocupado, reintente en unos segundos")
+    try:
+        return get_bcrypt_pool().submit(fn, *args).result(timeout=BCRYPT_TIMEOUT)
+    except FutureTimeout:
+        raise PasswordBusy("Servidor ocupado, reintente en unos segundos")
+    finally:
+        _bcrypt_slots.release()
+
+def hash_password(password):
+    return run_bcrypt(_bcrypt_hash, password, BCRYPT_ROUNDS)
+
+def check_password(password, hashed):
+    return run_bcrypt(_bcrypt_check, password, hashed)
+
+# -----------------------
+# SALUD
+# -----------------------
+@app.route("/health", methods=["GET"])
+def health():
+    """Estado del pool de conexiones (tamaño, en uso, esperas, tiempos)."""
+    if not connection_pool:
+        return jsonify({"status": "sin pool"}), 503
+    return jsonify({"status": "ok", "pool": connection_pool.stats()})
+
+# -----------------------
+# MÉTRICAS (/metrics, formato Prometheus)
+# -----------------------
+# Por ruta (regla de Flask, no la URL, para no explotar la cardinalidad):
+# histograma de latencia, tiempo por fase, consultas, filas y bytes. Las
+# respuestas en streaming sólo cuentan hasta que empieza el cuerpo.
+class RouteMetrics:
+    def __init__(self):
+        self.latency = Histogram()
+        self.phases = {"pool_wait": 0.0, "sql": 0.0, "fetch": 0.0, "serialize": 0.0, "compress": 0.0}
+        self.queries = 0
+        self.rows = 0
+        self.bytes = 0
+        self.statuses = {}
+
+route_metrics = {}
+route_metrics_lock = threading.Lock()
+
+@app.before_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    current_timings.set(RequestTimings(keep_statements=SLOW_REQUEST_MS > 0))
+
+@app.after_request
+def record_request_timing(response):
+    t = current_timings.get()
+    if t is None or "request_started" not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    key = (request.method, request.url_rule.rule if request.url_rule else "<sin ruta>")
+    record_route(key, elapsed, t, response.status_code, response.content_length or 0)
+
+    if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+        log_slow_request(elapsed, t, response.status_code)
+    return response
+
+def record_route(key, elapsed, t, status, nbytes):
+    """Suma un request (RequestTimings t) a las métricas de key = (método, regla)."""
+    with route_metrics_lock:
+        m = route_metrics.get(key)
+        if m is None:
+            m = route_metrics[key] = RouteMetrics()
+        m.phases["pool_wait"] += t.pool_wait
+        m.phases["sql"] += t.sql
+        m.phases["fetch"] += t.fetch
+        m.phases["serialize"] += t.serialize
+        m.phases["compress"] += t.compress
+        m.queries += t.queries
+        m.rows += t.rows
+        m.bytes += nbytes
+        m.statuses[status] = m.statuses.get(status, 0) + 1
+    m.latency.observe(elapsed)
+
+@app.teardown_request
+def end_request_timing(exc):
+    current_timings.set(None)
+
+def log_slow_request(elapsed, t, status):
+    print(f"[lento] {request.method} {request.full_path.rstrip('?')} {status} {elapsed * 1000:.0f} ms "
+          f"(pool {t.pool_wait * 1000:.0f} / sql {t.sql * 1000:.0f} / fetch {t.fetch * 1000:.0f} / "
+          f"json {t.serialize * 1000:.0f} / compresión {t.compress * 1000:.0f} ms) "
+          f"{t.queries} consultas, {t.rows} filas")
+    for query, params, query_elapsed in t.statements or ():
+        text = " ".join((query.decode() if isinstance(query, bytes) else str(query)).split())
+        shown = "" if params is None else repr(params)[:SLOW_LOG_PARAMS_CHARS]
+        print(f"    {query_elapsed * 1000:8.1f} ms  {text}  {shown}")
+
+def _prom_escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _prom_labels(**labels):
+    return ",".join(f'{k}="{_prom_escape(v)}"' for k, v in labels.items())
+
+def _prom_histogram(lines, name, labels, snap):
+    prefix = labels + "," if labels else ""
+    cumulative = 0
+    for le, count in zip(snap["buckets"], snap["counts"]):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {snap["count"]}')
+    lines.append(f"{name}_sum{{{labels}}} {snap['sum']}")
+    lines.append(f"{name}_count{{{labels}}} {snap['count']}")
+
+# /metrics muestra las rutas, sus latencias y el estado del pool: pide una
+# sesión válida o el token compartido METRICS_TOKEN (el bearer_token del scrape
+# de Prometheus), en Authorization: Bearer.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+def metrics_authorized():
+    token = get_request_token()
+    if not token:
+        return False
+    if METRICS_TOKEN and secrets.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        return True
+    return sessions.validate(token) is not None
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    try:
+        if not metrics_authorized():
+            return jsonify({"message": "Unauthorized"}), 401
+    except Exception as e:
+        traceback.print_exc()
+        return error_response(e)
+
+    with route_metrics_lock:
+        routes = sorted(route_metrics.items())
+
+    lines = ["# TYPE gwp_http_request_duration_seconds histogram"]
+    for (method, rule), m in routes:
+        _prom_histogram(lines, "gwp_http_request_duration_seconds",
+                        _prom_labels(method=method, route=rule), m.latency.snapshot())
+    lines.append("# TYPE gwp_http_requests_total counter")
+    for (method, rule), m in routes:
+        for status, count in sorted(m.statuses.items()):
+            lines.append(f"gwp_http_requests_total{{{_prom_labels(method=method, route=rule, status=status)}}} {count}")
+    lines.append("# TYPE gwp_http_request_phase_seconds_total counter")
+    for (method, rule), m in routes:
+        for phase, seconds in m.phases.items():
+            lines.append(f"gwp_http_request_phase_seconds_total"
+                         f"{{{_prom_labels(method=method, route=rule, phase=phase)}}} {seconds}")
+    for metric, attr in (("gwp_db_queries_total", "queries"), ("gwp_db_rows_fetched_total", "rows"),
+                         ("gwp_http_response_bytes_total", "bytes")):
+        lines.append(f"# TYPE {metric} counter")
+        for (method, rule), m in routes:
+            lines.append(f"{metric}{{{_prom_labels(method=method, route=rule)}}} {getattr(m, attr)}")
+
+    if connection_pool:
+        pool = connection_pool.stats()
+        for gauge in ("size", "max", "idle", "in_use", "waiting"):
+            lines.append(f"# TYPE gwp_db_pool_{gauge} gauge")
+            lines.append(f"gwp_db_pool_{gauge} {pool[gauge]}")
+        for counter in ("checkouts", "timeouts", "created", "recycled", "broken", "rollbacks"):
+            lines.append(f"# TYPE gwp_db_pool_{counter}_total counter")
+            lines.append(f"gwp_db_pool_{counter}_total {pool[counter]}")
+        for hist in ("wait_time", "checkout_duration"):
+            lines.append(f"# TYPE gwp_db_pool_{hist}_seconds histogram")
+            _prom_histogram(lines, f"gwp_db_pool_{hist}_seconds", "", pool[hist])
+
+    if not response_cache.disabled:
+        cache = response_cache.stats()
+        lines.append("# TYPE gwp_response_cache_requests_total counter")
+        for (rule, result), count in sorted(cache["requests"].items()):
+            lines.append(f"gwp_response_cache_requests_total{{{_prom_labels(route=rule, result=result)}}} {count}")
+        for gauge in ("bytes", "entries"):
+            lines.append(f"# TYPE gwp_response_cache_{gauge} gauge")
+            lines.append(f"gwp_response_cache_{gauge} {cache[gauge]}")
+        lines.append("# TYPE gwp_response_cache_evictions_total counter")
+        lines.append(f"gwp_response_cache_evictions_total {cache['evictions']}")
+
+    return Response("\n".join(lines) + "\n", content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# -----------------------
+# COMPRESIÓN DE RESPUESTAS
+# -----------------------
+# gzip o brotli según Accept-Encoding (brotli si está instalado y el cliente
+# no lo puntúa peor) para JSON, NDJSON, CSV y texto sobre COMPRESS_MIN_BYTES.
+# Las respuestas en streaming se comprimen bloque a bloque con flush, así
+# siguen llegando a medida que se generan. No se tocan los archivos de
+# /uploads (send_file, ya comprimidos o con Range) ni los 304. El ETag pasa a
+# débil porque los bytes cambian; If-None-Match se compara en forma débil.
+# Este hook se registra después del de métricas, así que corre antes que él:
+# /metrics cuenta los bytes comprimidos.
+# COMPRESS_RESPONSES=0 lo apaga si ya comprime el proxy.
+COMPRESS_RESPONSES = os.getenv("COMPRESS_RESPONSES", "1").lower() not in ("0", "false", "no")
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "3"))  # 50k filas: 3 cuesta como 1 y pesa 15% menos que 1
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))  # 4-5: buena relación en tiempo real
+COMPRESSIBLE_MIMETYPES = {
+    "application/json", "application/x-ndjson", "text/csv", "text/plain", "text/html",
+    "text/css", "application/javascript",
+}
+
+def negotiate_encoding():
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(offered)
+
+def compress_bytes(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31 = formato gzip
+    return z.compress(data) + z.flush()
+
+def compress_stream(chunks, encoding):
+    """Comprime un cuerpo en streaming; cerrar el wrapper cierra el generador original."""
+    if encoding == "br":
+        c = brotli.Compressor(quality=BROTLI_QUALITY)
+        process, sync, finish = c.process, c.flush, c.finish
+    else:
+        z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        process, sync, finish = z.compress, lambda: z.flush(zlib.Z_SYNC_FLUSH), z.flush
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            out = process(chunk) + sync()
+            if out:
+                yield out
+        yield finish()
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+@app.after_request
+def compress_response(response):
+    if (not COMPRESS_RESPONSES or request.method == "HEAD"
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or "Content-Encoding" in response.headers
+            or "no-transform" in response.headers.get("Cache-Control", "")):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+
+    t = current_timings.get()
+    t0 = time.perf_counter()
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_BYTES:
+            return response
+        response.set_data(compress_bytes(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    if t is not None:
+        t.compress += time.perf_counter() - t0
+    return response
+
+# -----------------------
+# CACHÉ DE LISTADOS
+# -----------------------
+# GET /usuarios, /repositorio, /hitos y /plan-maestro guardan en memoria del
+# worker los bytes ya serializados (y comprimidos) de la respuesta, con LRU
+# acotado a RESPONSE_CACHE_MB. La clave lleva la URL, el encoding negociado y
+# la versión de cada tabla que lee el listado (versiones_tablas, migraciones 7,
+# 11 y 14): cada transacción que escribe en una tabla incrementa su versión al
+# hacer commit, así que una entrada vieja no se vuelve a usar y se descarta al
+# llegar la versión nueva.
+# Las versiones llegan por NOTIFY al thread de "EVENTOS EN TIEMPO REAL", que
+# escucha también ese canal. Mientras no escucha (arranque, reconexión) se
+# leen de la base en cada request: una consulta por PK en vez del listado.
+# Leer lo propio: toda escritura responde X-Data-Version con las versiones ya
+# confirmadas y el cliente las reenvía en X-Min-Data-Version; si este worker
+# aún no las vio, las lee de la base antes de buscar en la caché.
+# X-Cache-Bypass: 1 (o Cache-Control: no-cache) ignora la entrada y la
+# reemplaza. ?since=, streaming y HEAD no pasan por la caché. Los listados del
+# modo ASGI (asgi.py) tampoco: consultan la base siempre.
+# RESPONSE_CACHE_MB=0 la apaga.
+RESPONSE_CACHE_BYTES = int(float(os.getenv("RESPONSE_CACHE_MB", "64")) * 1024 * 1024)
+RESPONSE_CACHE_ENTRY_OVERHEAD = 512  # clave, headers y estructuras, aprox.
+VERSIONS_SQL = "SELECT tabla, version FROM versiones_tablas WHERE tabla IN %s"
+
+class CachedResponse:
+    def __init__(self, body, headers, versions):
+        self.body = body
+        self.headers = headers    # [(nombre, valor)] sin Content-Length
+        self.versions = versions  # {tabla: versión} con la que se armó
+        self.size = len(body) + RESPONSE_CACHE_ENTRY_OVERHEAD
+
+class ResponseCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.disabled = max_bytes <= 0
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # clave -> CachedResponse, de la menos a la más usada
+        self.bytes = 0
+        self.versions = {}  # tabla -> versión confirmada más nueva que se conoce
+        self.live = False   # True mientras el LISTEN de versiones está activo
+        self.epoch = 0      # cambia con live: descarta lecturas hechas antes del LISTEN
+        self.requests = {}  # (regla, hit|miss|bypass) -> n
+        self.evictions = 0
+
+    def listening(self, active):
+        """Lo llama el thread del feed al empezar a escuchar (True) o al perder la conexión."""
+        with self.lock:
+            self.live = active
+            self.epoch += 1
+            if active:
+                # Lo notificado mientras no escuchábamos se perdió
+                self.versions.clear()
+
+    def notify(self, payload):
+        table, _, version = payload.rpartition(":")
+        try:
+            version = int(version)
+        except ValueError:
+            print(f"[caché] Notificación inválida: {payload[:200]}")
+            return
+        with self.lock:
+            self._observe({table: version})
+
+    def _observe(self, versions):
+        # Llamar con self.lock tomado. Las versiones sólo avanzan; al avanzar una
+        # tabla se descartan las entradas armadas con una versión anterior.
+        advanced = {}
+        for table, version in versions.items():
+            if version > self.versions.get(table, -1):
+                self.versions[table] = version
+                advanced[table] = version
+        if not advanced:
+            return
+        for key, entry in list(self.entries.items()):
+            if any(entry.versions.get(t, v) < v for t, v in advanced.items()):
+                self._drop(key)
+
+    def refresh(self, tables):
+        """{tabla: versión} leídas de la base, o None si falta la migración 7."""
+        with self.lock:
+            epoch = self.epoch
+        try:
+            with db_connection() as conn, conn.cursor() as cur:
+                cur.execute(VERSIONS_SQL, (tuple(tables),))
+                versions = dict(cur.fetchall())
+        except psycopg2.ProgrammingError:
+            print("AVISO: falta versiones_tablas (migración 7): caché de listados desactivada")
+            self.disabled = True
+            return None
+        with self.lock:
+            if epoch == self.epoch:
+                self._observe(versions)
+        return versions
+
+    def current_versions(self, tables, required):
+        """
+        {tabla: versión} para armar la clave: las notificadas si el LISTEN está
+        activo y cumplen con required (X-Min-Data-Version); si no, de la base.
+        """
+        get_change_feed()  # arranca el listener en este worker
+        with self.lock:
+            known = {t: self.versions.get(t) for t in tables}
+            live = self.live
+        if live and all(v is not None and v >= required.get(t, 0) for t, v in known.items()):
+            return known
+        return self.refresh(tables)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        if entry.size > self.max_bytes // 4:
+            return  # una sola respuesta no debe vaciar la caché
+        with self.lock:
+            # Mientras se armaba la respuesta pudo llegar una versión más nueva
+            if any(self.versions.get(t, v) > v for t, v in entry.versions.items()):
+                return
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = entry
+            self.bytes += entry.size
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        # Llamar con self.lock tomado
+        self.bytes -= self.entries.pop(key).size
+
+    def count(self, rule, result):
+        with self.lock:
+            self.requests[(rule, result)] = self.requests.get((rule, result), 0) + 1
+
+    def stats(self):
+        with self.lock:
+            return {"bytes": self.bytes, "entries": len(self.entries), "evictions": self.evictions,
+                    "requests": dict(self.requests)}
+
+response_cache = ResponseCache(RESPONSE_CACHE_BYTES)
+
+def parse_data_versions(value):
+    """'plan_maestro=12,hitos=3' -> {tabla: versión}; lo que no se entiende se ignora."""
+    versions = {}
+    for part in (value or "").split(","):
+        table, _, version = part.strip().partition("=")
+        if version.isdigit():
+            versions[table] = int(version)
+    return versions
+
+def cache_bypass_requested():
+    return (request.headers.get("X-Cache-Bypass", "").lower() in ("1", "true", "yes")
+            or "no-cache" in request.headers.get("Cache-Control", ""))
+
+def cached_reply(entry):
+    resp = Response(entry.body, headers=entry.headers)
+    etag, _ = resp.get_etag()
+    if etag and request.if_none_match.contains_weak(etag):
+        return not_modified(etag)
+    return resp
+
+def cached_response(*tables):
+    """Cachea un GET de listado (ver arriba); tables son las tablas que lee."""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            cache = response_cache
+            if (cache.disabled or request.method != "GET"
+                    or "since" in request.args or get_stream_format()):
+                return f(*args, **kwargs)
+            rule = request.url_rule.rule
+            try:
+                versions = cache.current_versions(
+                    tables, parse_data_versions(request.headers.get("X-Min-Data-Version")))
+            except Exception as e:
+                traceback.print_exc()
+                return error_response(e)
+            if versions is None:
+                return f(*args, **kwargs)
+            encoding = negotiate_encoding() if COMPRESS_RESPONSES else None
+            # Sin ?t= (cache-buster del frontend, como en plan_etag_for): si no,
+            # cada request tendría su propia entrada y desplazaría a las útiles
+            query = tuple(sorted((k, v) for k, v in request.args.items(multi=True) if k != "t"))
+            key = (request.path, query, encoding, tuple(sorted(versions.items())))
+
+            bypass = cache_bypass_requested()
+            if not bypass:
+                entry = cache.get(key)
+                if entry is not None:
+                    cache.count(rule, "hit")
+                    resp = cached_reply(entry)
+                    resp.headers["X-Cache"] = "HIT"
+                    return resp
+
+            # Las versiones se leyeron antes que los datos: lo guardado es
+            # igual o más nuevo que lo que indica la clave
+            resp = app.make_response(f(*args, **kwargs))
+            cache.count(rule, "bypass" if bypass else "miss")
+            if resp.status_code == 200 and not resp.is_streamed:
+                resp = compress_response(resp)
+                headers = [(k, v) for k, v in resp.headers.items() if k != "Content-Length"]
+                cache.put(key, CachedResponse(resp.get_data(), headers, versions))
+            resp.headers["X-Cache"] = "BYPASS" if bypass else "MISS"
+            return resp
+        return decorated
+    return decorator
+
+@app.after_request
+def stamp_data_version(response):
+    # Después del commit del handler: las versiones leídas incluyen esta escritura
+    if (response_cache.disabled or request.method not in ("POST", "PUT", "PATCH", "DELETE")
+            or response.status_code >= 400):
+        return response
+    try:
+        versions = response_cache.refresh(VERSIONED_TABLES)
+    except Exception:
+        traceback.print_exc()
+        return response
+    if versions:
+        response.headers["X-Data-Version"] = ",".join(f"{t}={v}" for t, v in sorted(versions.items()))
+    return response
+
 # -----------------------
 # AUTH ROUTES
 # -----------------------
 @app.route("/auth/login", methods=["POST"])
 def login():
-    conn = None
     try:
         data = request.json
         username = data.get("username")
         password = data.get("password")
         
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+        # La conexión vuelve al pool al salir del with, antes de bcrypt
+        with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
             cur.execute("SELECT id, nombre, password_hash FROM usuarios WHERE username = %s", (username,))
             user = cur.fetchone()
             
-        if user and bcrypt.checkpw(password.encode(), user["password_hash"].encode()):
-            token = secrets.token_hex(32)
-            active_sessions[token] = user["id"]
+        if user and password and check_password(password, user["password_hash"]):
+            token = sessions.create(user["id"])
             return jsonify({
                 "token": token,
                 "user": {"id": user["id"], "nombre": user["nombre"]}
@@ -119,19 +1543,26 @@ def login():
         return jsonify({"message": "Credenciales inválidas"}), 401
     except Exception as e:
         traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
+
+@app.route("/auth/logout", methods=["POST"])
+def logout():
+    try:
+        token = get_request_token()
+        if token:
+            sessions.revoke(token)
+        return jsonify({"message": "Sesión cerrada"})
+    except Exception as e:
+        traceback.print_exc()
+        return error_response(e)
 
 @app.route("/auth/register", methods=["POST"])
 def register():
-    conn = None
     try:
         data = request.json
-        hashed = bcrypt.hashpw(data["password"].encode(), bcrypt.gensalt()).decode()
+        hashed = hash_password(data["password"])
         
-        conn = get_db_connection()
-        with conn.cursor() as cur:
+        with db_connection() as conn, conn.cursor() as cur:
             cur.execute("""
                 INSERT INTO usuarios (nombre, username, password_hash)
                 VALUES (%s, %s, %s) RETURNING id
@@ -142,40 +1573,35 @@ def register():
         return jsonify({"message": "Usuario creado", "id": user_id})
     except Exception as e:
         traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
 
 
 # -----------------------
 # USUARIOS CRUD
 # -----------------------
+USERS_LIST_SQL = "SELECT id, nombre, username, created_at FROM usuarios"
+
 @app.route("/usuarios", methods=["GET"])
 @session_required
+@cached_response("usuarios")
 def get_users(current_user_id):
-    conn = None
     try:
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute("SELECT id, nombre, username, created_at FROM usuarios ORDER BY id")
-            rows = cur.fetchall()
-        return jsonify(rows)
+        page = get_page_args()
+        with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            result = query_list(cur, USERS_LIST_SQL, ORDER_BY_ID, page)
+        return jsonify(result)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
 
 @app.route("/usuarios", methods=["POST"])
 @session_required
 def create_user_admin(current_user_id):
     # Idealmente verificar si current_user_id es admin
-    conn = None
     try:
         data = request.json
-        hashed = bcrypt.hashpw(data["password"].encode(), bcrypt.gensalt()).decode()
+        hashed = hash_password(data["password"])
         
-        conn = get_db_connection()
-        with conn.cursor() as cur:
+        with db_connection() as conn, conn.cursor() as cur:
             cur.execute("""
                 INSERT INTO usuarios (nombre, username, password_hash)
                 VALUES (%s, %s, %s) RETURNING id
@@ -184,14 +1610,11 @@ def create_user_admin(current_user_id):
             conn.commit()
         return jsonify({"id": new_id, "message": "Usuario creado"}), 201
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
 
 @app.route("/usuarios/<int:user_id>", methods=["PUT"])
 @session_required
 def update_user(current_user_id, user_id):
-    conn = None
     try:
         data = request.json
         fields = []
@@ -206,7 +1629,7 @@ def update_user(current_user_id, user_id):
             values.append(data["username"])
             
         if "password" in data and data["password"]:
-            hashed = bcrypt.hashpw(data["password"].encode(), bcrypt.gensalt()).decode()
+            hashed = hash_password(data["password"])
             fields.append("password_hash = %s")
             values.append(hashed)
             
@@ -217,58 +1640,263 @@ def update_user(current_user_id, user_id):
              
         query = f"UPDATE usuarios SET {', '.join(fields)} WHERE id = %s"
         
-        conn = get_db_connection()
-        with conn.cursor() as cur:
+        with db_connection() as conn, conn.cursor() as cur:
             cur.execute(query, tuple(values))
             conn.commit()
         return jsonify({"message": "Usuario actualizado"})
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
 
 @app.route("/usuarios/<int:user_id>", methods=["DELETE"])
 @session_required
 def delete_user(current_user_id, user_id):
-    conn = None
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
+        with db_connection() as conn, conn.cursor() as cur:
             cur.execute("DELETE FROM usuarios WHERE id = %s", (user_id,))
             conn.commit()
         return jsonify({"message": "Usuario eliminado"})
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
 
 # -----------------------
 # PLAN MAESTRO (GWP)
 # -----------------------
+PLAN_LIST_SQL = "SELECT p.* FROM plan_maestro p"
+# Columnas que mantienen los triggers de la migración 6; p.* ya las incluye.
+# No se aceptan en escrituras.
+PLAN_COUNTERS = ("n_hitos", "n_hitos_pendientes", "n_documentos", "n_observaciones",
+                 "last_activity_at", "has_file_uploaded")
+
+# -----------------------
+# PLAN MAESTRO: VENTANAS DE FECHAS
+# -----------------------
+# ?from=&to= (calendario, Gantt) devuelve sólo las actividades cuyo rango se
+# superpone con la ventana, ambos extremos incluidos y cualquiera opcional.
+# Con fechas (YYYY-MM-DD) se compara fecha_inicio-fecha_fin; con números,
+# week_start-week_end. Las expresiones son las de los índices GiST de la
+# migración 5 (LEAST/GREATEST toleran un extremo NULL o invertido; sin
+# ninguno de los dos la actividad no tiene rango y no entra en ventanas).
+# Los hitos se filtran por fecha_estimada con el índice de su orden, o por
+# las semanas de su actividad.
+PLAN_DATE_RANGE = "daterange(LEAST({t}fecha_inicio, {t}fecha_fin), GREATEST({t}fecha_inicio, {t}fecha_fin), '[]')"
+PLAN_DATE_PRESENT = "({t}fecha_inicio IS NOT NULL OR {t}fecha_fin IS NOT NULL)"
+PLAN_WEEK_RANGE = "int4range(LEAST({t}week_start, {t}week_end), GREATEST({t}week_start, {t}week_end), '[]')"
+PLAN_WEEK_PRESENT = "({t}week_start IS NOT NULL OR {t}week_end IS NOT NULL)"
+
+def parse_window_value(value):
+    """('date', date) o ('week', int) para un extremo de ventana; None si viene vacío."""
+    if not value:
+        return None
+    if re.fullmatch(r"-?\d{1,4}", value):
+        return "week", int(value)
+    try:
+        return "date", datetime.date.fromisoformat(value)
+    except ValueError:
+        raise InvalidParameter(f"Extremo de ventana inválido: {value}")
+
+def get_window_args(args=None):
+    """(tipo, desde, hasta) de ?from=&to=, o None si no hay ventana."""
+    if args is None:
+        args = request.args
+    start = parse_window_value(args.get("from"))
+    end = parse_window_value(args.get("to"))
+    if start is None and end is None:
+        return None
+    kinds = {b[0] for b in (start, end) if b}
+    if len(kinds) > 1:
+        raise InvalidParameter("from y to deben ser ambos fechas o ambos semanas")
+    if start and end and start[1] > end[1]:
+        raise InvalidParameter("from no puede ser posterior a to")
+    return kinds.pop(), start and start[1], end and end[1]
+
+def plan_window_filter(args=None, table="p."):
+    """(condiciones, parámetros) de la ventana sobre plan_maestro (alias table)."""
+    window = get_window_args(args)
+    if window is None:
+        return [], []
+    kind, start, end = window
+    if kind == "date":
+        rng, present, cast = PLAN_DATE_RANGE, PLAN_DATE_PRESENT, "daterange(%s::date, %s::date, '[]')"
+    else:
+        rng, present, cast = PLAN_WEEK_RANGE, PLAN_WEEK_PRESENT, "int4range(%s::integer, %s::integer, '[]')"
+    return [present.format(t=table), f"{rng.format(t=table)} && {cast}"], [start, end]
+
+def hitos_window_filter(args=None):
+    window = get_window_args(args)
+    if window is None:
+        return [], []
+    kind, start, end = window
+    if kind == "week":
+        return plan_window_filter(args, table="p.")
+    # Misma expresión que ORDER_HITOS (índice idx_hitos_orden); los NULL son
+    # 'infinity' y no caen en ninguna ventana acotada por arriba
+    expr = ORDER_HITOS[0][0][0]
+    conditions, params = [], []
+    if start is not None:
+        conditions.append(f"{expr} >= %s::date")
+        params.append(start)
+    conditions.append(f"{expr} <= %s::date" if end is not None else f"{expr} < 'infinity'::date")
+    if end is not None:
+        params.append(end)
+    return conditions, params
+
+PLAN_BOUNDS_SQL = f"""
+    SELECT product_code,
+           min(LEAST(fecha_inicio, fecha_fin)) AS fecha_min,
+           max(GREATEST(fecha_inicio, fecha_fin)) AS fecha_max,
+           min(LEAST(week_start, week_end)) AS week_min,
+           max(GREATEST(week_start, week_end)) AS week_max,
+           count(*) AS total,
+           GROUPING(product_code) = 1 AS is_total
+    FROM plan_maestro
+    GROUP BY GROUPING SETS ((), (product_code))
+    ORDER BY is_total DESC, product_code
+"""
+
+@app.route("/plan-maestro/bounds", methods=["GET"])
+@session_required
+def get_plan_bounds(current_user_id):
+    """Fechas y semanas mínimas/máximas del plan, en total y por producto, en una consulta."""
+    try:
+        with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            etag = plan_etag(cur)
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
+            cur.execute(PLAN_BOUNDS_SQL)
+            rows = cur.fetchall()
+        overall = {k: v for k, v in rows[0].items() if k not in ("product_code", "is_total")}
+        overall["productos"] = [{k: v for k, v in r.items() if k != "is_total"} for r in rows[1:]]
+        return with_etag(jsonify(overall), etag)
+    except Exception as e:
+        traceback.print_exc()
+        return error_response(e)
+
+# -----------------------
+# PLAN MAESTRO: SYNC INCREMENTAL Y ETAG
+# -----------------------
+# updated_at lo fija el trigger con NOW(), que es el inicio de la transacción
+# que escribe: una transacción larga se confirma después que otras con un
+# updated_at posterior, y ni max(updated_at) ni una ventana de solapamiento
+# alcanzan para no perderla. Por eso la versión y la sync siguen el orden de
+# los commits (migraciones 7, 12 y 14):
+# - El ETag sale de la versión de plan_maestro en versiones_tablas, que
+#   avanza con cada commit que escribe la tabla.
+# - Cada lectura del plan devuelve un token de sync (X-Sync-Token, o
+#   "sync_token" en el delta): el xmin de su snapshot. Toda transacción que esa
+#   lectura no vio tiene txid >= token, y ?since=<token> pide las filas y los
+#   tombstones con updated_txid / deleted_txid >= token. Llegan duplicados,
+#   nunca faltan cambios. Con páginas vale el token de la primera.
+# ?since=<timestamp> (clientes anteriores) sigue con la ventana de
+# SYNC_OVERLAP_SECONDS sobre updated_at.
+SYNC_OVERLAP_SECONDS = int(os.getenv("SYNC_OVERLAP_SECONDS", "5"))
+
+def parse_since(value):
+    """Token de sync (int), timestamp de un cliente anterior (datetime) o None."""
+    if not value:
+        return None
+    if value.isdigit():
+        return int(value)
+    try:
+        # Un "+hh:mm" sin codificar en la URL llega como espacio
+        return datetime.datetime.fromisoformat(re.sub(r" (\d{2}:?\d{2})$", r"+\1", value))
+    except ValueError:
+        raise InvalidParameter("Parámetro since inválido")
+
+PLAN_VERSION_SQL = """
+    SELECT (SELECT version FROM versiones_tablas WHERE tabla = 'plan_maestro') AS version,
+           txid_snapshot_xmin(txid_current_snapshot()) AS sync_token
+"""
+
+def plan_etag_for(version, args, stream_fmt):
+    # ?t= es el cache-buster histórico del frontend: no distingue respuestas
+    args = sorted((k, v) for k, v in args if k != "t")
+    raw = json.dumps([version["version"], args, stream_fmt], default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def plan_version(cur):
+    """Versión de plan_maestro y token de sync, en una consulta y sin leer filas."""
+    cur.execute(PLAN_VERSION_SQL)
+    return cur.fetchone()
+
+def plan_etag(cur):
+    """ETag del listado a partir de plan_version."""
+    return plan_etag_for(plan_version(cur), request.args.items(multi=True), get_stream_format())
+
+def not_modified(etag):
+    resp = Response(status=304)
+    resp.set_etag(etag)
+    return resp
+
+def with_etag(resp, etag):
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+def plan_delta(cur, since, version, page):
+    """
+    Filas modificadas desde since más los ids eliminados. version es la fila
+    de plan_version leída antes que los datos: su token cubre lo que falte.
+    """
+    cur.execute("SELECT now() AS server_time")
+    server_time = cur.fetchone()["server_time"]
+    if isinstance(since, int):
+        changed, removed, start = "p.updated_txid >= %s", "deleted_txid >= %s", since
+    else:
+        changed, removed = "p.updated_at > %s", "deleted_at > %s"
+        start = since - datetime.timedelta(seconds=SYNC_OVERLAP_SECONDS)
+
+    result = query_list(cur, PLAN_LIST_SQL, ORDER_PLAN, page, [changed], [start])
+    if not page:
+        result = {"items": result}
+
+    deleted = []
+    if not (page and page["cursor"]):
+        cur.execute(f"SELECT id FROM plan_maestro_eliminados WHERE {removed} ORDER BY id", (start,))
+        deleted = [r["id"] for r in cur.fetchall()]
+    result["deleted"] = deleted
+    result["server_time"] = server_time
+    result["sync_token"] = version["sync_token"]
+    return result
+
 @app.route("/plan-maestro", methods=["GET"])
 @session_required
+@cached_response("plan_maestro")
 def get_plan(current_user_id):
-    conn = None
     try:
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute("SELECT * FROM plan_maestro ORDER BY id ASC")
-            rows = cur.fetchall()
-        return jsonify(rows)
+        page = get_page_args()
+        since = parse_since(request.args.get("since"))
+        stream_fmt = get_stream_format()
+        # ?since= no aplica la ventana: una actividad que sale de ella también debe llegar
+        conditions, params = plan_window_filter()
+        streaming = since is None and stream_fmt and not page
+        with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            version = plan_version(cur)
+            etag = plan_etag_for(version, request.args.items(multi=True), stream_fmt)
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
+            if since is not None:
+                result = plan_delta(cur, since, version, page)
+            elif not streaming:
+                result = query_list(cur, PLAN_LIST_SQL, ORDER_PLAN, page, conditions, params)
+        if streaming:
+            # Fuera del with: stream_list toma su propia conexión y no debe
+            # esperarla reteniendo otra
+            resp = stream_list(PLAN_LIST_SQL, ORDER_PLAN, stream_fmt, conditions, params)
+        else:
+            resp = jsonify(result)
+        # El token se leyó antes que las filas: la próxima sync no se saltea nada
+        resp.headers["X-Sync-Token"] = str(version["sync_token"])
+        return with_etag(resp, etag)
     except Exception as e:
         traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
 
 @app.route("/plan-maestro", methods=["POST"])
 @session_required
 def create_plan_item(current_user_id):
-    conn = None
     try:
         data = request.json
-        conn = get_db_connection()
-        with conn.cursor() as cur:
+        with db_connection() as conn, conn.cursor() as cur:
             cur.execute("""
                 INSERT INTO plan_maestro (
                     activity_code, product_code, task_name, week_start, week_end,
@@ -288,24 +1916,22 @@ def create_plan_item(current_user_id):
             ))
             new_id = cur.fetchone()[0]
             conn.commit()
+        mark_graph_dirty([new_id])
         return jsonify({"id": new_id, "message": "Item creado"}), 201
     except Exception as e:
         traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
 
 @app.route("/plan-maestro/<int:id_item>", methods=["PUT"])
 @session_required
 def update_plan_item(current_user_id, id_item):
-    conn = None
     try:
         data = request.json
         # Construcción dinámica de query
         fields = []
         values = []
         for k, v in data.items():
-            if k in ['id', 'created_by', 'created_at']: continue
+            if k in ['id', 'created_by', 'created_at'] or k in PLAN_COUNTERS: continue
             fields.append(f"{k} = %s")
             values.append(v)
             
@@ -315,16 +1941,656 @@ def update_plan_item(current_user_id, id_item):
         
         query = f"UPDATE plan_maestro SET {', '.join(fields)} WHERE id = %s"
         
-        conn = get_db_connection()
-        with conn.cursor() as cur:
+        with db_connection() as conn, conn.cursor() as cur:
             cur.execute(query, tuple(values))
             conn.commit()
+        if GRAPH_FIELDS.intersection(data):
+            mark_graph_dirty([id_item])
         return jsonify({"message": "Item actualizado"})
     except Exception as e:
         traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
+
+# -----------------------
+# PLAN MAESTRO: DETALLE COMPLETO
+# -----------------------
+# GET /plan-maestro/<id>/full: la actividad con sus hitos, documentos (con
+# quien los subió) y observaciones (con su autor) en una sola consulta; el
+# JSON lo arma Postgres con json_agg y se envía tal cual. Límites opcionales
+# por sección (?hitos=, ?documentos=, ?observaciones=); los *_total dicen
+# cuántos hay en total.
+# La versión se lee antes de la fila de la actividad: cualquier cambio en sus
+# hitos, documentos u observaciones (borrados incluidos) actualiza sus
+# contadores y con ellos updated_at (migración 6). Si coincide con
+# If-None-Match se responde 304 sin armar el JSON.
+FULL_SECTIONS = ("hitos", "documentos", "observaciones")
+
+PLAN_FULL_VERSION_SQL = """
+    SELECT p.updated_at, p.n_hitos, p.n_documentos, p.n_observaciones
+    FROM plan_maestro p
+    WHERE p.id = %(id)s
+"""
+
+# LIMIT NULL = sin límite. El orden de cada sección es el de su endpoint propio
+PLAN_FULL_SQL = """
+    SELECT json_build_object(
+        'plan', to_json(p),
+        'hitos', (
+            SELECT COALESCE(json_agg(h ORDER BY h.fecha_estimada, h.id), '[]')
+            FROM (SELECT * FROM hitos WHERE plan_maestro_id = p.id
+                  ORDER BY fecha_estimada, id LIMIT %(hitos)s) h),
+        'documentos', (
+            SELECT COALESCE(json_agg(d ORDER BY d.created_at DESC, d.id DESC), '[]')
+            FROM (SELECT d.id, d.nombre_archivo, d.ruta_archivo, d.tipo_archivo, d.tamano_bytes,
+                         d.created_at, d.uploaded_by, u.nombre AS uploader
+                  FROM documentos d LEFT JOIN usuarios u ON d.uploaded_by = u.id
+                  WHERE d.plan_maestro_id = p.id
+                  ORDER BY d.created_at DESC, d.id DESC LIMIT %(documentos)s) d),
+        'observaciones', (
+            SELECT COALESCE(json_agg(o ORDER BY o.created_at DESC, o.id DESC), '[]')
+            FROM (SELECT o.id, o.texto, o.created_at, o.updated_at, o.usuario_id,
+                         u.nombre AS usuario_nombre, u.username AS usuario_username
+                  FROM observaciones o LEFT JOIN usuarios u ON o.usuario_id = u.id
+                  WHERE o.plan_maestro_id = p.id
+                  ORDER BY o.created_at DESC, o.id DESC LIMIT %(observaciones)s) o),
+        'hitos_total', %(hitos_total)s,
+        'documentos_total', %(documentos_total)s,
+        'observaciones_total', %(observaciones_total)s
+    )::text
+    FROM plan_maestro p
+    WHERE p.id = %(id)s
+"""
+
+def get_section_limits():
+    limits = {}
+    for section in FULL_SECTIONS:
+        value = request.args.get(section)
+        if value is None:
+            limits[section] = None
+            continue
+        try:
+            limits[section] = int(value)
+        except ValueError:
+            raise InvalidParameter(f"Parámetro {section} inválido")
+        if limits[section] < 0:
+            raise InvalidParameter(f"Parámetro {section} inválido")
+    return limits
+
+@app.route("/plan-maestro/<int:plan_id>/full", methods=["GET"])
+@session_required
+def get_plan_full(current_user_id, plan_id):
+    try:
+        limits = get_section_limits()
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute(PLAN_FULL_VERSION_SQL, {"id": plan_id})
+            version = cur.fetchone()
+            if version is None:
+                return jsonify({"error": "Actividad no encontrada"}), 404
+            etag = hashlib.sha1(json.dumps([version, limits], default=str).encode()).hexdigest()
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
+
+            params = {"id": plan_id, **limits}
+            for section, total in zip(FULL_SECTIONS, version[1:]):
+                params[f"{section}_total"] = total
+            cur.execute(PLAN_FULL_SQL, params)
+            row = cur.fetchone()
+        if row is None:
+            # Borrada entre las dos consultas
+            return jsonify({"error": "Actividad no encontrada"}), 404
+        return with_etag(Response(row[0], mimetype="application/json"), etag)
+    except Exception as e:
+        traceback.print_exc()
+        return error_response(e)
+
+# -----------------------
+# ESCRITURAS EN LOTE
+# -----------------------
+# POST /<recurso>/batch con {"create": [...], "update": [...], "delete": [...]}.
+# Todo se aplica en una sola transacción (creates, luego updates, luego
+# deletes): los INSERT van en un execute_values y los UPDATE en un
+# UPDATE ... FROM (VALUES ...) por cada combinación de columnas. Sólo se
+# aceptan las columnas de la lista blanca, con valores del tipo de la columna;
+# si algún ítem es inválido no se aplica nada y se responde 400 con el detalle
+# por ítem. Lo que sólo detecta Postgres (largo de un varchar, una actividad
+# que no existe) hace fallar la sentencia entera: en ese caso se repite el lote
+# ítem por ítem con SAVEPOINTs para nombrar a los culpables y se descarta todo.
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "2000"))
+INT4_MIN, INT4_MAX = -2 ** 31, 2 ** 31 - 1
+
+class BatchRejected(Exception):
+    def __init__(self, errors):
+        super().__init__("Lote inválido")
+        self.errors = errors
+
+PLAN_BATCH = {
+    "table": "plan_maestro",
+    "columns": {
+        "activity_code": "varchar", "product_code": "varchar", "task_name": "text",
+        "week_start": "integer", "week_end": "integer", "type_tag": "varchar",
+        "dependency_code": "varchar", "evidence_requirement": "text",
+        "primary_role": "varchar", "co_responsibles": "text",
+        "primary_responsible": "varchar", "status": "varchar",
+        "fecha_inicio": "date", "fecha_fin": "date",
+    },
+    "create_only": (),
+    "required": ("task_name",),
+    "defaults": {"status": "Pendiente"},
+}
+
+HITOS_BATCH = {
+    "table": "hitos",
+    "columns": {
+        "plan_maestro_id": "integer", "nombre": "text", "fecha_estimada": "date",
+        "descripcion": "text", "estado": "varchar",
+    },
+    "create_only": ("plan_maestro_id",),
+    "required": ("plan_maestro_id", "nombre"),
+    "defaults": {"estado": "Pendiente"},
+}
+
+def is_int_id(value):
+    # bool es subclase de int: true/false no son ids
+    return isinstance(value, int) and not isinstance(value, bool) and INT4_MIN <= value <= INT4_MAX
+
+def batch_value_error(sql_type, value):
+    """Qué se esperaba si value no sirve para una columna sql_type, si no None."""
+    if value is None:
+        return None
+    if sql_type == "integer":
+        return None if is_int_id(value) else "entero"
+    if sql_type == "date":
+        try:
+            datetime.date.fromisoformat(value)
+            return None
+        except (TypeError, ValueError):
+            return "fecha YYYY-MM-DD"
+    return None if isinstance(value, str) else "texto"
+
+def invalid_values(columns, item, fields):
+    wrong = [(k, batch_value_error(columns[k], item[k])) for k in fields]
+    return ", ".join(f"{k} ({expected})" for k, expected in wrong if expected)
+
+def validate_batch(spec, data):
+    """Devuelve (creates, updates, deletes, errores). Cada error: {op, index, error}."""
+    if not isinstance(data, dict):
+        return None, None, None, [{"error": "Se esperaba un objeto JSON"}]
+    creates = data.get("create") or []
+    updates = data.get("update") or []
+    deletes = data.get("delete") or []
+    if not all(isinstance(x, list) for x in (creates, updates, deletes)):
+        return None, None, None, [{"error": "create, update y delete deben ser listas"}]
+    if len(creates) + len(updates) + len(deletes) > BATCH_MAX_ITEMS:
+        return None, None, None, [{"error": f"Máximo {BATCH_MAX_ITEMS} ítems por lote"}]
+
+    columns = spec["columns"]
+    errors = []
+    for i, item in enumerate(creates):
+        if not isinstance(item, dict):
+            errors.append({"op": "create", "index": i, "error": "Ítem inválido"})
+            continue
+        unknown = [k for k in item if k not in columns]
+        missing = [k for k in spec["required"] if item.get(k) in (None, "")]
+        invalid = invalid_values(columns, item, [k for k in item if k in columns])
+        if unknown:
+            errors.append({"op": "create", "index": i, "error": f"Columnas no permitidas: {', '.join(unknown)}"})
+        elif missing:
+            errors.append({"op": "create", "index": i, "error": f"Faltan campos: {', '.join(missing)}"})
+        elif invalid:
+            errors.append({"op": "create", "index": i, "error": f"Valores inválidos: {invalid}"})
+
+    seen = set()
+    for i, item in enumerate(updates):
+        if not isinstance(item, dict) or not is_int_id(item.get("id")):
+            errors.append({"op": "update", "index": i, "error": "Se requiere id entero"})
+            continue
+        fields = [k for k in item if k != "id"]
+        unknown = [k for k in fields if k not in columns or k in spec["create_only"]]
+        invalid = invalid_values(columns, item, [k for k in fields if k in columns])
+        if unknown:
+            errors.append({"op": "update", "index": i, "error": f"Columnas no permitidas: {', '.join(unknown)}"})
+        elif not fields:
+            errors.append({"op": "update", "index": i, "error": "Nada que actualizar"})
+        elif invalid:
+            errors.append({"op": "update", "index": i, "error": f"Valores inválidos: {invalid}"})
+        elif item["id"] in seen:
+            errors.append({"op": "update", "index": i, "error": "id repetido en el lote"})
+        seen.add(item["id"])
+
+    for i, item in enumerate(deletes):
+        if not is_int_id(item):
+            errors.append({"op": "delete", "index": i, "error": "Se requiere id entero"})
+
+    return creates, updates, deletes, errors
+
+def apply_batch(cur, spec, creates, updates, deletes, current_user_id):
+    """Aplica el lote sobre cur (sin commit) y devuelve los resultados por ítem."""
+    table = spec["table"]
+    columns = spec["columns"]
+    results = []
+
+    if creates:
+        cols = list(columns)
+        template = "(" + ", ".join(f"%s::{columns[c]}" for c in cols) + ", %s::integer, %s::integer)"
+        rows = [
+            tuple(item.get(c, spec["defaults"].get(c)) for c in cols) + (current_user_id, current_user_id)
+            for item in creates
+        ]
+        # INSERT ... VALUES devuelve las filas en el orden de VALUES
+        new_ids = psycopg2.extras.execute_values(cur, f"""
+            INSERT INTO {table} ({', '.join(cols)}, created_by, updated_by)
+            VALUES %s RETURNING id
+        """, rows, template=template, page_size=len(rows), fetch=True)
+        for i, row in enumerate(new_ids):
+            results.append({"op": "create", "index": i, "id": row[0], "status": "created"})
+
+    # Un UPDATE por cada combinación distinta de columnas
+    groups = {}
+    for i, item in enumerate(updates):
+        key = tuple(sorted(k for k in item if k != "id"))
+        groups.setdefault(key, []).append((i, item))
+    updated = set()
+    for cols, items in groups.items():
+        template = "(%s::integer, " + ", ".join(f"%s::{columns[c]}" for c in cols) + ", %s::integer)"
+        rows = [(item["id"],) + tuple(item[c] for c in cols) + (current_user_id,) for _, item in items]
+        set_sql = ", ".join(f"{c} = v.{c}" for c in cols)
+        returned = psycopg2.extras.execute_values(cur, f"""
+            UPDATE {table} AS t SET {set_sql}, updated_by = v.updated_by
+            FROM (VALUES %s) AS v(id, {', '.join(cols)}, updated_by)
+            WHERE t.id = v.id
+            RETURNING t.id
+        """, rows, template=template, page_size=len(rows), fetch=True)
+        updated.update(r[0] for r in returned)
+    for i, item in enumerate(updates):
+        status = "updated" if item["id"] in updated else "not_found"
+        results.append({"op": "update", "index": i, "id": item["id"], "status": status})
+
+    if deletes:
+        cur.execute(f"DELETE FROM {table} WHERE id = ANY(%s) RETURNING id", (list(deletes),))
+        deleted = {r[0] for r in cur.fetchall()}
+        for i, item_id in enumerate(deletes):
+            status = "deleted" if item_id in deleted else "not_found"
+            results.append({"op": "delete", "index": i, "id": item_id, "status": status})
+
+    return results
+
+def run_batch(cur, spec, creates, updates, deletes, current_user_id):
+    """apply_batch; si Postgres rechaza el lote, BatchRejected con los ítems que fallan."""
+    cur.execute("SAVEPOINT lote")
+    try:
+        return apply_batch(cur, spec, creates, updates, deletes, current_user_id)
+    except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+        cur.execute("ROLLBACK TO SAVEPOINT lote")
+        errors = locate_batch_errors(cur, spec, creates, updates, deletes, current_user_id)
+        # Sin culpable individual: el conflicto es entre ítems (p. ej. un código repetido)
+        raise BatchRejected(errors or [{"error": pg_error_message(e)}])
+
+def locate_batch_errors(cur, spec, creates, updates, deletes, current_user_id):
+    """Aplica los ítems de a uno, en el orden del lote, y devuelve los que Postgres rechaza."""
+    errors = []
+    items = ([("create", i, ([item], [], [])) for i, item in enumerate(creates)]
+             + [("update", i, ([], [item], [])) for i, item in enumerate(updates)]
+             + [("delete", i, ([], [], [item])) for i, item in enumerate(deletes)])
+    for op, i, (c, u, d) in items:
+        cur.execute("SAVEPOINT item")
+        try:
+            apply_batch(cur, spec, c, u, d, current_user_id)
+            cur.execute("RELEASE SAVEPOINT item")
+        except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+            cur.execute("ROLLBACK TO SAVEPOINT item")
+            errors.append({"op": op, "index": i, "error": pg_error_message(e)})
+    return errors
+
+def pg_error_message(e):
+    diag = getattr(e, "diag", None)
+    return (diag and diag.message_primary) or str(e).strip().split("\n")[0]
+
+def batch_summary(results):
+    summary = {"created": 0, "updated": 0, "deleted": 0, "not_found": 0}
+    for r in results:
+        summary[r["status"]] += 1
+    summary["results"] = results
+    return summary
+
+@app.route("/plan-maestro/batch", methods=["POST"])
+@session_required
+def batch_plan(current_user_id):
+    try:
+        creates, updates, deletes, errors = validate_batch(PLAN_BATCH, request.json)
+        if errors:
+            return jsonify({"error": "Lote inválido", "results": errors}), 400
+
+        # Si algo falla antes del commit, el pool hace rollback al devolver la conexión
+        with db_connection() as conn, blob_removals() as removed, conn.cursor() as cur:
+            # Los documentos de actividades eliminadas caen por ON DELETE CASCADE:
+            # se libera su referencia al archivo en la misma transacción
+            if deletes:
+                cur.execute("SELECT ruta_archivo FROM documentos WHERE plan_maestro_id = ANY(%s)", (list(deletes),))
+                for (ruta,) in cur.fetchall():
+                    release_blob(cur, ruta, removed)
+            results = run_batch(cur, PLAN_BATCH, creates, updates, deletes, current_user_id)
+            conn.commit()
+        mark_graph_dirty([r["id"] for r in results if r["status"] != "not_found"])
+        return jsonify(batch_summary(results))
+    except BatchRejected as e:
+        return jsonify({"error": str(e), "results": e.errors}), 400
+    except Exception as e:
+        traceback.print_exc()
+        return error_response(e)
+
+# -----------------------
+# PLAN MAESTRO: IMPORTACIÓN CSV/XLSX
+# -----------------------
+# POST /plan-maestro/import con el archivo en "file". Las filas se leen en
+# streaming, se validan y convierten con los tipos de PLAN_BATCH y las válidas
+# se vuelcan a un CSV temporal que entra con COPY a una tabla de staging. Desde
+# ahí un UPDATE ... FROM y un INSERT ... WHERE NOT EXISTS hacen el upsert por
+# activity_code en una sola transacción.
+#   ?dry_run=1  ejecuta todo y hace rollback: devuelve los conteos y errores
+#   ?partial=1  aplica las filas válidas aunque otras tengan errores
+# Sin partial, cualquier error deja la base intacta y responde 400.
+# Celda vacía = NULL (status vacío = 'Pendiente'); las columnas que no vienen
+# en el archivo no se tocan en las actividades existentes.
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "100000"))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "500"))  # errores detallados en la respuesta
+IMPORT_SPOOL_BYTES = 8 * 1024 * 1024  # CSV de staging en memoria hasta este tamaño, luego a disco
+
+PLAN_IMPORT_LENGTHS = {
+    "activity_code": 50, "product_code": 100, "type_tag": 50, "dependency_code": 100,
+    "primary_role": 50, "primary_responsible": 100, "status": 50,
+}
+
+# Encabezados alternativos (normalizados con import_header_key)
+PLAN_IMPORT_ALIASES = {
+    "codigo": "activity_code", "codigo_actividad": "activity_code", "producto": "product_code",
+    "actividad": "task_name", "tarea": "task_name", "semana_inicio": "week_start",
+    "semana_fin": "week_end", "tipo": "type_tag", "dependencia": "dependency_code",
+    "evidencia": "evidence_requirement", "rol": "primary_role", "corresponsables": "co_responsibles",
+    "responsable": "primary_responsible", "estado": "status", "inicio": "fecha_inicio", "fin": "fecha_fin",
+}
+
+PLAN_IMPORT_STATUSES = {
+    "PENDIENTE": "Pendiente", "EN PROGRESO": "En Progreso", "EN CURSO": "En Progreso",
+    "COMPLETADO": "Completado", "FINALIZADO": "Completado", "ATRASADO": "Atrasado",
+}
+
+IMPORT_DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y")
+EXCEL_EPOCH = datetime.date(1899, 12, 30)
+
+def strip_accents(text):
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+def import_header_key(name):
+    key = re.sub(r"[^a-z0-9]+", "_", strip_accents(str(name or "")).lower()).strip("_")
+    return PLAN_IMPORT_ALIASES.get(key, key)
+
+def read_import_rows(file):
+    """Itera las filas del archivo (la primera es el encabezado) sin cargarlo entero."""
+    ext = os.path.splitext(file.filename or "")[1].lower()
+    if ext == ".xlsx":
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise InvalidParameter("El servidor no tiene openpyxl para leer XLSX: exportar la planilla como CSV")
+        try:
+            wb = load_workbook(file.stream, read_only=True, data_only=True)
+        except Exception:
+            raise InvalidParameter("XLSX inválido")
+        try:
+            for row in wb.active.iter_rows(values_only=True):
+                yield list(row)
+        finally:
+            wb.close()
+        return
+    if ext not in ("", ".csv", ".txt"):
+        raise InvalidParameter("Formato no soportado: usar CSV o XLSX")
+
+    # Excel en español exporta con ';' y en cp1252: se detectan con una muestra
+    sample = file.stream.read(65536)
+    file.stream.seek(0)
+    try:
+        sample.decode("utf-8")
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError as e:
+        # Un carácter multibyte cortado al final de la muestra no cuenta
+        encoding = "utf-8-sig" if e.start >= len(sample) - 3 else "cp1252"
+    try:
+        delimiter = csv.Sniffer().sniff(sample.decode(encoding, errors="ignore"), delimiters=",;\t").delimiter
+    except csv.Error:
+        delimiter = ","
+    text = io.TextIOWrapper(file.stream, encoding=encoding, newline="")
+    try:
+        yield from csv.reader(text, delimiter=delimiter)
+    finally:
+        text.detach()  # que no cierre el stream de la petición
+
+def map_import_header(header):
+    """Devuelve ([(índice, columna)], columnas ignoradas). Lanza InvalidParameter si el encabezado no sirve."""
+    columns, ignored, seen = [], [], set()
+    for i, name in enumerate(header):
+        key = import_header_key(name)
+        if not key:
+            continue
+        if key not in PLAN_BATCH["columns"]:
+            ignored.append(str(name))
+        elif key in seen:
+            raise InvalidParameter(f"Columna repetida en el encabezado: {key}")
+        else:
+            seen.add(key)
+            columns.append((i, key))
+    if "activity_code" not in seen:
+        raise InvalidParameter("Falta la columna activity_code (clave de la importación)")
+    if len(seen) == 1:
+        raise InvalidParameter("El archivo no trae columnas para importar además de activity_code")
+    return columns, ignored
+
+def coerce_import_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    if isinstance(value, (int, float)):
+        # Celda numérica de Excel sin formato de fecha (días desde 1899-12-30)
+        return EXCEL_EPOCH + datetime.timedelta(days=int(value))
+    text = str(value)
+    if re.match(r"\d{4}-\d{2}-\d{2}[T ]", text):
+        text = text[:10]
+    for fmt in IMPORT_DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError("Fecha inválida (usar AAAA-MM-DD o DD/MM/AAAA)")
+
+def coerce_import_value(column, value):
+    """Convierte una celda al tipo de la columna; ValueError con el motivo si no se puede."""
+    if isinstance(value, str):
+        value = value.strip()
+    if value is None or value == "":
+        return "Pendiente" if column == "status" else None
+
+    sql_type = PLAN_BATCH["columns"][column]
+    if sql_type == "integer":
+        if isinstance(value, bool):
+            raise ValueError("Se esperaba un número entero")
+        try:
+            number = float(value.replace(",", ".")) if isinstance(value, str) else float(value)
+        except ValueError:
+            raise ValueError("Se esperaba un número entero")
+        if not number.is_integer() or number < 0:
+            raise ValueError("Se esperaba un número entero no negativo")
+        return int(number)
+    if sql_type == "date":
+        value = coerce_import_date(value)
+        if not 1900 <= value.year <= 2100:
+            raise ValueError("Fecha fuera de rango")
+        return value
+
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # un código "3" que Excel guardó como 3.0
+    text = str(value).replace("\x00", "")
+    if column == "status":
+        text = PLAN_IMPORT_STATUSES.get(strip_accents(text).upper())
+        if text is None:
+            raise ValueError(f"Estado inválido (permitidos: {', '.join(sorted(set(PLAN_IMPORT_STATUSES.values())))})")
+    limit = PLAN_IMPORT_LENGTHS.get(column)
+    if limit and len(text) > limit:
+        raise ValueError(f"Máximo {limit} caracteres")
+    return text
+
+def stage_import_rows(rows, columns, out):
+    """
+    Valida las filas y escribe las válidas como CSV (fila, columnas...) en out.
+    Devuelve {"rows", "valid", "errors", "error_count"}; fila = número de línea
+    en el archivo (el encabezado es la 1).
+    """
+    writer = csv.writer(out)
+    report = {"rows": 0, "valid": 0, "errors": [], "error_count": 0}
+    codes = {}
+
+    def add_error(line, column, message):
+        report["error_count"] += 1
+        if len(report["errors"]) < IMPORT_MAX_ERRORS:
+            report["errors"].append({"row": line, "column": column, "error": message})
+
+    for line, raw in enumerate(rows, start=2):
+        if not any(v not in (None, "") and str(v).strip() for v in raw):
+            continue  # filas en blanco (frecuentes al final de una planilla)
+        report["rows"] += 1
+        if report["rows"] > IMPORT_MAX_ROWS:
+            raise InvalidParameter(f"Máximo {IMPORT_MAX_ROWS} filas por importación")
+
+        values, ok = {}, True
+        for i, column in columns:
+            try:
+                values[column] = coerce_import_value(column, raw[i] if i < len(raw) else None)
+            except ValueError as e:
+                add_error(line, column, str(e))
+                ok = False
+        if not ok:
+            continue
+
+        code = values["activity_code"]
+        if code is None:
+            add_error(line, "activity_code", "Campo requerido")
+            continue
+        if "task_name" in values and values["task_name"] is None:
+            add_error(line, "task_name", "Campo requerido")
+            continue
+        if code in codes:
+            add_error(line, "activity_code", f"Repetido (ya viene en la fila {codes[code]})")
+            continue
+        if None not in (values.get("week_start"), values.get("week_end")) and values["week_end"] < values["week_start"]:
+            add_error(line, "week_end", "week_end anterior a week_start")
+            continue
+        if None not in (values.get("fecha_inicio"), values.get("fecha_fin")) and values["fecha_fin"] < values["fecha_inicio"]:
+            add_error(line, "fecha_fin", "fecha_fin anterior a fecha_inicio")
+            continue
+
+        codes[code] = line
+        # Cadena vacía sin comillas = NULL en COPY csv; los textos válidos nunca están vacíos
+        writer.writerow([line] + ["" if values[c] is None else values[c] for _, c in columns])
+        report["valid"] += 1
+    return report
+
+def apply_import(cur, columns, staged, current_user_id, report):
+    """Carga staged con COPY y hace el upsert sobre cur (sin commit). Devuelve los conteos."""
+    cols_sql = ", ".join(columns)
+    # CREATE TABLE AS copia los tipos de plan_maestro pero no el NOT NULL de task_name
+    cur.execute(f"""
+        CREATE TEMP TABLE plan_import ON COMMIT DROP AS
+        SELECT 0 AS fila, {cols_sql} FROM plan_maestro WITH NO DATA
+    """)
+    cur.copy_expert(f"COPY plan_import (fila, {cols_sql}) FROM STDIN WITH (FORMAT csv)", staged)
+    cur.execute("CREATE INDEX ON plan_import (activity_code)")
+    cur.execute("ANALYZE plan_import")
+
+    # Bloquea otras escrituras (no las lecturas) hasta el commit: dos importaciones
+    # a la vez podrían insertar dos veces el mismo activity_code
+    cur.execute("LOCK TABLE plan_maestro IN SHARE ROW EXCLUSIVE MODE")
+
+    new_filter = "NOT EXISTS (SELECT 1 FROM plan_maestro p WHERE p.activity_code = s.activity_code)"
+    if "task_name" not in columns:
+        # Sin task_name el archivo sólo puede actualizar actividades existentes
+        cur.execute(f"DELETE FROM plan_import s WHERE {new_filter} RETURNING fila")
+        for (line,) in sorted(cur.fetchall()):
+            report["error_count"] += 1
+            if len(report["errors"]) < IMPORT_MAX_ERRORS:
+                report["errors"].append({"row": line, "column": "activity_code",
+                                         "error": "Actividad nueva: el archivo no trae task_name"})
+            report["valid"] -= 1
+
+    cur.execute("SELECT count(*) FROM plan_maestro p JOIN plan_import s ON s.activity_code = p.activity_code")
+    matched = cur.fetchone()[0]
+
+    # Sólo se reescriben las filas que cambian: las demás no mueven updated_at ni la sync
+    updates = [c for c in columns if c != "activity_code"]
+    cur.execute(f"""
+        UPDATE plan_maestro p
+        SET {', '.join(f'{c} = s.{c}' for c in updates)}, updated_by = %s
+        FROM plan_import s
+        WHERE p.activity_code = s.activity_code
+          AND ({', '.join(f'p.{c}' for c in updates)}) IS DISTINCT FROM ({', '.join(f's.{c}' for c in updates)})
+    """, (current_user_id,))
+    updated = cur.rowcount
+
+    inserts = list(columns) if "status" in columns else list(columns) + ["status"]
+    select_sql = ", ".join(f"s.{c}" if c in columns else "'Pendiente'" for c in inserts)
+    cur.execute(f"""
+        INSERT INTO plan_maestro ({', '.join(inserts)}, created_by, updated_by)
+        SELECT {select_sql}, %s, %s
+        FROM plan_import s
+        WHERE {new_filter}
+        ORDER BY s.fila
+    """, (current_user_id, current_user_id))
+    created = cur.rowcount
+
+    return {"created": created, "updated": updated, "unchanged": matched - updated}
+
+@app.route("/plan-maestro/import", methods=["POST"])
+@session_required
+def import_plan(current_user_id):
+    try:
+        file = request.files.get("file")
+        if file is None or file.filename == "":
+            return jsonify({"error": "No file part"}), 400
+        dry_run = request.args.get("dry_run") in ("1", "true")
+        partial = request.args.get("partial") in ("1", "true")
+
+        rows = read_import_rows(file)
+        header = next(rows, None)
+        if header is None:
+            raise InvalidParameter("Archivo vacío")
+        columns, ignored = map_import_header(header)
+
+        with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES, mode="w+", newline="",
+                                           encoding="utf-8") as staged:
+            report = stage_import_rows(rows, columns, staged)
+            report["ignored_columns"] = ignored
+            report["dry_run"] = dry_run
+            staged.seek(0)
+
+            # Con dry_run se calcula igual el resultado de las filas válidas
+            if report["error_count"] and not partial and not dry_run:
+                return jsonify({"error": "Importación con errores: no se aplicó ningún cambio", **report}), 400
+
+            with db_connection() as conn, conn.cursor() as cur:
+                counts = apply_import(cur, [c for _, c in columns], staged, current_user_id, report)
+                report.update(counts)
+                if report["error_count"] and not partial and not dry_run:
+                    conn.rollback()
+                    return jsonify({"error": "Importación con errores: no se aplicó ningún cambio", **report}), 400
+                if dry_run:
+                    conn.rollback()
+                else:
+                    conn.commit()
+
+        if not dry_run:
+            mark_graph_dirty()
+        return jsonify(report)
+    except Exception as e:
+        traceback.print_exc()
+        return error_response(e)
 
 # -----------------------
 # HITOS
@@ -332,46 +2598,42 @@ def update_plan_item(current_user_id, id_item):
 @app.route("/plan-maestro/<int:plan_id>/hitos", methods=["GET"])
 @session_required
 def get_hitos(current_user_id, plan_id):
-    conn = None
     try:
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
             cur.execute("SELECT * FROM hitos WHERE plan_maestro_id = %s ORDER BY fecha_estimada", (plan_id,))
             rows = cur.fetchall()
         return jsonify(rows)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
+
+HITOS_LIST_SQL = """
+    SELECT h.*, p.activity_code, p.task_name
+    FROM hitos h
+    JOIN plan_maestro p ON h.plan_maestro_id = p.id
+"""
 
 @app.route("/hitos", methods=["GET"])
 @session_required
+@cached_response("hitos", "plan_maestro")
 def get_all_hitos(current_user_id):
-    conn = None
     try:
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute("""
-                SELECT h.*, p.activity_code, p.task_name 
-                FROM hitos h
-                JOIN plan_maestro p ON h.plan_maestro_id = p.id
-                ORDER BY h.fecha_estimada
-            """)
-            rows = cur.fetchall()
-        return jsonify(rows)
+        page = get_page_args()
+        stream_fmt = get_stream_format()
+        conditions, params = hitos_window_filter()
+        if stream_fmt and not page:
+            return stream_list(HITOS_LIST_SQL, ORDER_HITOS, stream_fmt, conditions, params)
+        with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            result = query_list(cur, HITOS_LIST_SQL, ORDER_HITOS, page, conditions, params)
+        return jsonify(result)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
 
 @app.route("/hitos", methods=["POST"])
 @session_required
 def create_hito(current_user_id):
-    conn = None
     try:
         data = request.json
-        conn = get_db_connection()
-        with conn.cursor() as cur:
+        with db_connection() as conn, conn.cursor() as cur:
             cur.execute("""
                 INSERT INTO hitos (
                     plan_maestro_id, nombre, fecha_estimada, descripcion,
@@ -386,18 +2648,32 @@ def create_hito(current_user_id):
             conn.commit()
         return jsonify({"id": new_id, "message": "Hito creado"}), 201
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
+
+@app.route("/hitos/batch", methods=["POST"])
+@session_required
+def batch_hitos(current_user_id):
+    try:
+        creates, updates, deletes, errors = validate_batch(HITOS_BATCH, request.json)
+        if errors:
+            return jsonify({"error": "Lote inválido", "results": errors}), 400
+
+        with db_connection() as conn, conn.cursor() as cur:
+            results = run_batch(cur, HITOS_BATCH, creates, updates, deletes, current_user_id)
+            conn.commit()
+        return jsonify(batch_summary(results))
+    except BatchRejected as e:
+        return jsonify({"error": str(e), "results": e.errors}), 400
+    except Exception as e:
+        traceback.print_exc()
+        return error_response(e)
 
 @app.route("/hitos/<int:hito_id>", methods=["PUT", "DELETE"])
 @session_required
 def update_delete_hito(current_user_id, hito_id):
-    conn = None
     try:
-        conn = get_db_connection()
         if request.method == "DELETE":
-            with conn.cursor() as cur:
+            with db_connection() as conn, conn.cursor() as cur:
                 cur.execute("DELETE FROM hitos WHERE id = %s", (hito_id,))
                 conn.commit()
             return jsonify({"message": "Hito eliminado"})
@@ -427,17 +2703,237 @@ def update_delete_hito(current_user_id, hito_id):
             values.append(current_user_id)
             values.append(hito_id)
             
-            with conn.cursor() as cur:
+            with db_connection() as conn, conn.cursor() as cur:
                 cur.execute(f"UPDATE hitos SET {', '.join(fields)} WHERE id = %s", tuple(values))
                 conn.commit()
             return jsonify({"message": "Hito actualizado"})
             
     except Exception as e:
         traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
+
+
+# -----------------------
+# ESTADÍSTICAS (DASHBOARD)
+# -----------------------
+# KPIs agregados en SQL para no bajar el plan completo al navegador. Cada
+# worker cachea el resultado junto con las versiones de plan_maestro e hitos
+# (versiones_tablas, como la caché de listados) leídas antes de calcularlo:
+# una escritura desde cualquier worker o proceso avanza la versión y la
+# entrada deja de servir. X-Min-Data-Version asegura que el cliente vea sus
+# propias escrituras. STATS_CACHE_TTL acota igual la entrada porque
+# "upcoming" depende de CURRENT_DATE. Sin la migración 7 no se cachea.
+STATS_CACHE_TTL = int(os.getenv("STATS_CACHE_TTL", "30"))
+STATS_TABLES = ("plan_maestro", "hitos")
+STATS_UPCOMING_DAYS = 30
+STATS_UPCOMING_LIMIT = 5
+STATS_DONE = ("COMPLETADO", "FINALIZADO")
+STATS_IN_PROGRESS = ("EN PROGRESO",)
+
+_stats_cache = {"data": None, "versions": None, "expires": 0.0}
+_stats_lock = threading.Lock()
+
+def compute_stats(cur):
+    cur.execute("""
+        SELECT count(*) AS total,
+               count(*) FILTER (WHERE upper(status) IN %s) AS completed,
+               count(*) FILTER (WHERE upper(status) IN %s) AS in_progress
+        FROM plan_maestro
+    """, (STATS_DONE, STATS_IN_PROGRESS))
+    stats = dict(cur.fetchone())
+
+    cur.execute("SELECT count(*) AS milestones FROM hitos")
+    stats["milestones"] = cur.fetchone()["milestones"]
+
+    cur.execute("""
+        SELECT COALESCE(status, 'PENDIENTE') AS k, count(*) AS n
+        FROM plan_maestro GROUP BY 1 ORDER BY 2 DESC
+    """)
+    stats["by_status"] = {r["k"]: r["n"] for r in cur.fetchall()}
+
+    cur.execute("""
+        SELECT COALESCE(primary_responsible, 'Sin asignar') AS k, count(*) AS n
+        FROM plan_maestro GROUP BY 1 ORDER BY 2 DESC
+    """)
+    stats["by_responsible"] = {r["k"]: r["n"] for r in cur.fetchall()}
+
+    # Mismo criterio que el gráfico: '1.1 | Coordinación' -> '1.1'
+    cur.execute("""
+        SELECT trim(split_part(COALESCE(product_code, 'General'), '|', 1)) AS k, count(*) AS n
+        FROM plan_maestro GROUP BY 1 ORDER BY 1
+    """)
+    stats["by_product"] = {r["k"]: r["n"] for r in cur.fetchall()}
+
+    cur.execute("""
+        SELECT COALESCE(estado, 'Pendiente') AS k, count(*) AS n
+        FROM hitos GROUP BY 1 ORDER BY 2 DESC
+    """)
+    stats["milestones_by_status"] = {r["k"]: r["n"] for r in cur.fetchall()}
+
+    cur.execute("""
+        SELECT id, activity_code, task_name, primary_responsible, status, fecha_fin
+        FROM plan_maestro
+        WHERE fecha_fin BETWEEN CURRENT_DATE AND CURRENT_DATE + %s
+          AND upper(COALESCE(status, '')) NOT IN %s
+        ORDER BY fecha_fin, id
+        LIMIT %s
+    """, (STATS_UPCOMING_DAYS, STATS_DONE, STATS_UPCOMING_LIMIT))
+    stats["upcoming"] = cur.fetchall()
+    return stats
+
+@app.route("/stats", methods=["GET"])
+@session_required
+def get_stats(current_user_id):
+    try:
+        versions = response_cache.current_versions(
+            STATS_TABLES, parse_data_versions(request.headers.get("X-Min-Data-Version")))
+        with _stats_lock:
+            if (versions is not None and _stats_cache["versions"] == versions
+                    and time.monotonic() < _stats_cache["expires"]):
+                return jsonify(_stats_cache["data"])
+
+        with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            stats = compute_stats(cur)
+
+        if versions is not None:
+            # Las versiones se leyeron antes que los datos: lo guardado es
+            # igual o más nuevo que lo que indican
+            with _stats_lock:
+                _stats_cache.update(data=stats, versions=versions,
+                                    expires=time.monotonic() + STATS_CACHE_TTL)
+        return jsonify(stats)
+    except Exception as e:
+        traceback.print_exc()
+        return error_response(e)
 
+# -----------------------
+# ALMACENAMIENTO DE ARCHIVOS (POR CONTENIDO)
+# -----------------------
+# Los uploads se copian a disco por bloques calculando SHA-256 y tamaño en la
+# misma pasada, y se guardan en uploads/blobs/<aa>/<sha256><ext>. Un mismo
+# archivo subido a varias actividades ocupa una sola copia: archivos_blob
+# lleva la cuenta de referencias y el archivo sólo se borra con la última.
+# Las operaciones sobre disco se hacen con la fila del blob bloqueada (dentro
+# de la transacción), para que una subida y un borrado simultáneos del mismo
+# contenido no se pisen. Si la transacción falla, blob_placements retira los
+# archivos que ella misma dejó en su ruta final (y blob_removals restaura los
+# que apartó) antes del rollback, todavía con la fila bloqueada.
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+BLOB_DIR = "blobs"
+
+def save_upload_stream(file):
+    """Copia el upload a un temporal por bloques. Devuelve (ruta_tmp, sha256, tamaño)."""
+    tmp_dir = os.path.join(app.config['UPLOAD_FOLDER'], "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = file.stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest(), size
+
+def upload_mimetype(file, filename):
+    guessed = mimetypes.guess_type(filename)[0]
+    if file.mimetype and file.mimetype != "application/octet-stream":
+        return file.mimetype
+    return guessed or "application/octet-stream"
+
+def store_blob(cur, tmp_path, digest, size, filename, mimetype, placed):
+    """
+    Suma una referencia al blob y deja el archivo en su ruta final (si es nuevo
+    se agrega a placed; blob_placements lo retira si la transacción falla).
+    Devuelve la ruta relativa.
+    """
+    # La extensión se conserva para que send_file y el visor sepan el tipo
+    ruta = f"{BLOB_DIR}/{digest[:2]}/{digest}{os.path.splitext(filename)[1].lower()}"
+    cur.execute("""
+        INSERT INTO archivos_blob (ruta, sha256, tamano_bytes, tipo_mime)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (ruta) DO UPDATE SET ref_count = archivos_blob.ref_count + 1
+    """, (ruta, digest, size, mimetype))
+    final_path = os.path.join(app.config['UPLOAD_FOLDER'], ruta)
+    if os.path.exists(final_path):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(tmp_path, final_path)
+        placed.append(final_path)
+    return ruta
+
+def release_blob(cur, ruta, removed):
+    """
+    Resta una referencia. Si era la última, borra la fila y aparta el archivo
+    (se agrega a removed); blob_removals lo borra tras el commit o lo restaura.
+    """
+    if not ruta:
+        return
+    cur.execute("UPDATE archivos_blob SET ref_count = ref_count - 1 WHERE ruta = %s RETURNING ref_count",
+                (ruta,))
+    row = cur.fetchone()
+    if row is not None:
+        if row[0] > 0:
+            return
+        cur.execute("DELETE FROM archivos_blob WHERE ruta = %s", (ruta,))
+    # Sin fila: archivo anterior al almacenamiento por contenido, no compartido
+    path = os.path.join(app.config['UPLOAD_FOLDER'], ruta)
+    if os.path.exists(path):
+        trash = f"{path}.borrando-{uuid.uuid4().hex}"
+        os.replace(path, trash)
+        removed.append((path, trash))
+
+@contextmanager
+def blob_removals():
+    """Acompaña a una transacción que libera blobs: borra al salir bien, restaura si falla."""
+    removed = []
+    try:
+        yield removed
+    except BaseException:
+        for path, trash in removed:
+            os.replace(trash, path)
+        raise
+    for _, trash in removed:
+        try:
+            os.remove(trash)
+        except OSError:
+            pass
+
+@contextmanager
+def blob_placements():
+    """Acompaña a una transacción que agrega blobs: si falla, borra los archivos que colocó."""
+    placed = []
+    try:
+        yield placed
+    except BaseException:
+        # Ninguna fila confirmada los referencia: la fila nueva se pierde con el rollback
+        for path in placed:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        raise
+
+# -----------------------
+# COLA DE INDEXACIÓN
+# -----------------------
+# Los archivos subidos se encolan en cola_indexacion (misma transacción que el
+# documento) y el proceso indexer.py extrae su texto fuera del servidor web.
+# El NOTIFY se entrega al hacer commit y despierta a los indexadores en espera.
+def enqueue_indexing(cur, ruta, documento_id=None, repositorio_id=None):
+    cur.execute("""
+        INSERT INTO cola_indexacion (documento_id, repositorio_id, ruta_archivo)
+        VALUES (%s, %s, %s)
+    """, (documento_id, repositorio_id, ruta))
+    cur.execute("NOTIFY cola_indexacion")
 
 # -----------------------
 # UPLOAD (Simulada)
@@ -445,34 +2941,32 @@ def update_delete_hito(current_user_id, hito_id):
 # -----------------------
 # DOCUMENTOS
 # -----------------------
+DOCS_LIST_SQL = """
+    SELECT d.*, p.activity_code, p.task_name, u.nombre as uploader
+    FROM documentos d
+    JOIN plan_maestro p ON d.plan_maestro_id = p.id
+    LEFT JOIN usuarios u ON d.uploaded_by = u.id
+"""
+
 @app.route("/documentos", methods=["GET"])
 @session_required
 def get_all_docs(current_user_id):
-    conn = None
     try:
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute("""
-                SELECT d.*, p.activity_code, p.task_name, u.nombre as uploader
-                FROM documentos d
-                JOIN plan_maestro p ON d.plan_maestro_id = p.id
-                LEFT JOIN usuarios u ON d.uploaded_by = u.id
-                ORDER BY d.created_at DESC
-            """)
-            rows = cur.fetchall()
-        return jsonify(rows)
+        page = get_page_args()
+        stream_fmt = get_stream_format()
+        if stream_fmt and not page:
+            return stream_list(DOCS_LIST_SQL, ORDER_DOCS, stream_fmt)
+        with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            result = query_list(cur, DOCS_LIST_SQL, ORDER_DOCS, page)
+        return jsonify(result)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
 
 @app.route("/plan-maestro/<int:plan_id>/documentos", methods=["GET"])
 @session_required
 def get_plan_docs(current_user_id, plan_id):
-    conn = None
     try:
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
             # Simple query debugged
             cur.execute("""
                 SELECT d.id, d.nombre_archivo, d.ruta_archivo, d.created_at, d.uploaded_by,
@@ -486,14 +2980,11 @@ def get_plan_docs(current_user_id, plan_id):
         return jsonify(rows)
     except Exception as e:
         traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
 
 @app.route("/upload", methods=["POST"])
 @session_required
 def upload_file(current_user_id):
-    conn = None
     try:
         plan_id = request.form.get("plan_id")
         if 'file' not in request.files:
@@ -503,78 +2994,57 @@ def upload_file(current_user_id):
             return jsonify({"error": "No selected file"}), 400
 
         original_filename = secure_filename(file.filename)
+        mimetype = upload_mimetype(file, original_filename)
+        tmp_path, digest, size = save_upload_stream(file)
         
-        # Generate unique physical filename to prevent conflicts
-        unique_filename = f"{uuid.uuid4().hex}_{original_filename}"
-        
-        save_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(save_path)
+        # In DB: nombre_archivo is display name, ruta_archivo is the content-addressed blob
         
-        # In DB: nombre_archivo is display name, ruta_archivo is physical unique name
-        
-        conn = get_db_connection()
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO documentos (
-                    plan_maestro_id, nombre_archivo, ruta_archivo,
-                    uploaded_by
-                ) VALUES (%s, %s, %s, %s) RETURNING id
-            """, (plan_id, original_filename, unique_filename, current_user_id))
-            
-            doc_id = cur.fetchone()[0]
-            
-            # Actualizar flag en maestro
-            cur.execute("UPDATE plan_maestro SET has_file_uploaded = TRUE WHERE id = %s", (plan_id,))
-            
-            conn.commit()
+        try:
+            with db_connection() as conn, blob_placements() as placed, conn.cursor() as cur:
+                ruta = store_blob(cur, tmp_path, digest, size, original_filename, mimetype, placed)
+                # has_file_uploaded y n_documentos los actualiza el trigger de documentos
+                cur.execute("""
+                    INSERT INTO documentos (
+                        plan_maestro_id, nombre_archivo, ruta_archivo,
+                        tipo_archivo, tamano_bytes, uploaded_by
+                    ) VALUES (%s, %s, %s, %s, %s, %s) RETURNING id
+                """, (plan_id, original_filename, ruta, mimetype, size, current_user_id))
+                doc_id = cur.fetchone()[0]
+                enqueue_indexing(cur, ruta, documento_id=doc_id)
+                conn.commit()
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             
         return jsonify({"message": "Archivo subido"}), 201
     except Exception as e:
         traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
 
 @app.route("/documentos/<int:doc_id>", methods=["DELETE"])
 @session_required
 def delete_document(current_user_id, doc_id):
-    conn = None
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
+        with db_connection() as conn, blob_removals() as removed, conn.cursor() as cur:
             # 1. Get info
-            cur.execute("SELECT ruta_archivo, plan_maestro_id FROM documentos WHERE id = %s", (doc_id,))
+            cur.execute("SELECT ruta_archivo FROM documentos WHERE id = %s", (doc_id,))
             row = cur.fetchone()
             if not row:
                 return jsonify({"error": "Documento no encontrado"}), 404
             
             filename = row[0]
-            plan_id = row[1]
             
-            # 2. Delete file
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            if os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                except:
-                    pass 
+            # 2. Release file (only unlinked when no other document references it)
+            release_blob(cur, filename, removed)
             
-            # 3. Delete DB record
+            # 3. Delete DB record (el trigger descuenta n_documentos y, si era el
+            # último, apaga has_file_uploaded)
             cur.execute("DELETE FROM documentos WHERE id = %s", (doc_id,))
-            
-            # 4. Check if Plan still has docs
-            cur.execute("SELECT COUNT(*) FROM documentos WHERE plan_maestro_id = %s", (plan_id,))
-            count = cur.fetchone()[0]
-            if count == 0:
-                cur.execute("UPDATE plan_maestro SET has_file_uploaded = FALSE WHERE id = %s", (plan_id,))
-                
             conn.commit()
             
         return jsonify({"message": "Documento eliminado"})
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
 
 
 # -----------------------
@@ -583,10 +3053,8 @@ def delete_document(current_user_id, doc_id):
 @app.route("/plan-maestro/<int:plan_id>/observaciones", methods=["GET"])
 @session_required
 def get_observaciones(current_user_id, plan_id):
-    conn = None
     try:
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
             cur.execute("""
                 SELECT o.id, o.texto, o.created_at, 
                        u.nombre as usuario_nombre, u.username as usuario_username
@@ -598,22 +3066,18 @@ def get_observaciones(current_user_id, plan_id):
             rows = cur.fetchall()
         return jsonify(rows)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
 
 @app.route("/plan-maestro/<int:plan_id>/observaciones", methods=["POST"])
 @session_required
 def add_observacion(current_user_id, plan_id):
-    conn = None
     try:
         data = request.json
         texto = data.get("texto")
         if not texto:
             return jsonify({"error": "Texto requerido"}), 400
 
-        conn = get_db_connection()
-        with conn.cursor() as cur:
+        with db_connection() as conn, conn.cursor() as cur:
             cur.execute("""
                 INSERT INTO observaciones (plan_maestro_id, usuario_id, texto)
                 VALUES (%s, %s, %s)
@@ -623,42 +3087,38 @@ def add_observacion(current_user_id, plan_id):
             conn.commit()
         return jsonify({"id": new_id, "message": "Observación agregada"}), 201
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
 
 
 
+OBS_LIST_SQL = """
+    SELECT o.id, o.texto, o.created_at,
+           u.nombre as usuario_nombre,
+           p.activity_code, p.task_name, p.id as plan_id
+    FROM observaciones o
+    LEFT JOIN usuarios u ON o.usuario_id = u.id
+    JOIN plan_maestro p ON o.plan_maestro_id = p.id
+"""
+
 @app.route("/observaciones", methods=["GET"])
 @session_required
 def get_all_observaciones(current_user_id):
-    conn = None
     try:
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute("""
-                SELECT o.id, o.texto, o.created_at, 
-                       u.nombre as usuario_nombre,
-                       p.activity_code, p.task_name, p.id as plan_id
-                FROM observaciones o
-                LEFT JOIN usuarios u ON o.usuario_id = u.id
-                JOIN plan_maestro p ON o.plan_maestro_id = p.id
-                ORDER BY o.created_at DESC
-            """)
-            rows = cur.fetchall()
-        return jsonify(rows)
+        page = get_page_args()
+        stream_fmt = get_stream_format()
+        if stream_fmt and not page:
+            return stream_list(OBS_LIST_SQL, ORDER_OBS, stream_fmt)
+        with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            result = query_list(cur, OBS_LIST_SQL, ORDER_OBS, page)
+        return jsonify(result)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
 
 @app.route("/observaciones/<int:obs_id>", methods=["PUT", "DELETE"])
 @session_required
 def manage_observacion(current_user_id, obs_id):
-    conn = None
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
+        with db_connection() as conn, conn.cursor() as cur:
             # Check ownership or admin
             cur.execute("SELECT usuario_id FROM observaciones WHERE id = %s", (obs_id,))
             row = cur.fetchone()
@@ -685,38 +3145,449 @@ def manage_observacion(current_user_id, obs_id):
                 return jsonify({"message": "Actualizado"})
 
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return error_response(e)
+
+
+# -----------------------
+# EXPORTACIÓN (CSV / XLSX / PARQUET)
+# -----------------------
+# GET /export/<entidad>.<formato> para reportes: plan, hitos y observaciones
+# (bitácora), con filtros ?status=, ?product= (listas separadas por coma),
+# ?from=/?to= (AAAA-MM-DD) y, para el plan, ?counts=1 con los totales de
+# hitos, documentos y observaciones por actividad.
+# CSV sale directo de COPY (...) TO STDOUT: un thread corre el COPY y pasa los
+# bloques por una cola acotada al generador de la respuesta, así la memoria no
+# depende del tamaño de la tabla. XLSX (openpyxl) y Parquet (pyarrow) se
+# escriben desde un cursor con nombre a un archivo temporal en disco que luego
+# se envía por bloques.
+EXPORT_CHUNK_BYTES = 64 * 1024
+EXPORT_QUEUE_CHUNKS = 16          # hasta ~1 MB en vuelo por export
+EXPORT_FETCH_ROWS = 5000
+XLSX_MAX_ROWS = 1048576
+
+EXPORTS = {
+    "plan": {
+        "filename": "plan_maestro",
+        "select": """
+            SELECT p.id, p.activity_code, p.product_code, p.task_name, p.week_start, p.week_end,
+                   p.type_tag, p.dependency_code, p.evidence_requirement, p.primary_role,
+                   p.co_responsibles, p.primary_responsible, p.status, p.has_file_uploaded,
+                   p.fecha_inicio, p.fecha_fin, p.created_at, p.updated_at{counts}
+            FROM plan_maestro p
+        """,
+        "status": "p.status",
+        "dates": ("p.fecha_inicio", "p.fecha_fin"),
+        "order": "p.id",
+    },
+    "hitos": {
+        "filename": "hitos",
+        "select": """
+            SELECT h.id, h.plan_maestro_id, p.activity_code, p.task_name, p.product_code,
+                   h.nombre, h.fecha_estimada, h.fecha_real, h.estado, h.descripcion,
+                   h.created_at, h.updated_at
+            FROM hitos h
+            JOIN plan_maestro p ON h.plan_maestro_id = p.id
+        """,
+        "status": "h.estado",
+        "dates": ("h.fecha_estimada", "h.fecha_estimada"),
+        "order": "h.id",
+    },
+    "observaciones": {
+        "filename": "bitacora",
+        "select": """
+            SELECT o.id, o.plan_maestro_id, p.activity_code, p.task_name, p.product_code,
+                   u.nombre AS usuario, o.texto, o.created_at, o.updated_at
+            FROM observaciones o
+            JOIN plan_maestro p ON o.plan_maestro_id = p.id
+            LEFT JOIN usuarios u ON o.usuario_id = u.id
+        """,
+        "status": "p.status",
+        "dates": ("o.created_at", "o.created_at"),
+        "order": "o.id",
+    },
+}
+EXPORT_ALIASES = {"plan-maestro": "plan", "bitacora": "observaciones"}
+
+# Totales por actividad: los contadores de plan_maestro (migración 6)
+EXPORT_COUNTS_SELECT = """,
+                   p.n_hitos AS total_hitos, p.n_documentos AS total_documentos,
+                   p.n_observaciones AS total_observaciones"""
+
+def parse_export_date(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise InvalidParameter(f"Parámetro {name} inválido (usar AAAA-MM-DD)")
+
+def build_export_sql(spec):
+    """SELECT del export con los filtros de la query string. Devuelve (sql, params)."""
+    counts = request.args.get("counts", "").lower() in ("1", "true", "yes")
+    if counts and spec is not EXPORTS["plan"]:
+        raise InvalidParameter("counts sólo aplica al export del plan")
+    sql = spec["select"].format(counts=EXPORT_COUNTS_SELECT if counts else "")
+
+    conditions, params = [], []
+    statuses = [s.strip().upper() for s in request.args.get("status", "").split(",") if s.strip()]
+    if statuses:
+        conditions.append(f"upper({spec['status']}) = ANY(%s)")
+        params.append(statuses)
+    products = [s.strip() for s in request.args.get("product", "").split(",") if s.strip()]
+    if products:
+        # '1.1' o '1.1 | Coordinación': mismo criterio que las estadísticas
+        conditions.append("(p.product_code = ANY(%s) OR trim(split_part(p.product_code, '|', 1)) = ANY(%s))")
+        params += [products, products]
+    # Rango que se solapa con [from, to]; para timestamps, to incluye el día completo
+    start_col, end_col = spec["dates"]
+    date_from, date_to = parse_export_date("from"), parse_export_date("to")
+    if date_from and date_to and date_to < date_from:
+        raise InvalidParameter("to anterior a from")
+    if date_from:
+        conditions.append(f"{end_col} >= %s")
+        params.append(date_from)
+    if date_to:
+        conditions.append(f"{start_col} < %s")
+        params.append(date_to + datetime.timedelta(days=1))
+
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    return sql + f" ORDER BY {spec['order']}", params
+
+class CopyPipe:
+    """
+    Archivo de sólo escritura para copy_expert: agrupa las filas en bloques de
+    EXPORT_CHUNK_BYTES y los pasa a una cola acotada (None marca el final).
+    Si el cliente corta, cancelled hace que lo que queda se descarte.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue(EXPORT_QUEUE_CHUNKS)
+        self.cancelled = threading.Event()
+        self.buffer = []
+        self.size = 0
+        self.error = None
+
+    def _put(self, item):
+        while not self.cancelled.is_set():
+            try:
+                self.queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+
+    def write(self, data):
+        self.buffer.append(data)
+        self.size += len(data)
+        if self.size >= EXPORT_CHUNK_BYTES:
+            self._put(b"".join(self.buffer))
+            self.buffer, self.size = [], 0
+
+    def close(self):
+        if self.buffer:
+            self._put(b"".join(self.buffer))
+        self._put(None)
+
+def stream_copy(sql, params, filename):
+    """Response que emite COPY (sql) TO STDOUT en CSV mientras Postgres lo produce."""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        copy_sql = cur.mogrify(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER)", params).decode()
+    except Exception:
+        release_db_connection(conn)
+        raise
+
+    pipe = CopyPipe()
+
+    def run_copy():
+        try:
+            cur.copy_expert(copy_sql, pipe)
+        except Exception as e:
+            pipe.error = e
+        finally:
+            pipe.close()
+
+    worker = threading.Thread(target=run_copy, name="export-copy", daemon=True)
+    worker.start()
+
+    @release_once
+    def release():
+        if worker.is_alive():
+            # El cliente cortó (o el cuerpo no se envía): que Postgres aborte
+            # el COPY en vez de terminarlo
+            pipe.cancelled.set()
+            conn.cancel()
+        worker.join()
+        cur.close()
+        release_db_connection(conn)
+
+    def generate():
+        try:
+            # BOM: Excel abre el CSV como UTF-8 (el import lo acepta igual)
+            yield "\ufeff".encode()
+            while True:
+                chunk = pipe.queue.get()
+                if chunk is None:
+                    break
+                yield chunk
+            if pipe.error is not None:
+                # Ya se enviaron cabeceras: sólo queda registrar y cortar el stream
+                print(f"Error en export {filename}: {pipe.error}")
+        finally:
+            release()
+
+    return closing_response(generate(), release, mimetype="text/csv", headers={
+        "Content-Disposition": f'attachment; filename="{filename}.csv"',
+        "X-Accel-Buffering": "no",
+    })
+
+def export_rows(cur, sql, params):
+    """Itera (columnas, bloque de filas) con un cursor con nombre, de a EXPORT_FETCH_ROWS."""
+    cur.execute(sql, params)
+    columns = None
+    while True:
+        rows = cur.fetchmany(EXPORT_FETCH_ROWS)
+        if columns is None:
+            # En un cursor con nombre description existe recién tras el primer
+            # fetch; el primer bloque se entrega aunque venga vacío (encabezados)
+            columns = [d.name for d in cur.description]
+        elif not rows:
+            return
+        yield cur.description, columns, rows
+        if not rows:
+            return
+
+def write_xlsx(cur, sql, params, out):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise InvalidParameter("El servidor no tiene openpyxl: usar el export CSV")
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    total = 0
+    for _, columns, rows in export_rows(cur, sql, params):
+        if total == 0:
+            ws.append(columns)
+        total += len(rows)
+        if total >= XLSX_MAX_ROWS:
+            raise InvalidParameter("XLSX admite hasta 1.048.576 filas: usar CSV o Parquet")
+        for row in rows:
+            # Excel no guarda zona horaria: se exporta la hora local de la sesión
+            ws.append([v.replace(tzinfo=None) if isinstance(v, datetime.datetime) else v for v in row])
+    wb.save(out)
+
+def parquet_schema(pa, description):
+    types = {16: pa.bool_(), 20: pa.int64(), 21: pa.int64(), 23: pa.int64(), 1082: pa.date32(),
+             1114: pa.timestamp("us"), 1184: pa.timestamp("us", tz="UTC")}
+    return pa.schema([(d.name, types.get(d.type_code, pa.string())) for d in description])
+
+def write_parquet(cur, sql, params, out):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise InvalidParameter("El servidor no tiene pyarrow: usar el export CSV")
+    writer = None
+    try:
+        # Un row group por bloque: nunca hay más de EXPORT_FETCH_ROWS filas en memoria
+        for description, columns, rows in export_rows(cur, sql, params):
+            if writer is None:
+                schema = parquet_schema(pa, description)
+                writer = pq.ParquetWriter(out, schema, compression="zstd")
+            data = {c: [row[i] for row in rows] for i, c in enumerate(columns)}
+            writer.write_table(pa.Table.from_pydict(data, schema=schema))
     finally:
-        if conn: release_db_connection(conn)
+        if writer is not None:
+            writer.close()
+
+EXPORT_WRITERS = {
+    "xlsx": (write_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "parquet": (write_parquet, "application/vnd.apache.parquet"),
+}
+
+def send_spooled(out, filename, mimetype):
+    """Envía el archivo temporal por bloques y lo cierra (y borra) al terminar."""
+    size = out.tell()
+    out.seek(0)
 
+    def generate():
+        try:
+            while True:
+                chunk = out.read(EXPORT_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            out.close()
+
+    return Response(generate(), mimetype=mimetype, headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Content-Length": str(size),
+    })
+
+@app.route("/export/<entity>.<fmt>", methods=["GET"])
+@session_required
+def export_entity(current_user_id, entity, fmt):
+    try:
+        spec = EXPORTS.get(EXPORT_ALIASES.get(entity, entity))
+        if spec is None:
+            return jsonify({"error": f"Export desconocido: {entity}"}), 404
+        if fmt != "csv" and fmt not in EXPORT_WRITERS:
+            return jsonify({"error": f"Formato no soportado: {fmt} (csv, xlsx o parquet)"}), 404
+        sql, params = build_export_sql(spec)
+        filename = f"{spec['filename']}_{datetime.date.today().isoformat()}"
+        if fmt == "csv":
+            return stream_copy(sql, params, filename)
+
+        write, mimetype = EXPORT_WRITERS[fmt]
+        out = tempfile.TemporaryFile()
+        try:
+            with db_connection() as conn, conn.cursor(name=f"export_{uuid.uuid4().hex}") as cur:
+                cur.itersize = EXPORT_FETCH_ROWS
+                write(cur, sql, params, out)
+        except Exception:
+            out.close()
+            raise
+        return send_spooled(out, f"{filename}.{fmt}", mimetype)
+    except Exception as e:
+        traceback.print_exc()
+        return error_response(e)
 
 # -----------------------
 # REPOSITORIO ESTRATÉGICO
 # -----------------------
+# Columnas explícitas: la columna tsvector "busqueda" no se envía al cliente
+REPO_COLUMNS = """
+    r.id, r.titulo, r.tipo_documento, r.descripcion, r.puntos_clave, r.ruta_archivo,
+    r.tipo_archivo, r.tamano_bytes, r.fecha_publicacion, r.fuente_origen, r.tipo_fuente,
+    r.enlace_externo, r.estado_procesamiento, r.etiquetas, r.uploaded_by,
+    r.created_at, r.updated_at
+"""
+
+REPO_LIST_SQL = f"""
+    SELECT {REPO_COLUMNS}, u.nombre as uploader_name
+    FROM repositorio_documentos r
+    LEFT JOIN usuarios u ON r.uploaded_by = u.id
+"""
+
 @app.route("/repositorio", methods=["GET"])
 @session_required
+@cached_response("repositorio_documentos", "usuarios")
 def get_repositorio(current_user_id):
-    conn = None
     try:
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute("""
-                SELECT r.*, u.nombre as uploader_name
-                FROM repositorio_documentos r
-                LEFT JOIN usuarios u ON r.uploaded_by = u.id
-                ORDER BY r.created_at DESC
-            """)
-            rows = cur.fetchall()
-        return jsonify(rows)
+        page = get_page_args()
+        stream_fmt = get_stream_format()
+        if stream_fmt and not page:
+            return stream_list(REPO_LIST_SQL, ORDER_REPO, stream_fmt)
+        with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            result = query_list(cur, REPO_LIST_SQL, ORDER_REPO, page)
+        return jsonify(result)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
+
+# -----------------------
+# REPOSITORIO: BÚSQUEDA DE TEXTO
+# -----------------------
+# repositorio_documentos.busqueda es un tsvector generado (configuración
+# es_unaccent = spanish + unaccent) con índice GIN. Cada término se busca como
+# prefijo para que funcione mientras se escribe. Si no hay coincidencias se
+# cae a similitud por trigramas (pg_trgm) sobre título y etiquetas, que tolera
+# errores de tipeo. El texto extraído de los archivos (textos_indexados, ver
+# indexer.py) también se busca, con la mitad de peso que los metadatos.
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+SEARCH_TRGM_THRESHOLD = float(os.getenv("SEARCH_TRGM_THRESHOLD", "0.3"))
+SEARCH_HEADLINE_OPTS = "StartSel=<mark>, StopSel=</mark>, MaxWords=35, MinWords=15, MaxFragments=2"
+# Misma expresión que el índice idx_repo_trgm (debe coincidir para usarlo)
+REPO_TRGM_EXPR = "inmutable_unaccent(lower(coalesce(r.titulo, '') || ' ' || coalesce(r.etiquetas, '')))"
+
+def prefix_tsquery(q):
+    """'ley bosq' -> 'ley:* & bosq:*'. Sólo palabras: nada de sintaxis tsquery del cliente."""
+    terms = re.findall(r"\w+", q)
+    return " & ".join(f"{t}:*" for t in terms)
+
+def search_repositorio_fts(cur, q, tipo_conditions, tipo_params, limit):
+    tsquery = prefix_tsquery(q)
+    if not tsquery:
+        return []
+    # ts_headline es caro: sólo se calcula sobre las filas ya recortadas, y
+    # sobre el texto extraído sólo cuando los metadatos no coinciden
+    cur.execute(f"""
+        SELECT hit.*,
+               ts_headline('es_unaccent', hit.titulo, hit.query, %s) AS titulo_resaltado,
+               ts_headline('es_unaccent',
+                           CASE WHEN hit.en_metadatos
+                                THEN concat_ws(' ', hit.descripcion, hit.puntos_clave, hit.etiquetas)
+                                ELSE left(t.texto, 100000) END,
+                           hit.query, %s) AS fragmento
+        FROM (
+            SELECT {REPO_COLUMNS}, u.nombre AS uploader_name,
+                   ts_rank(r.busqueda, query) + 0.5 * coalesce(ts_rank(ti.busqueda, query), 0) AS rank,
+                   r.busqueda @@ query AS en_metadatos, ti.id AS texto_id, query
+            FROM repositorio_documentos r
+            LEFT JOIN usuarios u ON r.uploaded_by = u.id
+            LEFT JOIN textos_indexados ti ON ti.repositorio_id = r.id,
+                 to_tsquery('es_unaccent', %s) query
+            WHERE {' AND '.join(["(r.busqueda @@ query OR ti.busqueda @@ query)"] + tipo_conditions)}
+            ORDER BY rank DESC, r.created_at DESC, r.id DESC
+            LIMIT %s
+        ) hit
+        LEFT JOIN textos_indexados t ON t.id = hit.texto_id
+        ORDER BY hit.rank DESC, hit.created_at DESC, hit.id DESC
+    """, (SEARCH_HEADLINE_OPTS, SEARCH_HEADLINE_OPTS, tsquery, *tipo_params, limit))
+    rows = cur.fetchall()
+    for row in rows:
+        for key in ("query", "en_metadatos", "texto_id"):
+            row.pop(key, None)
+    return rows
+
+def search_repositorio_trgm(cur, q, tipo_conditions, tipo_params, limit):
+    cur.execute("SET LOCAL pg_trgm.word_similarity_threshold = %s", (SEARCH_TRGM_THRESHOLD,))
+    cur.execute(f"""
+        SELECT {REPO_COLUMNS}, u.nombre AS uploader_name,
+               word_similarity(inmutable_unaccent(lower(%s)), {REPO_TRGM_EXPR}) AS rank,
+               r.titulo AS titulo_resaltado,
+               left(coalesce(r.descripcion, ''), 240) AS fragmento
+        FROM repositorio_documentos r
+        LEFT JOIN usuarios u ON r.uploaded_by = u.id
+        WHERE {' AND '.join([f"inmutable_unaccent(lower(%s)) <%% {REPO_TRGM_EXPR}"] + tipo_conditions)}
+        ORDER BY rank DESC, r.created_at DESC, r.id DESC
+        LIMIT %s
+    """, (q, q, *tipo_params, limit))
+    return cur.fetchall()
+
+@app.route("/repositorio/search", methods=["GET"])
+@session_required
+def search_repositorio(current_user_id):
+    try:
+        q = (request.args.get("q") or "").strip()
+        if not q:
+            raise InvalidParameter("Parámetro q es obligatorio")
+        limit = request.args.get("limit", SEARCH_DEFAULT_LIMIT, type=int) or SEARCH_DEFAULT_LIMIT
+        limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+
+        tipo_conditions, tipo_params = [], []
+        tipo = (request.args.get("tipo") or "").strip()
+        if tipo:
+            tipo_conditions.append("r.tipo_documento ILIKE %s")
+            tipo_params.append(f"%{tipo}%")
+
+        with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            mode = "fts"
+            items = search_repositorio_fts(cur, q, tipo_conditions, tipo_params, limit)
+            if not items:
+                mode = "trigram"
+                items = search_repositorio_trgm(cur, q, tipo_conditions, tipo_params, limit)
+            conn.rollback()  # sólo lectura; descarta el SET LOCAL
+        return jsonify({"items": items, "mode": mode})
+    except Exception as e:
+        return error_response(e)
 
 @app.route("/repositorio", methods=["POST"])
 @session_required
 def add_repositorio(current_user_id):
-    conn = None
     try:
         # Check files
         file = request.files.get('file')
@@ -735,53 +3606,53 @@ def add_repositorio(current_user_id):
         if not titulo:
              return jsonify({"error": "Título es obligatorio"}), 400
 
-        # Handle File Upload
-        ruta_archivo = None
+        # Handle File Upload (streamed to disk, stored by content hash)
+        tmp_path = size = mimetype = None
         if file and file.filename:
             original_filename = secure_filename(file.filename)
-            unique_name = f"REPO_{int(time.time())}_{original_filename}"
-            file.save(os.path.join(app.config['UPLOAD_FOLDER'], unique_name))
-            ruta_archivo = unique_name
+            mimetype = upload_mimetype(file, original_filename)
+            tmp_path, digest, size = save_upload_stream(file)
         
-        conn = get_db_connection()
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO repositorio_documentos (
-                    titulo, tipo_documento, descripcion, puntos_clave,
-                    ruta_archivo, fecha_publicacion, fuente_origen, tipo_fuente,
-                    enlace_externo, etiquetas, uploaded_by
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING id
-            """, (titulo, tipo_doc, desc, puntos, ruta_archivo, fecha_pub, fuente, tipo_fuente, enlace, tags, current_user_id))
-            
-            new_id = cur.fetchone()[0]
-            conn.commit()
+        try:
+            with db_connection() as conn, blob_placements() as placed, conn.cursor() as cur:
+                ruta_archivo = None
+                if tmp_path:
+                    ruta_archivo = store_blob(cur, tmp_path, digest, size, original_filename, mimetype, placed)
+                cur.execute("""
+                    INSERT INTO repositorio_documentos (
+                        titulo, tipo_documento, descripcion, puntos_clave,
+                        ruta_archivo, tipo_archivo, tamano_bytes, fecha_publicacion,
+                        fuente_origen, tipo_fuente, enlace_externo, etiquetas, uploaded_by
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    RETURNING id
+                """, (titulo, tipo_doc, desc, puntos, ruta_archivo, mimetype, size, fecha_pub,
+                      fuente, tipo_fuente, enlace, tags, current_user_id))
+                
+                new_id = cur.fetchone()[0]
+                if ruta_archivo:
+                    enqueue_indexing(cur, ruta_archivo, repositorio_id=new_id)
+                conn.commit()
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
             
         return jsonify({"message": "Documento agregado al repositorio", "id": new_id}), 201
 
     except Exception as e:
         traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
 
 @app.route("/repositorio/<int:id_doc>", methods=["PUT", "DELETE"])
 @session_required
 def manage_repositorio(current_user_id, id_doc):
-    conn = None
     try:
-        conn = get_db_connection()
-        
         if request.method == "DELETE":
-            with conn.cursor() as cur:
-                # Get file path to delete
+            with db_connection() as conn, blob_removals() as removed, conn.cursor() as cur:
+                # Release file reference (the blob may be shared)
                 cur.execute("SELECT ruta_archivo FROM repositorio_documentos WHERE id = %s", (id_doc,))
                 row = cur.fetchone()
                 if row and row[0]:
-                    file_path = os.path.join(app.config['UPLOAD_FOLDER'], row[0])
-                    if os.path.exists(file_path):
-                        try: os.remove(file_path)
-                        except: pass
+                    release_blob(cur, row[0], removed)
                 
                 cur.execute("DELETE FROM repositorio_documentos WHERE id = %s", (id_doc,))
                 conn.commit()
@@ -820,7 +3691,7 @@ def manage_repositorio(current_user_id, id_doc):
             
             values.append(id_doc)
             
-            with conn.cursor() as cur:
+            with db_connection() as conn, conn.cursor() as cur:
                 query = f"UPDATE repositorio_documentos SET {', '.join(fields)} WHERE id = %s"
                 cur.execute(query, tuple(values))
                 conn.commit()
@@ -829,66 +3700,863 @@ def manage_repositorio(current_user_id, id_doc):
 
     except Exception as e:
         traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if conn: release_db_connection(conn)
+        return error_response(e)
+
+
+# -----------------------
+# DESCARGAS (/uploads)
+# -----------------------
+# Los blobs se nombran por su SHA-256, así que su contenido nunca cambia: el
+# hash es un ETag fuerte y se pueden cachear como immutable. Los uploads
+# antiguos con prefijo uuid tampoco se reescriben; el resto se revalida.
+# send_file atiende Range (206) e If-None-Match (304); bajo gunicorn usa
+# wsgi.file_wrapper (sendfile). Con UPLOADS_ACCEL el proxy sirve los bytes:
+#   nginx:    location /_uploads/ { internal; alias /ruta/a/uploads/; }
+#   sendfile: Apache mod_xsendfile / lighttpd (ruta absoluta en X-Sendfile)
+UPLOADS_ACCEL = os.getenv("UPLOADS_ACCEL", "").lower()  # "", "nginx" o "sendfile"
+UPLOADS_ACCEL_PREFIX = os.getenv("UPLOADS_ACCEL_PREFIX", "/_uploads/")
+UPLOADS_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+BLOB_NAME_RE = re.compile(r"^blobs/[0-9a-f]{2}/([0-9a-f]{64})(\.\w+)?$")
+UUID_NAME_RE = re.compile(r"^[0-9a-f]{32}_[^/]+$")
+
+def upload_cache_policy(filename):
+    """Devuelve (etag, Cache-Control) según el tipo de nombre del archivo."""
+    blob = BLOB_NAME_RE.match(filename)
+    if blob:
+        return blob.group(1), f"public, max-age={UPLOADS_IMMUTABLE_MAX_AGE}, immutable"
+    if UUID_NAME_RE.match(filename):
+        return None, f"public, max-age={UPLOADS_IMMUTABLE_MAX_AGE}, immutable"
+    return None, "no-cache"
 
+def accel_response(filename, path, etag, cache_control):
+    """Respuesta sin cuerpo: el proxy entrega el archivo (y resuelve Range)."""
+    response = Response(mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream")
+    if UPLOADS_ACCEL == "nginx":
+        response.headers["X-Accel-Redirect"] = UPLOADS_ACCEL_PREFIX.rstrip("/") + "/" + quote(filename)
+    else:
+        response.headers["X-Sendfile"] = os.path.abspath(path)
+    if etag:
+        response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    # Sólo If-None-Match: el 304 se resuelve aquí sin tocar el proxy
+    return response.make_conditional(request)
 
 @app.route('/uploads/<path:filename>')
 def download_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    path = safe_join(app.config['UPLOAD_FOLDER'], filename)
+    if path is None or not os.path.isfile(path):
+        return jsonify({"error": "Archivo no encontrado"}), 404
+
+    etag, cache_control = upload_cache_policy(filename)
+    if UPLOADS_ACCEL:
+        return accel_response(filename, path, etag, cache_control)
+
+    response = send_file(path, etag=etag or True, conditional=True)
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+# -----------------------
+# EVENTOS EN TIEMPO REAL (SSE)
+# -----------------------
+# Los triggers de la migración 4 (migraciones.py) publican con pg_notify cada
+# cambio en plan_maestro, hitos, documentos y observaciones: {"seq", "table",
+# "id", "op", "plan_id", "updated_at"}, o un solo {"seq", "table", "op",
+# "count"} si una sentencia toca muchas filas. Un thread por proceso escucha
+# el canal con su propia conexión (fuera del pool) y reparte los eventos a los
+# clientes de GET /events, cada uno con una cola acotada. A un cliente que no
+# lee a tiempo se le cierra el stream; el navegador reconecta con un ticket
+# nuevo (POST /events/ticket, un solo uso, SESSION_TICKET_TTL segundos) y
+# ?last_event_id=, y se le reenvía lo que falta desde el buffer de eventos
+# recientes. Si ese id ya no está en el buffer, o el listener perdió la
+# conexión y pudo perder eventos, recibe "reset" y debe recargar.
+# El mismo thread escucha las versiones de tabla de la migración 7: las pasa a
+# la caché de listados y las reenvía a los clientes como "version" (sin id),
+# que el navegador manda en X-Min-Data-Version al recargar por un cambio.
+# Cada cliente conectado ocupa un thread del servidor.
+EVENTS_CHANNEL = "gwp_cambios"
+EVENTS_BUFFER = int(os.getenv("EVENTS_BUFFER", "10000"))
+EVENTS_CLIENT_QUEUE = int(os.getenv("EVENTS_CLIENT_QUEUE", "1000"))
+EVENTS_KEEPALIVE = float(os.getenv("EVENTS_KEEPALIVE", "15"))
+EVENTS_RETRY_MS = 3000
+EVENTS_RESET = "event: reset\ndata: {}\n\n"
+
+class FeedClient:
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=EVENTS_CLIENT_QUEUE)
+        self.dropped = False
+
+class ChangeFeed:
+    def __init__(self, dsn, cache=None):
+        self.dsn = dsn
+        self.cache = cache
+        self.lock = threading.Lock()
+        self.clients = set()
+        self.recent = deque()  # (n, seq, evento SSE) en orden de llegada (= orden de commit)
+        self.positions = {}    # seq -> n
+        self.received = 0
+        self.connected_once = False
+        self.thread = threading.Thread(target=self._listen_loop, daemon=True)
+        self.thread.start()
+
+    def subscribe(self, last_event_id=None):
+        """(cliente, eventos pendientes desde last_event_id) registrados en el mismo paso."""
+        client = FeedClient()
+        with self.lock:
+            backlog = []
+            if last_event_id is not None:
+                n = self.positions.get(last_event_id)
+                if n is None:
+                    backlog = [EVENTS_RESET]
+                else:
+                    start = n - self.recent[0][0] + 1
+                    backlog = [event for _, _, event in itertools.islice(self.recent, start, None)]
+            self.clients.add(client)
+        return client, backlog
+
+    def unsubscribe(self, client):
+        with self.lock:
+            self.clients.discard(client)
+
+    def publish(self, payload):
+        try:
+            seq = json.loads(payload)["seq"]
+        except (ValueError, KeyError, TypeError):
+            print(f"[eventos] Notificación inválida: {payload[:200]}")
+            return
+        event = f"id: {seq}\nevent: cambio\ndata: {payload}\n\n"
+        with self.lock:
+            self.received += 1
+            self.recent.append((self.received, seq, event))
+            self.positions[seq] = self.received
+            while len(self.recent) > EVENTS_BUFFER:
+                self.positions.pop(self.recent.popleft()[1], None)
+            self._fan_out(event)
+
+    def publish_version(self, payload):
+        if self.cache is not None:
+            self.cache.notify(payload)
+        with self.lock:
+            self._fan_out(f"event: version\ndata: {payload}\n\n")
+
+    def _fan_out(self, event):
+        # Llamar con self.lock tomado
+        for client in list(self.clients):
+            try:
+                client.queue.put_nowait(event)
+            except queue.Full:
+                client.dropped = True
+                self.clients.discard(client)
+
+    def _reset(self):
+        with self.lock:
+            self.recent.clear()
+            self.positions.clear()
+            self._fan_out(EVENTS_RESET)
+
+    def _listen_loop(self):
+        backoff = 1
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {EVENTS_CHANNEL}")
+                    cur.execute(f"LISTEN {VERSIONS_CHANNEL}")
+                if self.cache is not None:
+                    self.cache.listening(True)
+                if self.connected_once:
+                    # Lo notificado mientras no escuchábamos se perdió
+                    self._reset()
+                self.connected_once = True
+                backoff = 1
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        with conn.cursor() as cur:
+                            cur.execute("SELECT 1")  # detecta una conexión muerta
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        n = conn.notifies.pop(0)
+                        if n.channel == VERSIONS_CHANNEL:
+                            self.publish_version(n.payload)
+                        else:
+                            self.publish(n.payload)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                if self.cache is not None:
+                    self.cache.listening(False)
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+_change_feed = None
+_change_feed_lock = threading.Lock()
+
+def get_change_feed():
+    global _change_feed
+    # Perezoso: el thread se crea en cada worker después del fork de gunicorn
+    with _change_feed_lock:
+        if _change_feed is None:
+            _change_feed = ChangeFeed(DB_CONNECTION_STRING, None if response_cache.disabled else response_cache)
+        return _change_feed
+
+def parse_last_event_id():
+    value = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise InvalidParameter("Last-Event-ID inválido")
+
+@app.route("/events/ticket", methods=["POST"])
+@session_required
+def events_ticket(current_user_id):
+    try:
+        return jsonify({"ticket": sessions.create_ticket(get_request_token()),
+                        "expires_in": SESSION_TICKET_TTL})
+    except Exception as e:
+        traceback.print_exc()
+        return error_response(e)
+
+@app.route("/events", methods=["GET"])
+def events():
+    # EventSource no puede mandar Authorization: en la URL va un ticket de un
+    # solo uso (POST /events/ticket), nunca el token de sesión
+    token = get_request_token()
+    ticket = request.args.get("ticket", "")
+    try:
+        token_hash = None
+        if token:
+            token_hash = hash_token(token)
+        elif ticket:
+            token_hash = sessions.consume_ticket(ticket)
+        if token_hash is None or sessions.validate_hash(token_hash) is None:
+            return jsonify({"message": "Unauthorized"}), 401
+        last_event_id = parse_last_event_id()
+    except Exception as e:
+        traceback.print_exc()
+        return error_response(e)
+
+    feed = get_change_feed()
+    client, backlog = feed.subscribe(last_event_id)
+
+    def generate():
+        try:
+            yield f"retry: {EVENTS_RETRY_MS}\n\n"
+            yield from backlog
+            while not (client.dropped and client.queue.empty()):
+                try:
+                    yield client.queue.get(timeout=EVENTS_KEEPALIVE)
+                except queue.Empty:
+                    # Una sesión revocada o vencida corta el stream (y la reconexión da 401)
+                    if sessions.validate_hash(token_hash) is None:
+                        return
+                    yield ": keepalive\n\n"
+        finally:
+            feed.unsubscribe(client)
+
+    resp = Response(generate(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"  # nginx: no acumular el stream
+    return resp
+
+
+# -----------------------
+# PLAN MAESTRO: GRAFO DE DEPENDENCIAS Y RUTA CRÍTICA
+# -----------------------
+# dependency_code nombra el activity_code de las predecesoras (una o varias,
+# separadas por coma, punto y coma o espacio), con relación fin-inicio. El
+# grafo vive en memoria, uno por proceso, y se carga entero la primera vez que
+# se consulta. Después cada consulta lee la versión del plan y el token de
+# sync (plan_version, lo mismo que el ETag y ?since=) y, si la versión cambió,
+# sólo las filas y los tombstones con txid >= el token de la sincronización
+# anterior, más los ids que marcaron los handlers de escritura de este
+# proceso. Como ambos siguen el orden de los commits, un cambio que confirma
+# tarde una transacción larga también llega. Con eso se ajustan las
+# aristas, el orden topológico (Pearce-Kelly: sólo se reordena la zona entre
+# los extremos de una arista que lo viola) y las fechas, que se repropagan
+# únicamente por los sucesores/predecesores cuyo valor cambia.
+# Una arista que cerraría un ciclo queda fuera del cálculo y se informa en
+# "cycles"; un código de dependencia que no existe se ignora.
+# Unidad: días. Duración = fecha_fin - fecha_inicio + 1, o (semanas) x 7 si no
+# hay fechas, o 1. Inicio temprano = máx(fecha_inicio, fin de las
+# predecesoras); sin fecha se parte del inicio del proyecto. Los tardíos se
+# calculan hacia atrás desde el fin del proyecto (el fin temprano más tardío).
+GRAPH_SQL = """
+    SELECT id, activity_code, dependency_code, fecha_inicio, fecha_fin, week_start, week_end
+    FROM plan_maestro
+"""
+GRAPH_FIELDS = {"activity_code", "dependency_code", "fecha_inicio", "fecha_fin", "week_start", "week_end"}
+DEPENDENCY_SPLIT_RE = re.compile(r"[,;\s]+")
+IMPACT_MAX_ITEMS = int(os.getenv("IMPACT_MAX_ITEMS", "1000"))
+
+def graph_node(row):
+    """(id, código, códigos de dependencia, inicio planificado (ordinal o None), duración en días)."""
+    node_id, code, dependency, inicio, fin, week_start, week_end = row
+    deps = tuple(dict.fromkeys(c for c in DEPENDENCY_SPLIT_RE.split(dependency or "") if c))
+    if inicio and fin:
+        start, duration = min(inicio, fin).toordinal(), abs((fin - inicio).days) + 1
+    else:
+        start = (inicio or fin).toordinal() if (inicio or fin) else None
+        if week_start is not None and week_end is not None:
+            duration = (abs(week_end - week_start) + 1) * 7
+        else:
+            duration = 1
+    return node_id, (code or "").strip(), deps, start, duration
+
+def ordinal_date(value):
+    return datetime.date.fromordinal(value).isoformat()
+
+class DependencyGraph:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.dirty = set()
+        self.version = None  # fila de plan_version con la que se sincronizó
+        self.generation = 0  # cambia con cada ajuste; invalida la ruta crítica
+        self._critical = None
+        self._clear()
+
+    def _clear(self):
+        self.codes = {}       # id -> activity_code
+        self.deps = {}        # id -> códigos de los que depende
+        self.start = {}       # id -> inicio planificado (ordinal) o None
+        self.duration = {}    # id -> días
+        self.by_code = {}     # código -> ids con ese código
+        self.dependents = {}  # código -> ids que dependen de ese código
+        self.preds = {}       # id -> ids predecesores (aristas válidas)
+        self.succs = {}       # id -> ids sucesores
+        self.cyclic = {}      # id -> predecesores descartados por cerrar un ciclo
+        self.order = {}       # id -> posición topológica (creciente, con huecos)
+        self.next_order = 0
+        self.es, self.ef, self.ls, self.lf = {}, {}, {}, {}
+        self.origin = None
+        self.project_end = None
+
+    def mark(self, ids=None):
+        """Ids a releer en la próxima sincronización; sin ids, recarga completa."""
+        with self.lock:
+            if ids is None:
+                self.loaded = False
+            else:
+                self.dirty.update(ids)
+
+    # Sincronización con la base
+    def sync(self, cur):
+        with self.lock:
+            # Antes que las filas: el token cubre lo que se confirme mientras tanto
+            version = dict(plan_version(cur))
+            if not self.loaded:
+                cur.execute(GRAPH_SQL)
+                self.rebuild([tuple(r.values()) for r in cur.fetchall()])
+                self.loaded = True
+                self.dirty.clear()
+            elif version["version"] != self.version["version"] or self.dirty:
+                self._sync_delta(cur)
+            self.version = version
+
+    def _sync_delta(self, cur):
+        token = self.version["sync_token"]
+        ids, deleted = set(self.dirty), set()
+        cur.execute("SELECT id FROM plan_maestro WHERE updated_txid >= %s", (token,))
+        ids.update(r["id"] for r in cur.fetchall())
+        cur.execute("SELECT id FROM plan_maestro_eliminados WHERE deleted_txid >= %s", (token,))
+        deleted.update(r["id"] for r in cur.fetchall())
+        rows = []
+        if ids:
+            cur.execute(GRAPH_SQL + " WHERE id = ANY(%s)", (list(ids),))
+            rows = cur.fetchall()
+        # Lo que no volvió ya no existe; un tombstone de un id que volvió a
+        # insertarse no cuenta
+        deleted = (deleted | ids) - {r["id"] for r in rows}
+        self.apply([tuple(r.values()) for r in rows], deleted)
+        self.dirty.clear()
+
+    # Construcción completa
+    def rebuild(self, rows):
+        """Grafo completo desde tuplas de GRAPH_SQL."""
+        with self.lock:
+            self._clear()
+            for row in rows:
+                node_id, code, deps, start, duration = graph_node(row)
+                self._add_node(node_id, code, deps, start, duration)
+            for node_id in self.codes:
+                for pred in self._wanted_preds(node_id):
+                    self.preds[node_id].add(pred)
+                    self.succs[pred].add(node_id)
+            self._sort()
+            self._schedule()
+
+    def _add_node(self, node_id, code, deps, start, duration):
+        self.codes[node_id] = code
+        self.deps[node_id] = deps
+        self.start[node_id] = start
+        self.duration[node_id] = duration
+        self.preds[node_id] = set()
+        self.succs[node_id] = set()
+        if code:
+            self.by_code.setdefault(code, set()).add(node_id)
+        for dep in deps:
+            self.dependents.setdefault(dep, set()).add(node_id)
+
+    def _wanted_preds(self, node_id):
+        wanted = set()
+        for dep in self.deps[node_id]:
+            wanted.update(self.by_code.get(dep, ()))
+        wanted.discard(node_id)
+        return wanted
+
+    def _sort(self):
+        """Orden topológico por DFS; las aristas de retroceso son ciclos y se descartan."""
+        state, post = {}, []
+        for root in sorted(self.codes):
+            if root in state:
+                continue
+            state[root] = 1
+            stack = [(root, iter(list(self.succs[root])))]
+            while stack:
+                node, it = stack[-1]
+                for succ in it:
+                    seen = state.get(succ)
+                    if seen is None:
+                        state[succ] = 1
+                        stack.append((succ, iter(list(self.succs[succ]))))
+                        break
+                    if seen == 1:
+                        self._drop_edge(node, succ, cyclic=True)
+                else:
+                    state[node] = 2
+                    post.append(node)
+                    stack.pop()
+        post.reverse()
+        self.order = {node: i for i, node in enumerate(post)}
+        self.next_order = len(post)
+
+    def _schedule(self):
+        starts = [s for s in self.start.values() if s is not None]
+        self.origin = min(starts) if starts else datetime.date.today().toordinal()
+        self.es, self.ef = {}, {}
+        for node in sorted(self.order, key=self.order.get):
+            self._forward_one(node)
+        self.project_end = max(self.ef.values(), default=self.origin)
+        self.ls, self.lf = {}, {}
+        for node in sorted(self.order, key=self.order.get, reverse=True):
+            self._backward_one(node)
+        self.generation += 1
+        self._critical = None
+
+    def _forward_one(self, node):
+        es = self.start[node]
+        if es is None:
+            es = self.origin
+        for pred in self.preds[node]:
+            if self.ef[pred] > es:
+                es = self.ef[pred]
+        ef = es + self.duration[node]
+        changed = self.es.get(node) != es or self.ef.get(node) != ef
+        self.es[node], self.ef[node] = es, ef
+        return changed
+
+    def _backward_one(self, node):
+        lf = self.project_end
+        for succ in self.succs[node]:
+            if self.ls[succ] < lf:
+                lf = self.ls[succ]
+        ls = lf - self.duration[node]
+        changed = self.lf.get(node) != lf or self.ls.get(node) != ls
+        self.ls[node], self.lf[node] = ls, lf
+        return changed
+
+    # Ajustes incrementales
+    def _drop_edge(self, pred, succ, cyclic=False):
+        self.succs[pred].discard(succ)
+        self.preds[succ].discard(pred)
+        if cyclic:
+            self.cyclic.setdefault(succ, set()).add(pred)
+
+    def _add_edge(self, pred, succ):
+        """Agrega pred -> succ manteniendo el orden topológico; False si cerraría un ciclo."""
+        lower, upper = self.order[succ], self.order[pred]
+        if lower > upper:
+            self.preds[succ].add(pred)
+            self.succs[pred].add(succ)
+            return True
+        # Pearce-Kelly: lo alcanzable desde succ sin pasar de pred, y lo que
+        # llega a pred sin bajar de succ; se reparten sus posiciones
+        forward, stack = {succ}, [succ]
+        while stack:
+            for nxt in self.succs[stack.pop()]:
+                if nxt == pred:
+                    self.cyclic.setdefault(succ, set()).add(pred)
+                    return False
+                if nxt not in forward and self.order[nxt] < upper:
+                    forward.add(nxt)
+                    stack.append(nxt)
+        backward, stack = {pred}, [pred]
+        while stack:
+            for prv in self.preds[stack.pop()]:
+                if prv not in backward and self.order[prv] > lower:
+                    backward.add(prv)
+                    stack.append(prv)
+        nodes = sorted(backward, key=self.order.get) + sorted(forward, key=self.order.get)
+        slots = sorted(self.order[n] for n in nodes)
+        for node, slot in zip(nodes, slots):
+            self.order[node] = slot
+        self.preds[succ].add(pred)
+        self.succs[pred].add(succ)
+        return True
 
+    def apply(self, rows, deleted=()):
+        """Aplica filas nuevas o modificadas (tuplas de GRAPH_SQL) y eliminaciones."""
+        with self.lock:
+            relink = set()          # nodos cuyas predecesoras hay que recalcular
+            forward, backward = set(), set()
+            removed_edge = False
+            # El inicio y el fin del proyecto se recalculan enteros sólo si se
+            # movió o se borró la actividad que los fijaba
+            origin_dirty = self.origin is None
+            end_dirty = self.project_end is None
+            for node_id in deleted:
+                if node_id not in self.codes:
+                    continue
+                origin_dirty = origin_dirty or self.start[node_id] == self.origin
+                end_dirty = end_dirty or self.ef[node_id] == self.project_end
+                code = self.codes[node_id]
+                relink |= self.dependents.get(code, set()) if code else set()
+                for pred in list(self.preds[node_id]):
+                    self._drop_edge(pred, node_id)
+                    backward.add(pred)
+                    removed_edge = True
+                for succ in list(self.succs[node_id]):
+                    self._drop_edge(node_id, succ)
+                    forward.add(succ)
+                    removed_edge = True
+                self._remove_node(node_id)
+
+            for row in rows:
+                node_id, code, deps, start, duration = graph_node(row)
+                if node_id not in self.codes:
+                    self._add_node(node_id, code, deps, start, duration)
+                    origin_dirty = origin_dirty or (start is not None and start < self.origin)
+                    self.order[node_id] = self.next_order
+                    self.next_order += 1
+                    relink.add(node_id)
+                    if code:
+                        relink |= self.dependents.get(code, set())
+                    forward.add(node_id)
+                    backward.add(node_id)
+                    continue
+                if code != self.codes[node_id]:
+                    old = self.codes[node_id]
+                    if old:
+                        self.by_code[old].discard(node_id)
+                        if not self.by_code[old]:
+                            del self.by_code[old]
+                        relink |= self.dependents.get(old, set())
+                    if code:
+                        self.by_code.setdefault(code, set()).add(node_id)
+                        relink |= self.dependents.get(code, set())
+                    self.codes[node_id] = code
+                if deps != self.deps[node_id]:
+                    for dep in self.deps[node_id]:
+                        self._discard_dependent(dep, node_id)
+                    for dep in deps:
+                        self.dependents.setdefault(dep, set()).add(node_id)
+                    self.deps[node_id] = deps
+                    relink.add(node_id)
+                if start != self.start[node_id]:
+                    old = self.start[node_id]
+                    origin_dirty = (origin_dirty or old == self.origin
+                                    or (start is not None and start < self.origin))
+                    self.start[node_id] = start
+                    forward.add(node_id)
+                if duration != self.duration[node_id]:
+                    self.duration[node_id] = duration
+                    forward.add(node_id)
+                    backward.add(node_id)
+
+            added = []
+            for node_id in relink:
+                if node_id not in self.codes:
+                    continue
+                wanted = self._wanted_preds(node_id)
+                cyclic = self.cyclic.get(node_id, set())
+                for pred in (self.preds[node_id] | cyclic) - wanted:
+                    if pred in cyclic:
+                        cyclic.discard(pred)
+                    else:
+                        self._drop_edge(pred, node_id)
+                        removed_edge = True
+                    backward.add(pred)
+                    forward.add(node_id)
+                for pred in wanted - self.preds[node_id] - cyclic:
+                    added.append((pred, node_id))
+                if not cyclic:
+                    self.cyclic.pop(node_id, None)
+            if removed_edge and self.cyclic:
+                # Una arista descartada por ciclo puede haber dejado de serlo
+                for node_id, preds in list(self.cyclic.items()):
+                    for pred in preds:
+                        added.append((pred, node_id))
+                self.cyclic.clear()
+            for pred, succ in added:
+                if self._add_edge(pred, succ):
+                    backward.add(pred)
+                    forward.add(succ)
+
+            if origin_dirty:
+                starts = [s for s in self.start.values() if s is not None]
+                origin = min(starts) if starts else datetime.date.today().toordinal()
+                if origin != self.origin:
+                    self._schedule()
+                    return
+            self._propagate(forward, backward, end_dirty)
+
+    def _remove_node(self, node_id):
+        code = self.codes.pop(node_id)
+        if code:
+            self.by_code[code].discard(node_id)
+            if not self.by_code[code]:
+                del self.by_code[code]
+        for dep in self.deps.pop(node_id):
+            self._discard_dependent(dep, node_id)
+        self.cyclic.pop(node_id, None)
+        for preds in self.cyclic.values():
+            preds.discard(node_id)
+        for table in (self.start, self.duration, self.preds, self.succs, self.order,
+                      self.es, self.ef, self.ls, self.lf):
+            del table[node_id]
+
+    def _discard_dependent(self, dep, node_id):
+        nodes = self.dependents.get(dep)
+        if nodes is not None:
+            nodes.discard(node_id)
+            if not nodes:
+                del self.dependents[dep]
+
+    def _propagate(self, forward, backward, end_dirty=False):
+        # Hacia adelante en orden topológico: sólo sigue si el fin temprano cambió
+        heap = [(self.order[n], n) for n in forward if n in self.order]
+        heapq.heapify(heap)
+        queued = {n for _, n in heap}
+        project_end = self.project_end
+        while heap:
+            _, node = heapq.heappop(heap)
+            old = self.ef.get(node)
+            if self._forward_one(node):
+                ef = self.ef[node]
+                if old == self.project_end and ef < old:
+                    end_dirty = True
+                elif not end_dirty and ef > project_end:
+                    project_end = ef
+                for succ in self.succs[node]:
+                    if succ not in queued:
+                        queued.add(succ)
+                        heapq.heappush(heap, (self.order[succ], succ))
+        if end_dirty:
+            project_end = max(self.ef.values(), default=self.origin)
+        if project_end != self.project_end:
+            self.project_end = project_end
+            for node in sorted(self.order, key=self.order.get, reverse=True):
+                self._backward_one(node)
+        else:
+            heap = [(-self.order[n], n) for n in backward if n in self.order]
+            heapq.heapify(heap)
+            queued = {n for _, n in heap}
+            while heap:
+                _, node = heapq.heappop(heap)
+                if self._backward_one(node):
+                    for pred in self.preds[node]:
+                        if pred not in queued:
+                            queued.add(pred)
+                            heapq.heappush(heap, (-self.order[pred], pred))
+        self.generation += 1
+        self._critical = None
+
+    # Consultas
+    def slack(self, node):
+        return self.ls[node] - self.es[node]
+
+    def critical_path(self):
+        """Cadena de holgura cero que termina en el fin del proyecto (ids en orden)."""
+        with self.lock:
+            if self._critical is not None and self._critical[0] == self.generation:
+                return self._critical[1]
+            path = []
+            ends = [n for n, ef in self.ef.items() if ef == self.project_end]
+            if ends:
+                node = min(ends, key=self.order.get)
+                path.append(node)
+                while True:
+                    prev = [p for p in self.preds[node]
+                            if self.ef[p] == self.es[node] and self.slack(p) == 0]
+                    if not prev:
+                        break
+                    node = min(prev, key=self.order.get)
+                    path.append(node)
+                path.reverse()
+            self._critical = (self.generation, path)
+            return path
+
+    def descendants(self, node):
+        seen, stack = set(), [node]
+        while stack:
+            for succ in self.succs[stack.pop()]:
+                if succ not in seen:
+                    seen.add(succ)
+                    stack.append(succ)
+        return sorted(seen, key=self.order.get)
+
+    def simulate_delay(self, node, days):
+        """{id: días de atraso} de la actividad y sus descendientes si termina days más tarde."""
+        ef = {node: self.ef[node] + days}
+        for succ in self.descendants(node):
+            es = self.start[succ]
+            if es is None:
+                es = self.origin
+            for pred in self.preds[succ]:
+                es = max(es, ef.get(pred, self.ef[pred]))
+            ef[succ] = es + self.duration[succ]
+        return {n: value - self.ef[n] for n, value in ef.items()}
+
+    def node_info(self, node):
+        return {
+            "id": node,
+            "activity_code": self.codes[node],
+            "early_start": ordinal_date(self.es[node]),
+            "early_finish": ordinal_date(self.ef[node] - 1),
+            "late_start": ordinal_date(self.ls[node]),
+            "late_finish": ordinal_date(self.lf[node] - 1),
+            "duration_days": self.duration[node],
+            "slack_days": self.slack(node),
+            "critical": self.slack(node) == 0,
+        }
+
+    def cycles(self):
+        return [{"from": self.codes[pred], "to": self.codes[node], "from_id": pred, "to_id": node}
+                for node, preds in sorted(self.cyclic.items()) for pred in sorted(preds)]
+
+    def summary(self):
+        return {
+            "activities": len(self.codes),
+            "dependencies": sum(len(s) for s in self.succs.values()),
+            "missing_dependencies": sum(1 for dep in self.dependents if dep not in self.by_code),
+            "project_start": ordinal_date(self.origin) if self.codes else None,
+            "project_end": ordinal_date(self.project_end - 1) if self.codes else None,
+            "duration_days": self.project_end - self.origin if self.codes else 0,
+            "cycles": self.cycles(),
+        }
+
+_dependency_graph = None
+_dependency_graph_lock = threading.Lock()
+
+def get_dependency_graph():
+    global _dependency_graph
+    with _dependency_graph_lock:
+        if _dependency_graph is None:
+            _dependency_graph = DependencyGraph()
+        return _dependency_graph
+
+def mark_graph_dirty(ids=None):
+    """Actividades escritas por este proceso: se releen en la próxima consulta del grafo."""
+    if _dependency_graph is not None:
+        _dependency_graph.mark(ids)
+
+def with_task_names(cur, items):
+    ids = [item["id"] for item in items]
+    if ids:
+        cur.execute("SELECT id, task_name, status FROM plan_maestro WHERE id = ANY(%s)", (ids,))
+        extra = {r["id"]: r for r in cur.fetchall()}
+        for item in items:
+            row = extra.get(item["id"], {})
+            item["task_name"] = row.get("task_name")
+            item["status"] = row.get("status")
+    return items
+
+@app.route("/plan-maestro/critical-path", methods=["GET"])
+@session_required
+def get_critical_path(current_user_id):
+    try:
+        graph = get_dependency_graph()
+        with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            with graph.lock:
+                graph.sync(cur)
+                result = graph.summary()
+                path = [graph.node_info(n) for n in graph.critical_path()]
+                result["critical_activities"] = sum(1 for n in graph.codes if graph.slack(n) == 0)
+            result["path"] = with_task_names(cur, path)
+        return jsonify(result)
+    except Exception as e:
+        traceback.print_exc()
+        return error_response(e)
+
+@app.route("/plan-maestro/<int:plan_id>/impact", methods=["GET"])
+@session_required
+def get_plan_impact(current_user_id, plan_id):
+    try:
+        try:
+            delay = int(request.args.get("delay_days", "0"))
+        except ValueError:
+            raise InvalidParameter("Parámetro delay_days inválido")
+        if delay < 0:
+            raise InvalidParameter("Parámetro delay_days inválido")
+        graph = get_dependency_graph()
+        with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            with graph.lock:
+                graph.sync(cur)
+                if plan_id not in graph.codes:
+                    return jsonify({"error": "Actividad no encontrada"}), 404
+                result = graph.node_info(plan_id)
+                shifts = graph.simulate_delay(plan_id, delay)
+                descendants = graph.descendants(plan_id)
+                items = []
+                for node in descendants[:IMPACT_MAX_ITEMS]:
+                    item = graph.node_info(node)
+                    item["shift_days"] = shifts[node]
+                    items.append(item)
+                project_end = graph.project_end
+                new_end = max(project_end, max(graph.ef[n] + s for n, s in shifts.items()))
+                result.update({
+                    "delay_days": delay,
+                    "descendants_total": len(descendants),
+                    "affected_total": sum(1 for n in descendants if shifts[n] > 0),
+                    "project_end": ordinal_date(project_end - 1),
+                    "new_project_end": ordinal_date(new_end - 1),
+                    "project_slip_days": new_end - project_end,
+                })
+            result["descendants"] = with_task_names(cur, items)
+        return jsonify(result)
+    except Exception as e:
+        traceback.print_exc()
+        return error_response(e)
 
 # -----------------------
 # AUTO-MIGRATION HELPER
 # -----------------------
-def check_and_create_tables():
-    print("Verificando tablas del sistema...")
-    conn = None
+# El esquema sale de database/schema.sql y los cambios posteriores son
+# migraciones versionadas en migraciones.py, que se corre aparte: el DDL
+# pesado o con locks largos no corre al arrancar. Aquí sólo se avisa si
+# quedan pendientes.
+def check_pending_migrations():
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
-            # Tabla: repositorio_documentos
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS repositorio_documentos (
-                    id SERIAL PRIMARY KEY,
-                    titulo VARCHAR(255) NOT NULL,
-                    tipo_documento VARCHAR(100),
-                    descripcion TEXT,
-                    puntos_clave TEXT,
-                    ruta_archivo VARCHAR(500),
-                    fecha_publicacion DATE,
-                    fuente_origen VARCHAR(100),
-                    tipo_fuente VARCHAR(50),
-                    enlace_externo VARCHAR(500),
-                    estado_procesamiento VARCHAR(50) DEFAULT 'Pendiente',
-                    etiquetas VARCHAR(255),
-                    uploaded_by INTEGER REFERENCES usuarios(id),
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-            
-            # Tabla: observaciones (por si acaso falla también)
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS observaciones (
-                    id SERIAL PRIMARY KEY,
-                    plan_maestro_id INTEGER NOT NULL REFERENCES plan_maestro(id) ON DELETE CASCADE,
-                    usuario_id INTEGER REFERENCES usuarios(id),
-                    texto TEXT NOT NULL,
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-            conn.commit()
-            print("Tablas verificadas correctamente.")
+        with db_connection() as conn, conn.cursor() as cur:
+            pending = pending_migrations(cur)
+        if pending:
+            versions = ", ".join(str(m.version) for m in pending)
+            print(f"AVISO: migraciones pendientes ({versions}): ejecutar 'python migraciones.py'")
     except Exception as e:
-        print("Error en migración automática:", e)
-    finally:
-        if conn: release_db_connection(conn)
+        print("Error verificando migraciones:", e)
 
 if __name__ == '__main__':
-    check_and_create_tables() # Run migration check on startup
+    check_pending_migrations() # Aviso de migraciones pendientes al arrancar
     cert_path = os.path.abspath("fullchain.pem")
     key_path = os.path.abspath("private.key")
     print("Iniciando servidor en https://0.0.0.0:8002")
@@ -0,0 +1,269 @@
+"""
+Modo asyncio (ASGI) opcional: los listados de sólo lectura se atienden en un
+event loop con un pool asyncpg y el resto de la API sigue siendo app1.
+
+    cd backend
+    pip install starlette asyncpg uvicorn
+    uvicorn asgi:app --host 0.0.0.0 --port 8002 --ssl-keyfile private.key --ssl-certfile fullchain.pem
+
+GET /plan-maestro, /hitos, /documentos, /observaciones, /repositorio y
+/usuarios responden igual que en app1: mismas URLs, mismo token, mismo JSON,
+paginación keyset, ETag del plan y compresión. La diferencia es que un request
+no retiene un thread ni una conexión mientras el cliente lee: la conexión
+vuelve al pool apenas llegan las filas y enviar la respuesta a un cliente
+lento es sólo esperar en el loop.
+
+Las variantes poco usadas (?since=, streaming NDJSON / ?stream=1, HEAD) y
+todas las demás rutas, escrituras incluidas, pasan a la app Flask por
+WSGIMiddleware, en threads y con el pool psycopg2 de siempre. Las métricas de
+ambos caminos salen en el mismo /metrics.
+"""
+import asyncio
+import contextlib
+import datetime
+import functools
+import itertools
+import os
+import re
+import time
+import traceback
+
+import asyncpg
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_accept_header, parse_etags
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:  # el de starlette está deprecado pero alcanza
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+import app1
+
+ASYNC_POOL_MIN = int(os.getenv("ASYNC_POOL_MIN", "2"))
+ASYNC_POOL_MAX = int(os.getenv("ASYNC_POOL_MAX", "20"))
+# Con más filas, armar el JSON y comprimirlo se hace en un thread: zlib y
+# brotli sueltan el GIL y el loop sigue atendiendo otros requests
+ASYNC_OFFLOAD_ROWS = int(os.getenv("ASYNC_OFFLOAD_ROWS", "2000"))
+
+flask_app = WSGIMiddleware(app1.app)
+pool = None
+
+# -----------------------
+# POOL ASYNCPG
+# -----------------------
+def parse_timestamptz(value):
+    # "2025-01-06 09:30:00.5-03" (formato texto de Postgres)
+    return datetime.datetime.fromisoformat(value)
+
+async def init_connection(conn):
+    # asyncpg devuelve timestamptz en UTC; psycopg2, en la zona de la sesión.
+    # En texto quedan idénticos, y con ellos el JSON, los cursores y el ETag.
+    await conn.set_type_codec("timestamptz", schema="pg_catalog", format="text",
+                              encoder=str, decoder=parse_timestamptz)
+
+@contextlib.asynccontextmanager
+async def lifespan(_app):
+    global pool
+    pool = await asyncpg.create_pool(app1.DB_CONNECTION_STRING, min_size=ASYNC_POOL_MIN,
+                                     max_size=ASYNC_POOL_MAX, init=init_connection)
+    print(f"Pool asyncpg inicializado ({ASYNC_POOL_MIN}-{ASYNC_POOL_MAX} conexiones).")
+    try:
+        yield
+    finally:
+        await pool.close()
+
+@contextlib.asynccontextmanager
+async def acquire(t):
+    t0 = time.perf_counter()
+    try:
+        conn = await pool.acquire(timeout=app1.DB_POOL_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise app1.PoolTimeout("Pool de conexiones agotado")
+    t.pool_wait += time.perf_counter() - t0
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
+@functools.lru_cache(maxsize=256)
+def to_asyncpg(query):
+    """%s de psycopg2 -> $1, $2... de asyncpg (%% queda como %)."""
+    n = itertools.count(1)
+    return re.sub(r"%[s%]", lambda m: "%" if m.group() == "%%" else f"${next(n)}", query)
+
+async def fetch(conn, t, query, params=()):
+    t0 = time.perf_counter()
+    rows = await conn.fetch(to_asyncpg(query), *params)
+    t.add_query(query, params, time.perf_counter() - t0)
+    t.rows += len(rows)
+    return rows
+
+# -----------------------
+# RESPUESTAS
+# -----------------------
+def encode_json(obj):
+    provider = app1.app.json
+    if isinstance(provider, app1.OrjsonJSONProvider):
+        return provider._encode(obj) + b"\n"
+    return (provider.dumps(obj) + "\n").encode()
+
+def negotiate_encoding(request):
+    if not app1.COMPRESS_RESPONSES:
+        return None
+    offered = ["br", "gzip"] if app1.brotli is not None else ["gzip"]
+    return parse_accept_header(request.headers.get("accept-encoding")).best_match(offered)
+
+def render(result, encoding, t):
+    """(cuerpo, encoding aplicado) de result, como jsonify + compress_response."""
+    t0 = time.perf_counter()
+    body = encode_json(result)
+    t1 = time.perf_counter()
+    t.serialize += t1 - t0
+    if encoding is None or len(body) < app1.COMPRESS_MIN_BYTES:
+        return body, None
+    body = app1.compress_bytes(body, encoding)
+    t.compress += time.perf_counter() - t1
+    return body, encoding
+
+def as_dicts(rows):
+    return [dict(r) for r in rows]
+
+def render_list(rows, order, page, total, encoding, t):
+    return render(app1.page_result(as_dicts(rows), order, page, total), encoding, t)
+
+def json_response(request, body, status=200, encoding=None, etag=None, sync_token=None):
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    if etag:
+        # Con otros bytes el ETag pasa a débil, como en compress_response
+        headers["ETag"] = f'W/"{etag}"' if encoding else f'"{etag}"'
+        headers["Cache-Control"] = "private, no-cache"
+    if sync_token is not None:
+        headers["X-Sync-Token"] = str(sync_token)
+    origin = request.headers.get("origin")
+    if origin:
+        # Lo mismo que hace CORS(app)
+        headers["Access-Control-Allow-Origin"] = origin
+        headers["Access-Control-Expose-Headers"] = ", ".join(app1.EXPOSED_HEADERS)
+    return Response(body, status_code=status, headers=headers, media_type="application/json")
+
+def error_json(request, e):
+    """Equivalente de app1.error_response."""
+    if isinstance(e, app1.InvalidParameter):
+        status = 400
+    elif isinstance(e, app1.PoolTimeout):
+        status = 503
+    else:
+        traceback.print_exc()
+        status = 500
+    resp = json_response(request, encode_json({"error": str(e)}), status)
+    if status == 503:
+        resp.headers["Retry-After"] = "1"
+    return resp
+
+async def authenticate(request):
+    """user_id del token (misma sesión que app1) o None."""
+    auth = request.headers.get("authorization", "")
+    token = auth.split(" ")[1] if " " in auth else auth
+    if not token:
+        return None
+    # Casi siempre es un acierto de la caché local; si no, el almacén se
+    # consulta en un thread para no bloquear el loop
+    user_id = app1.sessions.validate_cached(token)
+    if user_id is None:
+        user_id = await run_in_threadpool(app1.sessions.validate, token)
+    return user_id
+
+# -----------------------
+# LISTADOS
+# -----------------------
+class ListEndpoint:
+    """
+    GET de un listado de app1 (misma consulta y orden). Es una app ASGI y no
+    un handler para poder pasarle el request entero a Flask cuando hace falta.
+    """
+
+    def __init__(self, rule, select_sql, order, etag=False, window=None):
+        self.rule = rule
+        self.select_sql = select_sql
+        self.order = order
+        self.etag = etag
+        self.window = window  # plan_window_filter / hitos_window_filter de app1
+
+    async def __call__(self, scope, receive, send):
+        request = Request(scope, receive)
+        if scope["method"] != "GET" or self.needs_flask(request):
+            await flask_app(scope, receive, send)
+            return
+        t = app1.RequestTimings(keep_statements=app1.SLOW_REQUEST_MS > 0)
+        started = time.perf_counter()
+        try:
+            response = await self.handle(request, t)
+        except Exception as e:
+            response = error_json(request, e)
+        elapsed = time.perf_counter() - started
+        app1.record_route(("GET", self.rule), elapsed, t, response.status_code, len(response.body))
+        if app1.SLOW_REQUEST_MS and elapsed * 1000 >= app1.SLOW_REQUEST_MS:
+            print(f"[lento] GET {request.url.path}?{request.url.query} {response.status_code} "
+                  f"{elapsed * 1000:.0f} ms (asgi, pool {t.pool_wait * 1000:.0f} / sql {t.sql * 1000:.0f} / "
+                  f"json {t.serialize * 1000:.0f} / compresión {t.compress * 1000:.0f} ms) {t.rows} filas")
+        await response(scope, receive, send)
+
+    def needs_flask(self, request):
+        args = request.query_params
+        return ("since" in args
+                or "application/x-ndjson" in request.headers.get("accept", "")
+                or args.get("stream", "").lower() in ("1", "true", "yes"))
+
+    async def handle(self, request, t):
+        if await authenticate(request) is None:
+            return json_response(request, encode_json({"message": "Unauthorized"}), 401)
+        args = MultiDict(request.query_params.multi_items())
+        page = app1.get_page_args(args)
+        conditions, params = self.window(args) if self.window else ((), ())
+        count_query, count_params, query, params = app1.prepare_list_query(
+            self.select_sql, self.order, page, conditions, params)
+
+        etag = sync_token = None
+        total = None
+        async with acquire(t) as conn:
+            if self.etag:
+                version = (await fetch(conn, t, app1.PLAN_VERSION_SQL))[0]
+                sync_token = version["sync_token"]
+                etag = app1.plan_etag_for(version, args.items(multi=True), None)
+                if parse_etags(request.headers.get("if-none-match")).contains_weak(etag):
+                    return Response(status_code=304, headers={"ETag": f'"{etag}"'})
+            if count_query:
+                total = (await fetch(conn, t, count_query, count_params))[0]["total"]
+            rows = await fetch(conn, t, query, params)
+
+        # La conexión ya volvió al pool: de aquí en adelante no se retiene nada
+        encoding = negotiate_encoding(request)
+        if len(rows) > ASYNC_OFFLOAD_ROWS:
+            body, encoding = await run_in_threadpool(render_list, rows, self.order, page, total, encoding, t)
+        else:
+            body, encoding = render_list(rows, self.order, page, total, encoding, t)
+        return json_response(request, body, encoding=encoding, etag=etag, sync_token=sync_token)
+
+
+LIST_ENDPOINTS = [
+    ListEndpoint("/plan-maestro", app1.PLAN_LIST_SQL, app1.ORDER_PLAN, etag=True, window=app1.plan_window_filter),
+    ListEndpoint("/hitos", app1.HITOS_LIST_SQL, app1.ORDER_HITOS, window=app1.hitos_window_filter),
+    ListEndpoint("/documentos", app1.DOCS_LIST_SQL, app1.ORDER_DOCS),
+    ListEndpoint("/observaciones", app1.OBS_LIST_SQL, app1.ORDER_OBS),
+    ListEndpoint("/repositorio", app1.REPO_LIST_SQL, app1.ORDER_REPO),
+    ListEndpoint("/usuarios", app1.USERS_LIST_SQL, app1.ORDER_BY_ID),
+]
+
+# Un POST a /hitos coincide sólo en la ruta con el GET: Starlette sigue buscando
+# y lo atiende el Mount, es decir, Flask
+app = Starlette(
+    routes=[Route(e.rule, e, methods=["GET"]) for e in LIST_ENDPOINTS] + [Mount("/", app=flask_app)],
+    lifespan=lifespan,
+)
@@ -0,0 +1,163 @@
+"""
+Benchmark del grafo de dependencias de app1 (DependencyGraph): carga completa,
+ruta crítica, impacto de un atraso y ajustes incrementales frente a
+reconstruir el grafo en cada request.
+
+    cd backend
+    python -m bench.critical_path                      # 100k actividades sintéticas, en proceso
+    python -m bench.critical_path --rows 1000000 --updates 200
+    python -m bench.critical_path --dep-ratio 0.8 --verify
+
+Las filas salen del generador de bench.seed (fechas y semanas iguales a las de
+la base de carga). Como allí casi ningún dependency_code apunta a un código
+existente, --dep-ratio de las actividades dependen de 1 a 3 actividades
+anteriores dentro de las últimas --dep-window, lo que arma cadenas largas como
+las de un plan real. Cada ajuste incremental es lo que hace un request después
+de un PUT: cambia fechas, dependencias o el código de una actividad, o crea o
+borra una. Con --verify se compara el resultado final con una reconstrucción.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.seed import gen_plan  # noqa: E402
+
+UPDATE_KINDS = ("dates", "dependency", "code", "create", "delete")
+
+
+def plan_rows(n, dep_ratio, dep_window, rng):
+    """Tuplas con las columnas de app1.GRAPH_SQL."""
+    rows = {}
+    codes = []
+    for values in gen_plan(rng, n, max(10, n // 1000)):
+        node_id, code = values[0], values[1]
+        dependency = None
+        if codes and rng.random() < dep_ratio:
+            window = codes[-dep_window:]
+            dependency = ", ".join(rng.sample(window, min(len(window), rng.randint(1, 3))))
+        rows[node_id] = (node_id, code, dependency, values[13], values[14], values[4], values[5])
+        codes.append(code)
+    return rows
+
+
+def mutate(rows, kind, rng, next_id, dep_window):
+    """(filas cambiadas, ids borrados) de un ajuste de tipo kind."""
+    ids = list(rows)
+    node_id = rng.choice(ids)
+    node_id, code, dependency, inicio, fin, week_start, week_end = rows[node_id]
+    if kind == "dates":
+        shift = rng.randint(-20, 20)
+        inicio = inicio.fromordinal(inicio.toordinal() + shift)
+        fin = fin.fromordinal(fin.toordinal() + shift + rng.randint(0, 5))
+    elif kind == "dependency":
+        position = ids.index(node_id)
+        window = ids[max(0, position - dep_window):position] or ids[:1]
+        dependency = rows[rng.choice(window)][1] if rng.random() < 0.8 else None
+    elif kind == "code":
+        code = f"{code}b"
+    elif kind == "create":
+        node_id = next_id
+        dependency = rows[rng.choice(ids[-dep_window:])][1]
+        code = f"N.{next_id}"
+    else:
+        del rows[node_id]
+        return [], [node_id]
+    rows[node_id] = (node_id, code, dependency, inicio, fin, week_start, week_end)
+    return [rows[node_id]], []
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - t0, result
+
+
+def ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--updates", type=int, default=100, help="ajustes incrementales por tipo")
+    parser.add_argument("--dep-ratio", type=float, default=0.6)
+    parser.add_argument("--dep-window", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--verify", action="store_true", help="comparar con una reconstrucción al final")
+    parser.add_argument("--json", help="guardar resultados en este archivo")
+    args = parser.parse_args()
+
+    import app1
+
+    rng = random.Random(args.seed)
+    rows = plan_rows(args.rows, args.dep_ratio, args.dep_window, rng)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    graph = app1.DependencyGraph()
+    build, _ = timed(graph.rebuild, list(rows.values()))
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    summary = graph.summary()
+    first_path, path = timed(graph.critical_path)
+    cached_path, _ = timed(graph.critical_path)
+    print(f"{summary['activities']:,} actividades, {summary['dependencies']:,} dependencias, "
+          f"{len(summary['cycles'])} ciclos; ruta crítica de {len(path)} actividades "
+          f"({summary['project_start']} a {summary['project_end']})")
+
+    result = {
+        "rows": args.rows, "dependencies": summary["dependencies"], "critical_path": len(path),
+        "build_ms": ms(build), "rss_mb": round((rss_after - rss_before) / 1024, 1),
+        "critical_path_ms": ms(first_path), "critical_path_cached_ms": ms(cached_path),
+    }
+
+    impact = []
+    for node in rng.sample(list(rows), min(args.updates, len(rows))):
+        seconds, _ = timed(graph.simulate_delay, node, 5)
+        impact.append(seconds)
+    result["impact_p50_ms"] = ms(statistics.median(impact))
+    result["impact_max_ms"] = ms(max(impact))
+
+    next_id = max(rows) + 1
+    result["incremental"] = {}
+    for kind in UPDATE_KINDS:
+        times = []
+        for _ in range(args.updates):
+            changed, deleted = mutate(rows, kind, rng, next_id, args.dep_window)
+            next_id += 1
+            seconds, _ = timed(graph.apply, changed, deleted)
+            path_seconds, _ = timed(graph.critical_path)
+            times.append(seconds + path_seconds)
+        times.sort()
+        result["incremental"][kind] = {"p50_ms": ms(statistics.median(times)),
+                                       "p95_ms": ms(times[int(0.95 * (len(times) - 1))]),
+                                       "max_ms": ms(times[-1])}
+
+    print(f"\n{'operación':<28}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    print(f"{'carga completa':<28}{result['build_ms']:>10}{'':>10}{'':>10}   (+{result['rss_mb']} MB RSS)")
+    print(f"{'ruta crítica (1ª / caché)':<28}{result['critical_path_ms']:>10}{result['critical_path_cached_ms']:>10}")
+    print(f"{'impacto de 5 días':<28}{result['impact_p50_ms']:>10}{'':>10}{result['impact_max_ms']:>10}")
+    for kind, r in result["incremental"].items():
+        print(f"{'incremental: ' + kind:<28}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['max_ms']:>10}")
+    print(f"\nreconstruir por request costaría {result['build_ms']} ms + ruta crítica en cada consulta")
+
+    if args.verify:
+        fresh = app1.DependencyGraph()
+        fresh.rebuild(list(rows.values()))
+        same_edges = all(graph.preds[n] | graph.cyclic.get(n, set()) == fresh.preds[n] | fresh.cyclic.get(n, set())
+                         for n in rows)
+        same_dates = graph.cyclic or fresh.cyclic or (graph.es, graph.ls) == (fresh.es, fresh.ls)
+        result["verified"] = bool(same_edges and same_dates)
+        print("verificación:", "OK" if result["verified"] else "DIFERENCIAS con la reconstrucción")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
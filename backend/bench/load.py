@@ -0,0 +1,626 @@
+"""
+Prueba de carga: recorre todas las rutas de app1 con un cliente concurrente y
+guarda latencias (p50/p95/p99), throughput y RSS máximo por endpoint en JSON.
+
+    cd backend
+    python -m bench.seed --dsn $DSN --scale 100k --reset
+    python -m bench.load --dsn $DSN                        # levanta app1 en un subproceso
+    python -m bench.load --url https://host:8002 --pid 1234 --username bench_1
+    python -m bench.load --compare antes.json despues.json
+
+Dos fases: "isolated" mide cada endpoint por separado (el RSS máximo del
+servidor se muestrea mientras corre ese endpoint) y "mixed" mezcla lecturas y
+escrituras según los pesos de ENDPOINTS durante --duration segundos. Las
+escrituras crean sus propias filas y las borran, así la base no deriva entre
+corridas. El JSON incluye el commit para comparar corridas entre commits.
+"""
+import argparse
+import datetime
+import http.client
+import json
+import os
+import random
+import socket
+import ssl
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RSS_SAMPLE_SECONDS = 0.05
+SEARCH_TERMS = ["bosque", "manejo", "decreto", "restauracion", "biodiv", "forestl", "cuenca hidrica"]
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarize(latencies, errors, wall):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+class RssSampler:
+    """Muestrea VmRSS de un pid en /proc; peak() devuelve el máximo desde el último reset()."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.max_kb = 0
+        self.lock = threading.Lock()
+        self.running = pid is not None and os.path.exists(f"/proc/{pid}/status")
+        if self.running:
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def _read_kb(self):
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return 0
+
+    def _run(self):
+        while self.running:
+            kb = self._read_kb()
+            with self.lock:
+                self.max_kb = max(self.max_kb, kb)
+            time.sleep(RSS_SAMPLE_SECONDS)
+
+    def reset(self):
+        with self.lock:
+            self.max_kb = self._read_kb() if self.running else 0
+
+    def peak_mb(self):
+        with self.lock:
+            return round(self.max_kb / 1024, 1) if self.max_kb else None
+
+
+class Client:
+    """Conexión keep-alive por thread contra el backend."""
+
+    def __init__(self, base_url, token=None):
+        url = urllib.parse.urlsplit(base_url)
+        self.https = url.scheme == "https"
+        self.host = url.hostname
+        self.port = url.port or (443 if self.https else 80)
+        self.token = token
+        self.local = threading.local()
+        self.ctx = ssl.create_default_context()
+        self.ctx.check_hostname = False
+        self.ctx.verify_mode = ssl.CERT_NONE
+
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            if self.https:
+                conn = http.client.HTTPSConnection(self.host, self.port, timeout=120, context=self.ctx)
+            else:
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+            self.local.conn = conn
+        return conn
+
+    def request(self, method, path, json_body=None, form=None, files=None, token=None):
+        """Devuelve (status, cuerpo). Reintenta una vez si el servidor cerró la conexión."""
+        headers = {}
+        token = self.token if token is None else token
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers["Content-Type"] = "application/json"
+        elif form is not None or files is not None:
+            body, content_type = encode_multipart(form or {}, files or {})
+            headers["Content-Type"] = content_type
+        for attempt in (0, 1):
+            conn = self._conn()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+                if resp.getheader("Connection", "").lower() == "close":
+                    conn.close()
+                    self.local.conn = None
+                return resp.status, data
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                self.local.conn = None
+                if attempt:
+                    raise
+
+    def json(self, method, path, **kwargs):
+        status, data = self.request(method, path, **kwargs)
+        return status, (json.loads(data) if data and data[:1] in (b"{", b"[") else None)
+
+
+def encode_multipart(form, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in form.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content, mimetype) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f"Content-Type: {mimetype}\r\n\r\n".encode() + content + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+class Workload:
+    """Estado compartido: ids de muestra de la base y filas creadas por la corrida."""
+
+    def __init__(self, client, username, password):
+        self.client = client
+        self.username = username
+        self.password = password
+        self.lock = threading.Lock()
+        self.created = {"hitos": [], "observaciones": [], "documentos": [], "repositorio": [],
+                        "usuarios": [], "tokens": [], "plan": []}
+
+        status, body = client.json("POST", "/auth/login", json_body={"username": username, "password": password})
+        if status != 200:
+            sys.exit(f"Login de {username} falló ({status}): ¿corrió bench.seed?")
+        client.token = body["token"]
+
+        _, page = client.json("GET", "/plan-maestro?limit=1000")
+        self.plan_ids = [row["id"] for row in page["items"]]
+        self.since = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=5)).isoformat()
+
+        # Un archivo propio para medir /uploads
+        plan_id = self.plan_ids[0]
+        client.request("POST", "/upload", form={"plan_id": plan_id},
+                       files={"file": ("bench.pdf", os.urandom(256 * 1024), "application/pdf")})
+        _, docs = client.json("GET", f"/plan-maestro/{plan_id}/documentos")
+        self.upload_path = next((d["ruta_archivo"] for d in docs or [] if d["nombre_archivo"] == "bench.pdf"), None)
+
+    def plan_id(self, rng):
+        return rng.choice(self.plan_ids)
+
+    def push(self, kind, value):
+        with self.lock:
+            self.created[kind].append(value)
+
+    def pop(self, kind):
+        with self.lock:
+            return self.created[kind].pop() if self.created[kind] else None
+
+
+# ---- Operaciones: cada una hace UN request y devuelve el status HTTP ----
+
+def op_get(path):
+    def run(w, rng):
+        return w.client.request("GET", path(w, rng) if callable(path) else path)[0]
+    return run
+
+
+def op_login(w, rng):
+    status, body = w.client.json("POST", "/auth/login", json_body={"username": w.username, "password": w.password},
+                                 token="")
+    if status == 200:
+        w.push("tokens", body["token"])
+    return status
+
+
+def op_logout(w, rng):
+    token = w.pop("tokens")
+    if token is None:
+        return op_login(w, rng)
+    return w.client.request("POST", "/auth/logout", token=token)[0]
+
+
+def op_register(w, rng):
+    return w.client.request("POST", "/auth/register", json_body={
+        "nombre": "Bench", "username": f"bench_reg_{uuid.uuid4().hex[:12]}", "password": w.password})[0]
+
+
+def op_create_user(w, rng):
+    status, body = w.client.json("POST", "/usuarios", json_body={
+        "nombre": "Bench", "username": f"bench_tmp_{uuid.uuid4().hex[:12]}", "password": w.password})
+    if status in (200, 201) and body and "id" in body:
+        w.push("usuarios", body["id"])
+    return status
+
+
+def op_update_user(w, rng):
+    user_id = w.pop("usuarios")
+    if user_id is None:
+        return op_create_user(w, rng)
+    w.push("usuarios", user_id)
+    return w.client.request("PUT", f"/usuarios/{user_id}", json_body={"nombre": f"Bench {rng.randint(1, 999)}"})[0]
+
+
+def op_delete_user(w, rng):
+    user_id = w.pop("usuarios")
+    if user_id is None:
+        return op_create_user(w, rng)
+    return w.client.request("DELETE", f"/usuarios/{user_id}")[0]
+
+
+def op_create_plan(w, rng):
+    status, body = w.client.json("POST", "/plan-maestro", json_body={
+        "activity_code": f"B.{uuid.uuid4().hex[:8]}", "product_code": "9.9 | Bench",
+        "task_name": "Actividad de carga", "status": "Pendiente", "week_start": 1, "week_end": 2})
+    if status == 201:
+        w.push("plan", body["id"])
+    return status
+
+
+def op_update_plan(w, rng):
+    return w.client.request("PUT", f"/plan-maestro/{w.plan_id(rng)}",
+                            json_body={"status": rng.choice(["Pendiente", "En Progreso", "Completado"])})[0]
+
+
+def op_batch_plan(w, rng):
+    # Borra las actividades creadas por la corrida y actualiza una muestra
+    deletes = []
+    while len(deletes) < 20:
+        plan_id = w.pop("plan")
+        if plan_id is None:
+            break
+        deletes.append(plan_id)
+    updates = [{"id": pid, "status": "En Progreso"} for pid in rng.sample(w.plan_ids, min(20, len(w.plan_ids)))]
+    return w.client.request("POST", "/plan-maestro/batch", json_body={"update": updates, "delete": deletes})[0]
+
+
+def op_create_hito(w, rng):
+    status, body = w.client.json("POST", "/hitos", json_body={
+        "plan_maestro_id": w.plan_id(rng), "nombre": "Hito de carga", "fecha_estimada": "2025-06-30"})
+    if status == 201:
+        w.push("hitos", body["id"])
+    return status
+
+
+def op_update_hito(w, rng):
+    hito_id = w.pop("hitos")
+    if hito_id is None:
+        return op_create_hito(w, rng)
+    w.push("hitos", hito_id)
+    return w.client.request("PUT", f"/hitos/{hito_id}", json_body={"estado": "En Progreso"})[0]
+
+
+def op_delete_hito(w, rng):
+    hito_id = w.pop("hitos")
+    if hito_id is None:
+        return op_create_hito(w, rng)
+    return w.client.request("DELETE", f"/hitos/{hito_id}")[0]
+
+
+def op_batch_hitos(w, rng):
+    creates = [{"plan_maestro_id": w.plan_id(rng), "nombre": f"Hito lote {i}"} for i in range(10)]
+    status, body = w.client.json("POST", "/hitos/batch", json_body={"create": creates})
+    for result in (body or {}).get("results", []):
+        if result.get("op") == "create" and result.get("id"):
+            w.push("hitos", result["id"])
+    return status
+
+
+def op_add_obs(w, rng):
+    status, body = w.client.json("POST", f"/plan-maestro/{w.plan_id(rng)}/observaciones",
+                                 json_body={"texto": "Observación de carga"})
+    if status == 201:
+        w.push("observaciones", body["id"])
+    return status
+
+
+def op_update_obs(w, rng):
+    obs_id = w.pop("observaciones")
+    if obs_id is None:
+        return op_add_obs(w, rng)
+    w.push("observaciones", obs_id)
+    return w.client.request("PUT", f"/observaciones/{obs_id}", json_body={"texto": "Observación editada"})[0]
+
+
+def op_delete_obs(w, rng):
+    obs_id = w.pop("observaciones")
+    if obs_id is None:
+        return op_add_obs(w, rng)
+    return w.client.request("DELETE", f"/observaciones/{obs_id}")[0]
+
+
+def op_upload(w, rng):
+    return w.client.request("POST", "/upload", form={"plan_id": w.plan_id(rng)},
+                            files={"file": (f"carga_{rng.randint(1, 50)}.pdf", os.urandom(64 * 1024),
+                                            "application/pdf")})[0]
+
+
+def op_delete_doc(w, rng):
+    # Borra documentos subidos por la corrida (busca el último de una actividad al azar)
+    plan_id = w.plan_id(rng)
+    status, docs = w.client.json("GET", f"/plan-maestro/{plan_id}/documentos")
+    mine = [d for d in docs or [] if str(d.get("nombre_archivo", "")).startswith("carga_")]
+    if not mine:
+        return op_upload(w, rng)
+    return w.client.request("DELETE", f"/documentos/{mine[0]['id']}")[0]
+
+
+def op_add_repo(w, rng):
+    status, body = w.client.json("POST", "/repositorio", form={
+        "titulo": f"Documento de carga {rng.randint(1, 9999)}", "tipo_documento": "Informe Técnico",
+        "descripcion": "Texto de prueba de carga sobre manejo forestal", "etiquetas": "carga, bench"},
+        files={"file": ("carga.txt", b"contenido de prueba " * 100, "text/plain")})
+    if status == 201:
+        w.push("repositorio", body["id"])
+    return status
+
+
+def op_update_repo(w, rng):
+    repo_id = w.pop("repositorio")
+    if repo_id is None:
+        return op_add_repo(w, rng)
+    w.push("repositorio", repo_id)
+    return w.client.request("PUT", f"/repositorio/{repo_id}", json_body={"descripcion": "Descripción editada"})[0]
+
+
+def op_delete_repo(w, rng):
+    repo_id = w.pop("repositorio")
+    if repo_id is None:
+        return op_add_repo(w, rng)
+    return w.client.request("DELETE", f"/repositorio/{repo_id}")[0]
+
+
+def op_download(w, rng):
+    if not w.upload_path:
+        return 404
+    return w.client.request("GET", f"/uploads/{w.upload_path}")[0]
+
+
+# (nombre, peso en la mezcla, operación). Los pesos aproximan el uso real:
+# muchas lecturas del plan y del repositorio, pocas escrituras.
+ENDPOINTS = [
+    ("GET /health", 1, op_get("/health")),
+    ("GET /metrics", 1, op_get("/metrics")),
+    ("POST /auth/login", 2, op_login),
+    ("POST /auth/logout", 2, op_logout),
+    ("POST /auth/register", 1, op_register),
+    ("GET /usuarios", 2, op_get("/usuarios?limit=100")),
+    ("POST /usuarios", 1, op_create_user),
+    ("PUT /usuarios/<id>", 1, op_update_user),
+    ("DELETE /usuarios/<id>", 1, op_delete_user),
+    ("GET /plan-maestro?limit=100", 15, op_get("/plan-maestro?limit=100")),
+    ("GET /plan-maestro?since", 10, op_get(lambda w, r: f"/plan-maestro?since={urllib.parse.quote(w.since)}")),
+    ("GET /plan-maestro (completo)", 1, op_get("/plan-maestro")),
+    ("POST /plan-maestro", 3, op_create_plan),
+    ("PUT /plan-maestro/<id>", 5, op_update_plan),
+    ("POST /plan-maestro/batch", 1, op_batch_plan),
+    ("GET /plan-maestro/<id>/hitos", 8, op_get(lambda w, r: f"/plan-maestro/{w.plan_id(r)}/hitos")),
+    ("GET /hitos", 4, op_get("/hitos?limit=100")),
+    ("POST /hitos", 3, op_create_hito),
+    ("POST /hitos/batch", 1, op_batch_hitos),
+    ("PUT /hitos/<id>", 2, op_update_hito),
+    ("DELETE /hitos/<id>", 2, op_delete_hito),
+    ("GET /stats", 8, op_get("/stats")),
+    ("GET /documentos", 4, op_get("/documentos?limit=100")),
+    ("GET /plan-maestro/<id>/documentos", 6, op_get(lambda w, r: f"/plan-maestro/{w.plan_id(r)}/documentos")),
+    ("POST /upload", 2, op_upload),
+    ("DELETE /documentos/<id>", 1, op_delete_doc),
+    ("GET /plan-maestro/<id>/observaciones", 6,
+     op_get(lambda w, r: f"/plan-maestro/{w.plan_id(r)}/observaciones")),
+    ("POST /plan-maestro/<id>/observaciones", 3, op_add_obs),
+    ("GET /observaciones", 3, op_get("/observaciones?limit=100")),
+    ("PUT /observaciones/<id>", 1, op_update_obs),
+    ("DELETE /observaciones/<id>", 1, op_delete_obs),
+    ("GET /repositorio", 4, op_get("/repositorio?limit=100")),
+    ("GET /repositorio/search", 8,
+     op_get(lambda w, r: f"/repositorio/search?q={urllib.parse.quote(r.choice(SEARCH_TERMS))}")),
+    ("POST /repositorio", 1, op_add_repo),
+    ("PUT /repositorio/<id>", 1, op_update_repo),
+    ("DELETE /repositorio/<id>", 1, op_delete_repo),
+    ("GET /uploads/<archivo>", 3, op_download),
+]
+
+
+def run_isolated(workload, endpoints, concurrency, total, rss):
+    results = {}
+    for name, _, op in endpoints:
+        latencies, errors = [], [0]
+        lock = threading.Lock()
+        remaining = [total]
+
+        def worker(seed):
+            rng = random.Random(seed)
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                t0 = time.perf_counter()
+                try:
+                    ok = op(workload, rng) < 400
+                except OSError:
+                    ok = False
+                elapsed = time.perf_counter() - t0
+                with lock:
+                    if ok:
+                        latencies.append(elapsed)
+                    else:
+                        errors[0] += 1
+
+        rss.reset()
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        r = summarize(latencies, errors[0], time.perf_counter() - t0)
+        r["peak_rss_mb"] = rss.peak_mb()
+        results[name] = r
+        print(f"{name:<42}{r['requests']:>6}{r['errors']:>5}{r['throughput_rps']:>9}"
+              f"{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{str(r['peak_rss_mb']):>9}")
+    return results
+
+
+def run_mixed(workload, endpoints, concurrency, duration, rss):
+    names = [name for name, _, _ in endpoints]
+    weights = [weight for _, weight, _ in endpoints]
+    ops = {name: op for name, _, op in endpoints}
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                ok = ops[name](workload, rng) < 400
+            except OSError:
+                ok = False
+            elapsed = time.perf_counter() - t0
+            with lock:
+                if ok:
+                    latencies[name].append(elapsed)
+                else:
+                    errors[name] += 1
+
+    rss.reset()
+    threads = [threading.Thread(target=worker, args=(1000 + i,)) for i in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    all_latencies = [x for values in latencies.values() for x in values]
+    overall = summarize(all_latencies, sum(errors.values()), wall)
+    overall["peak_rss_mb"] = rss.peak_mb()
+    overall["endpoints"] = {name: summarize(latencies[name], errors[name], wall)
+                            for name in names if latencies[name] or errors[name]}
+    print(f"mezcla: {overall['requests']} requests, {overall['throughput_rps']} req/s, p50 {overall['p50_ms']} ms, "
+          f"p95 {overall['p95_ms']} ms, p99 {overall['p99_ms']} ms, RSS máx {overall['peak_rss_mb']} MB, "
+          f"errores {overall['errors']}")
+    return overall
+
+
+def start_local_server(dsn):
+    """app1 en un servidor WSGI con threads en un subproceso (su RSS es lo que se mide)."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    code = (
+        "from werkzeug.serving import WSGIRequestHandler, run_simple\n"
+        "import app1\n"
+        "class H(WSGIRequestHandler):\n"
+        "    protocol_version = 'HTTP/1.1'\n"
+        "    def log_request(self, *a, **k): pass\n"
+        f"run_simple('127.0.0.1', {port}, app1.app, threaded=True, request_handler=H)\n"
+    )
+    env = dict(os.environ, DATABASE_URL=dsn)
+    proc = subprocess.Popen([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env)
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return proc, base
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    sys.exit("El servidor local no respondió /health")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['meta'].get('commit', '?')[:8]} -> {new['meta'].get('commit', '?')[:8]}")
+    print(f"{'endpoint':<42}{'p95 antes':>11}{'p95 ahora':>11}{'Δ%':>8}{'rps antes':>11}{'rps ahora':>11}")
+    for name, after in new.get("isolated", {}).items():
+        before = old.get("isolated", {}).get(name)
+        if not before:
+            continue
+        delta = (after["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0
+        print(f"{name:<42}{before['p95_ms']:>11}{after['p95_ms']:>11}{delta:>+8.1f}"
+              f"{before['throughput_rps']:>11}{after['throughput_rps']:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="base sembrada (servidor local)")
+    parser.add_argument("--url", help="servidor ya levantado en vez del local")
+    parser.add_argument("--pid", type=int, help="pid del servidor remoto para medir RSS (misma máquina)")
+    parser.add_argument("--username", default="bench_1")
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="requests por endpoint (fase isolated)")
+    parser.add_argument("--duration", type=float, default=60, help="segundos de la fase mixed")
+    parser.add_argument("--phase", choices=("isolated", "mixed", "both"), default="both")
+    parser.add_argument("--only", help="sólo endpoints cuyo nombre contenga este texto")
+    parser.add_argument("--out", help="archivo JSON de resultados (por defecto bench-<commit>-<fecha>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("ANTES", "AHORA"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    proc = None
+    if args.url:
+        base, pid = args.url, args.pid
+    else:
+        if not args.dsn:
+            parser.error("se necesita --dsn (o DATABASE_URL) o --url")
+        proc, base = start_local_server(args.dsn)
+        pid = proc.pid
+
+    endpoints = [e for e in ENDPOINTS if not args.only or args.only in e[0]]
+    commit = git_commit()
+    result = {"meta": {"commit": commit, "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                       "url": base, "concurrency": args.concurrency, "requests": args.requests,
+                       "duration": args.duration}}
+    try:
+        client = Client(base)
+        workload = Workload(client, args.username, args.password)
+        _, page = client.json("GET", "/plan-maestro?limit=1&total=1")
+        _, stats = client.json("GET", "/stats")
+        result["meta"]["scale"] = {"plan_maestro": (page or {}).get("total"),
+                                   "hitos": (stats or {}).get("milestones")}
+        rss = RssSampler(pid)
+
+        if args.phase in ("isolated", "both"):
+            print(f"{'endpoint':<42}{'req':>6}{'err':>5}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'RSS MB':>9}")
+            result["isolated"] = run_isolated(workload, endpoints, args.concurrency, args.requests, rss)
+        if args.phase in ("mixed", "both"):
+            result["mixed"] = run_mixed(workload, endpoints, args.concurrency, args.duration, rss)
+        rss.running = False
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+
+    out = args.out or f"bench-{(commit or 'sin-git')[:8]}-{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Resultados en {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Microbenchmark del login: throughput y latencia del chequeo bcrypt a distintos
+niveles de concurrencia.
+
+    cd backend
+    python -m bench.login                         # inline vs pool de procesos
+    python -m bench.login --url https://host:8002 --username u --password p
+
+Sin --url mide el camino de contraseña en proceso (bcrypt inline en el thread
+vs check_password en el pool acotado). Con --url dispara POST /auth/login
+contra un servidor levantado.
+"""
+import argparse
+import json
+import os
+import ssl
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import bcrypt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_level(fn, concurrency, total):
+    """Ejecuta fn() total veces repartidas en concurrency threads."""
+    latencies = []
+    outcomes = {"ok": 0, "rejected": 0, "error": 0}
+    lock = threading.Lock()
+    remaining = [total]
+
+    def worker():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            t0 = time.perf_counter()
+            outcome = fn()
+            elapsed = time.perf_counter() - t0
+            with lock:
+                outcomes[outcome] += 1
+                if outcome == "ok":
+                    latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    latencies.sort()
+    pct = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "throughput_rps": round(outcomes["ok"] / wall, 2),
+        "p50_ms": round(pct(0.50), 1),
+        "p95_ms": round(pct(0.95), 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1) if latencies else 0.0,
+        **outcomes,
+    }
+
+
+def local_targets(rounds):
+    import app1
+
+    password = "benchmark-password"
+    hashed = bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+    def inline():
+        return "ok" if bcrypt.checkpw(password.encode(), hashed.encode()) else "error"
+
+    def pooled():
+        try:
+            return "ok" if app1.check_password(password, hashed) else "error"
+        except app1.PasswordBusy:
+            return "rejected"
+
+    app1.get_bcrypt_pool()  # arrancar los procesos fuera de la medición
+    return {"inline": inline, "pool": pooled}
+
+
+def http_target(url, username, password):
+    body = json.dumps({"username": username, "password": password}).encode()
+    ctx = ssl.create_default_context()
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+
+    def login():
+        req = urllib.request.Request(url.rstrip("/") + "/auth/login", data=body,
+                                     headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, context=ctx, timeout=30) as resp:
+                resp.read()
+                return "ok"
+        except urllib.error.HTTPError as e:
+            return "rejected" if e.code in (429, 503) else "error"
+        except OSError:
+            return "error"
+
+    return {"http": login}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32")
+    parser.add_argument("--requests", type=int, default=64, help="logins por nivel")
+    parser.add_argument("--rounds", type=int, default=int(os.getenv("BCRYPT_ROUNDS", "12")))
+    parser.add_argument("--url")
+    parser.add_argument("--username")
+    parser.add_argument("--password")
+    parser.add_argument("--json", help="guardar resultados en este archivo")
+    args = parser.parse_args()
+
+    if args.url:
+        targets = http_target(args.url, args.username, args.password)
+    else:
+        targets = local_targets(args.rounds)
+
+    results = []
+    print(f"{'modo':<8}{'conc':>6}{'ok':>6}{'rech':>6}{'err':>5}{'logins/s':>10}{'p50 ms':>9}{'p95 ms':>9}")
+    for name, fn in targets.items():
+        for level in (int(c) for c in args.concurrency.split(",")):
+            r = run_level(fn, level, args.requests)
+            r["mode"] = name
+            results.append(r)
+            print(f"{name:<8}{level:>6}{r['ok']:>6}{r['rejected']:>6}{r['error']:>5}"
+                  f"{r['throughput_rps']:>10}{r['p50_ms']:>9}{r['p95_ms']:>9}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"rounds": args.rounds, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
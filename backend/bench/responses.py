@@ -0,0 +1,156 @@
+"""
+Benchmark de serialización y compresión de respuestas JSON: bytes enviados y
+CPU por request del listado del plan, con el encoder estándar (antes) y orjson,
+sin comprimir, con gzip y con brotli.
+
+    cd backend
+    python -m bench.responses                       # 50k actividades sintéticas, en proceso
+    python -m bench.responses --rows 100000 --repeat 10
+    python -m bench.responses --url https://host:8002 --token <token>
+
+En proceso arma las filas con el generador de bench.seed (mismos tipos que
+devuelve psycopg2: date, datetime con zona) y pasa cada combinación por el
+proveedor JSON y el hook compress_response reales de app1; la CPU se mide con
+process_time. Con --url pide GET /plan-maestro a un servidor levantado con
+cada Accept-Encoding y mide bytes en el cable y latencia (el encoder de ese
+servidor se elige con JSON_BACKEND al arrancarlo).
+"""
+import argparse
+import datetime
+import http.client
+import json
+import os
+import random
+import ssl
+import statistics
+import sys
+import time
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.seed import TABLES, gen_plan  # noqa: E402
+
+ENCODINGS = ("identity", "gzip", "br")
+
+
+def plan_rows(n):
+    columns = TABLES[1][1]
+    rng = random.Random(42)
+    created = datetime.datetime(2025, 1, 6, 9, 30, tzinfo=datetime.timezone.utc)
+    rows = []
+    for values in gen_plan(rng, n, max(10, n // 1000)):
+        row = dict(zip(columns, values))
+        row["has_file_uploaded"] = rng.random() < 0.3
+        row["created_at"] = created + datetime.timedelta(seconds=row["id"])
+        row["updated_at"] = row["created_at"] + datetime.timedelta(days=rng.randint(0, 60), microseconds=rng.randint(0, 999999))
+        # Contadores de la migración 6 (p.* los incluye)
+        row["n_hitos"] = 2
+        row["n_hitos_pendientes"] = rng.randint(0, 2)
+        row["n_documentos"] = int(row["has_file_uploaded"]) * rng.randint(1, 3)
+        row["n_observaciones"] = rng.randint(0, 3)
+        row["last_activity_at"] = row["updated_at"]
+        rows.append(row)
+    return rows
+
+
+def run_local(rows, repeat):
+    import app1
+
+    providers = [("stdlib", app1.CustomJSONProvider(app1.app))]
+    if app1.orjson is not None:
+        providers.append(("orjson", app1.OrjsonJSONProvider(app1.app)))
+    else:
+        print("orjson no instalado: sólo encoder estándar")
+    encodings = [e for e in ENCODINGS if e != "br" or app1.brotli is not None]
+    if "br" not in encodings:
+        print("brotli no instalado: se omite br")
+
+    results = []
+    for name, provider in providers:
+        for encoding in encodings:
+            serialize, compress, sizes = [], [], []
+            for _ in range(repeat):
+                with app1.app.test_request_context("/plan-maestro", headers={"Accept-Encoding": encoding}):
+                    t0 = time.process_time()
+                    resp = provider.response(rows)
+                    t1 = time.process_time()
+                    resp = app1.compress_response(resp)
+                    t2 = time.process_time()
+                serialize.append(t1 - t0)
+                compress.append(t2 - t1)
+                sizes.append(len(resp.get_data()))
+            results.append({
+                "json": name, "encoding": encoding, "bytes": sizes[0],
+                "serialize_ms": round(statistics.median(serialize) * 1000, 1),
+                "compress_ms": round(statistics.median(compress) * 1000, 1),
+                "cpu_ms": round(statistics.median(s + c for s, c in zip(serialize, compress)) * 1000, 1),
+            })
+    return results
+
+
+def run_remote(base_url, token, path, repeat):
+    url = urllib.parse.urlsplit(base_url)
+    ctx = ssl.create_default_context()
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+    results = []
+    for encoding in ENCODINGS:
+        if url.scheme == "https":
+            conn = http.client.HTTPSConnection(url.hostname, url.port or 443, timeout=300, context=ctx)
+        else:
+            conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=300)
+        latencies, size, served = [], 0, None
+        try:
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                conn.request("GET", path, headers={"Authorization": f"Bearer {token}", "Accept-Encoding": encoding})
+                resp = conn.getresponse()
+                # http.client no descomprime: esto es lo que viajó por el cable
+                size = len(resp.read())
+                latencies.append(time.perf_counter() - t0)
+                served = resp.getheader("Content-Encoding", "identity")
+                if resp.status != 200:
+                    sys.exit(f"GET {path}: HTTP {resp.status}")
+        finally:
+            conn.close()
+        results.append({"encoding": encoding, "served": served, "bytes": size,
+                        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+                        "max_ms": round(max(latencies) * 1000, 1)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--url")
+    parser.add_argument("--token", default=os.getenv("GWP_TOKEN"))
+    parser.add_argument("--path", default="/plan-maestro")
+    parser.add_argument("--json", help="guardar resultados en este archivo")
+    args = parser.parse_args()
+
+    if args.url:
+        if not args.token:
+            sys.exit("--token (o GWP_TOKEN) requerido con --url")
+        results = run_remote(args.url, args.token, args.path, args.repeat)
+        print(f"{'pedido':<10}{'servido':<10}{'bytes':>14}{'p50 ms':>10}{'max ms':>10}")
+        for r in results:
+            print(f"{r['encoding']:<10}{r['served']:<10}{r['bytes']:>14,}{r['p50_ms']:>10}{r['max_ms']:>10}")
+    else:
+        rows = plan_rows(args.rows)
+        results = run_local(rows, args.repeat)
+        base = results[0]
+        print(f"{len(rows)} filas, mediana de {args.repeat} repeticiones (CPU de proceso)")
+        print(f"{'json':<8}{'encoding':<10}{'bytes':>14}{'vs antes':>10}{'json ms':>10}{'compr. ms':>11}{'CPU ms':>9}")
+        for r in results:
+            print(f"{r['json']:<8}{r['encoding']:<10}{r['bytes']:>14,}{r['bytes'] / base['bytes']:>9.1%}"
+                  f"{r['serialize_ms']:>10}{r['compress_ms']:>11}{r['cpu_ms']:>9}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"rows": args.rows, "url": args.url, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
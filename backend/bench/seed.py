@@ -0,0 +1,207 @@
+"""
+Generador de datos de carga: recrea el esquema de database/schema.sql en un
+Postgres local y lo llena con filas sintéticas vía COPY.
+
+    cd backend
+    python -m bench.seed --dsn postgresql://postgres:pw@localhost/gwp_bench --scale 100k --reset
+
+--scale fija las actividades del plan (1k, 100k, 1M...); el resto escala en
+proporción: 2 hitos, 1 observación y medio documento por actividad, un
+documento de repositorio cada 10 y un usuario cada 1000 (mínimo 10). Los
+datos son deterministas para una misma --seed, así que dos commits se miden
+sobre la misma base. Los usuarios se llaman bench_<n> con --password.
+"""
+import argparse
+import csv
+import datetime
+import io
+import os
+import random
+import re
+import sys
+import time
+
+import bcrypt
+import psycopg2
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "database", "schema.sql")
+COPY_CHUNK_ROWS = 50000
+
+PRODUCTS = ["1.1 | Coordinación", "1.2 | Diagnóstico", "2.1 | Levantamiento", "2.2 | Análisis territorial",
+            "3.1 | Propuesta", "3.2 | Validación", "4.1 | Informe final"]
+TYPE_TAGS = ["Tarea", "Hito", "Entregable", "Reunión"]
+ROLES = ["Jefe de Proyecto", "Especialista SIG", "Ingeniero Forestal", "Abogado", "Economista"]
+STATUSES = ["Pendiente"] * 5 + ["En Progreso"] * 3 + ["Completado"] * 3 + ["Atrasado"]
+DOC_TYPES = ["Ley", "Decreto", "Informe Técnico", "Acta", "Guía", "Estudio"]
+SOURCES = ["CONAF", "MMA", "SAG", "INFOR", "Universidad de Chile", "Municipalidad"]
+WORDS = ("bosque nativo plan manejo forestal incendio restauración cuenca hídrica suelo erosión "
+         "biodiversidad especie amenazada monitoreo fiscalización decreto reglamento comunidad "
+         "territorio catastro vegetación plantación cosecha certificación carbono sequía "
+         "humedal corredor biológico participación ciudadana informe técnico propuesta").split()
+
+START_DATE = datetime.date(2025, 1, 6)
+
+
+def parse_scale(value):
+    m = re.fullmatch(r"(\d+)([kKmM]?)", value.strip())
+    if not m:
+        raise argparse.ArgumentTypeError("Escala inválida (ej: 1k, 100k, 1M)")
+    return int(m.group(1)) * {"": 1, "k": 1000, "m": 1000000}[m.group(2).lower()]
+
+
+def sentence(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def load_schema(cur):
+    with open(SCHEMA_PATH, encoding="utf-8") as f:
+        sql = f.read()
+    # pg_cron no suele estar en una base local de pruebas
+    sql = re.sub(r"SELECT cron\.schedule\(.*?\);", "", sql, flags=re.S)
+    cur.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public;")
+    cur.execute(sql)
+
+
+def copy_rows(cur, table, columns, rows):
+    """COPY por bloques de COPY_CHUNK_ROWS filas para no armar todo en memoria."""
+    total = 0
+    while True:
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        n = 0
+        for row in rows:
+            writer.writerow(["" if v is None else v for v in row])
+            n += 1
+            if n == COPY_CHUNK_ROWS:
+                break
+        if not n:
+            return total
+        buf.seek(0)
+        # Cadena vacía sin comillas = NULL en CSV; los textos nunca vienen vacíos
+        cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+        total += n
+        if n < COPY_CHUNK_ROWS:
+            return total
+
+
+def gen_users(n, password_hash):
+    for i in range(1, n + 1):
+        yield i, f"Usuario Bench {i}", f"bench_{i}", password_hash
+
+
+def gen_plan(rng, n, n_users):
+    for i in range(1, n + 1):
+        week_start = rng.randint(1, 50)
+        week_end = week_start + rng.randint(0, 8)
+        product = rng.choice(PRODUCTS)
+        code = f"{product.split(' ')[0]}.{i}"
+        dependency = f"{product.split(' ')[0]}.{rng.randint(1, i - 1)}" if i > 1 and rng.random() < 0.3 else None
+        yield (i, code, product, f"Actividad {i}: {sentence(rng, 6)}", week_start, week_end,
+               rng.choice(TYPE_TAGS), dependency, sentence(rng, 8), rng.choice(ROLES),
+               rng.choice(ROLES), f"Responsable {rng.randint(1, 40)}", rng.choice(STATUSES),
+               START_DATE + datetime.timedelta(weeks=week_start),
+               START_DATE + datetime.timedelta(weeks=week_end, days=4),
+               rng.randint(1, n_users), rng.randint(1, n_users))
+
+
+def gen_hitos(rng, n_plan, n_users):
+    hito_id = 0
+    for plan_id in range(1, n_plan + 1):
+        for k in range(2):
+            hito_id += 1
+            estimada = START_DATE + datetime.timedelta(days=rng.randint(0, 400))
+            real = estimada + datetime.timedelta(days=rng.randint(-5, 20)) if rng.random() < 0.4 else None
+            yield (hito_id, plan_id, f"Hito {k + 1}: {sentence(rng, 4)}", estimada, real,
+                   "Completado" if real else rng.choice(["Pendiente", "En Progreso"]),
+                   sentence(rng, 12), rng.randint(1, n_users), rng.randint(1, n_users))
+
+
+def gen_documentos(rng, n_plan, n_users):
+    for i in range(1, n_plan // 2 + 1):
+        digest = f"{rng.getrandbits(256):064x}"
+        yield (i, rng.randint(1, n_plan), f"documento_{i}.pdf", f"blobs/{digest[:2]}/{digest}.pdf",
+               "application/pdf", rng.randint(20000, 20000000), rng.randint(1, n_users))
+
+
+def gen_observaciones(rng, n_plan, n_users):
+    for i in range(1, n_plan + 1):
+        yield i, rng.randint(1, n_plan), rng.randint(1, n_users), sentence(rng, rng.randint(8, 40))
+
+
+def gen_repositorio(rng, n, n_users):
+    for i in range(1, n + 1):
+        yield (i, f"{rng.choice(DOC_TYPES)} {i}: {sentence(rng, 5)}", rng.choice(DOC_TYPES),
+               sentence(rng, rng.randint(30, 120)), sentence(rng, 20),
+               START_DATE - datetime.timedelta(days=rng.randint(0, 3650)), rng.choice(SOURCES),
+               rng.choice(["Gobierno", "ONG", "Academia", "Privado"]),
+               ", ".join(rng.sample(WORDS, 3)), rng.randint(1, n_users))
+
+
+TABLES = [
+    ("usuarios", ("id", "nombre", "username", "password_hash")),
+    ("plan_maestro", ("id", "activity_code", "product_code", "task_name", "week_start", "week_end",
+                      "type_tag", "dependency_code", "evidence_requirement", "primary_role",
+                      "co_responsibles", "primary_responsible", "status", "fecha_inicio", "fecha_fin",
+                      "created_by", "updated_by")),
+    ("hitos", ("id", "plan_maestro_id", "nombre", "fecha_estimada", "fecha_real", "estado",
+               "descripcion", "created_by", "updated_by")),
+    ("documentos", ("id", "plan_maestro_id", "nombre_archivo", "ruta_archivo", "tipo_archivo",
+                    "tamano_bytes", "uploaded_by")),
+    ("observaciones", ("id", "plan_maestro_id", "usuario_id", "texto")),
+    ("repositorio_documentos", ("id", "titulo", "tipo_documento", "descripcion", "puntos_clave",
+                                "fecha_publicacion", "fuente_origen", "tipo_fuente", "etiquetas",
+                                "uploaded_by")),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"), required=not os.getenv("DATABASE_URL"))
+    parser.add_argument("--scale", type=parse_scale, default=parse_scale("1k"))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="DROP SCHEMA public y recrear desde schema.sql")
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--rounds", type=int, default=int(os.getenv("BCRYPT_ROUNDS", "12")))
+    args = parser.parse_args()
+
+    n_plan = args.scale
+    n_users = max(10, n_plan // 1000)
+    n_repo = max(10, n_plan // 10)
+    rng = random.Random(args.seed)
+    password_hash = bcrypt.hashpw(args.password.encode(), bcrypt.gensalt(args.rounds)).decode()
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        with conn.cursor() as cur:
+            if args.reset:
+                load_schema(cur)
+            else:
+                cur.execute("SELECT EXISTS (SELECT 1 FROM plan_maestro)")
+                if cur.fetchone()[0]:
+                    sys.exit("La base ya tiene datos: usar --reset para recrearla")
+
+            generators = {
+                "usuarios": gen_users(n_users, password_hash),
+                "plan_maestro": gen_plan(rng, n_plan, n_users),
+                "hitos": gen_hitos(rng, n_plan, n_users),
+                "documentos": gen_documentos(rng, n_plan, n_users),
+                "observaciones": gen_observaciones(rng, n_plan, n_users),
+                "repositorio_documentos": gen_repositorio(rng, n_repo, n_users),
+            }
+            for table, columns in TABLES:
+                t0 = time.perf_counter()
+                n = copy_rows(cur, table, columns, generators[table])
+                # Los ids se copiaron explícitos: alinear la secuencia
+                cur.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), GREATEST(MAX(id), 1)) FROM {table}")
+                print(f"{table:<24}{n:>10} filas  {time.perf_counter() - t0:7.1f} s")
+        conn.commit()
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("VACUUM ANALYZE")
+    finally:
+        conn.close()
+    print(f"Listo. Usuarios bench_1..bench_{n_users} / {args.password}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Escalamiento con la concurrencia: los mismos listados servidos por app1 en
+threads (Flask) y por asgi.py (uvicorn + asyncpg), con 1 a cientos de
+clientes simultáneos, opcionalmente lentos.
+
+    cd backend
+    python -m bench.seed --dsn $DSN --scale 100k --reset
+    python -m bench.serving --dsn $DSN
+    python -m bench.serving --dsn $DSN --path "/hitos?limit=1000" --levels 8,64,256 --read-kbps 256
+
+Cada modo corre en su propio subproceso sobre la misma base. Por nivel de
+concurrencia se mide durante --duration segundos: req/s, p50/p95/p99 hasta el
+último byte, 503 (pool agotado) y otros errores, y el RSS máximo del servidor.
+Con --read-kbps cada cliente lee el cuerpo a esa velocidad con un buffer de
+recepción chico, así el servidor no puede descargar la respuesta en el socket
+de una vez: es el caso en que el camino con threads retiene un thread y una
+conexión del pool por cada cliente lento.
+"""
+import argparse
+import datetime
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.load import BACKEND_DIR, RssSampler, git_commit, start_local_server, summarize  # noqa: E402
+
+SLOW_READ_CHUNK = 16 * 1024
+SLOW_RCVBUF = 64 * 1024
+
+
+def start_asgi_server(dsn):
+    """asgi.py con uvicorn en un subproceso."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = dict(os.environ, DATABASE_URL=dsn)
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1",
+                             "--port", str(port), "--log-level", "warning", "--no-access-log"],
+                            cwd=BACKEND_DIR, env=env)
+    for _ in range(100):
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return proc, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    sys.exit("uvicorn no respondió /health (¿pip install starlette asyncpg uvicorn?)")
+
+
+class SlowConnection(http.client.HTTPConnection):
+    """Conexión con SO_RCVBUF chico fijado antes de conectar (la ventana TCP se negocia ahí)."""
+
+    def __init__(self, *args, rcvbuf=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rcvbuf = rcvbuf
+
+    def connect(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if self.rcvbuf:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+        sock.settimeout(self.timeout)
+        sock.connect((self.host, self.port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = sock
+
+
+def login(base, username, password):
+    host, port = base.rsplit("//", 1)[1].split(":")
+    conn = http.client.HTTPConnection(host, int(port), timeout=30)
+    conn.request("POST", "/auth/login", body=json.dumps({"username": username, "password": password}),
+                 headers={"Content-Type": "application/json"})
+    resp = conn.getresponse()
+    body = resp.read()
+    if resp.status != 200:
+        sys.exit(f"Login de {username} falló ({resp.status}): ¿corrió bench.seed?")
+    return json.loads(body)["token"]
+
+
+def run_level(base, token, path, concurrency, duration, read_kbps, rss):
+    host, port = base.rsplit("//", 1)[1].split(":")
+    headers = {"Authorization": f"Bearer {token}", "Accept-Encoding": "gzip"}
+    latencies, outcomes = [], {"errors": 0, "rejected": 0}
+    nbytes = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    delay = SLOW_READ_CHUNK / (read_kbps * 1024) if read_kbps else 0
+
+    def worker():
+        conn = None
+        while time.perf_counter() < deadline:
+            if conn is None:
+                conn = SlowConnection(host, int(port), timeout=120, rcvbuf=SLOW_RCVBUF if read_kbps else None)
+            t0 = time.perf_counter()
+            try:
+                conn.request("GET", path, headers=headers)
+                resp = conn.getresponse()
+                if delay:
+                    size = 0
+                    while chunk := resp.read(SLOW_READ_CHUNK):
+                        size += len(chunk)
+                        time.sleep(delay)
+                else:
+                    size = len(resp.read())
+                status = resp.status
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                conn = None
+                status = None
+            elapsed = time.perf_counter() - t0
+            with lock:
+                if status == 200:
+                    latencies.append(elapsed)
+                    nbytes[0] += size
+                elif status == 503:
+                    outcomes["rejected"] += 1
+                else:
+                    outcomes["errors"] += 1
+        if conn is not None:
+            conn.close()
+
+    rss.reset()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    r = summarize(latencies, outcomes["errors"] + outcomes["rejected"], wall)
+    r.update(concurrency=concurrency, rejected=outcomes["rejected"], peak_rss_mb=rss.peak_mb(),
+             mb_per_s=round(nbytes[0] / wall / 1e6, 2))
+    return r
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"), required=not os.getenv("DATABASE_URL"))
+    parser.add_argument("--username", default="bench_1")
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--path", default="/plan-maestro?limit=1000")
+    parser.add_argument("--levels", default="1,8,32,128,256", help="concurrencias, separadas por coma")
+    parser.add_argument("--duration", type=float, default=15, help="segundos por nivel")
+    parser.add_argument("--read-kbps", type=float, default=0, help="velocidad de lectura por cliente (0 = sin límite)")
+    parser.add_argument("--modes", default="flask,asgi")
+    parser.add_argument("--json", help="guardar resultados en este archivo")
+    args = parser.parse_args()
+
+    levels = [int(x) for x in args.levels.split(",")]
+    starters = {"flask": start_local_server, "asgi": start_asgi_server}
+    result = {"meta": {"commit": git_commit(), "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                       "path": args.path, "duration": args.duration, "read_kbps": args.read_kbps}}
+    for mode in args.modes.split(","):
+        proc, base = starters[mode](args.dsn)
+        try:
+            token = login(base, args.username, args.password)
+            rss = RssSampler(proc.pid)
+            print(f"\n{mode}: GET {args.path}" + (f" leyendo a {args.read_kbps:g} KB/s" if args.read_kbps else ""))
+            print(f"{'clientes':>9}{'req/s':>9}{'MB/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+                  f"{'503':>6}{'err':>6}{'RSS MB':>9}")
+            result[mode] = []
+            for concurrency in levels:
+                r = run_level(base, token, args.path, concurrency, args.duration, args.read_kbps, rss)
+                result[mode].append(r)
+                print(f"{concurrency:>9}{r['throughput_rps']:>9}{r['mb_per_s']:>8}{r['p50_ms']:>9}{r['p95_ms']:>9}"
+                      f"{r['p99_ms']:>9}{r['rejected']:>6}{r['errors'] - r['rejected']:>6}{str(r['peak_rss_mb']):>9}")
+            rss.running = False
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Benchmark de descargas /uploads: throughput y ocupación de workers para
+archivos de 1 MB y 200 MB.
+
+    cd backend
+    python -m bench.uploads                        # servidor local, directo vs accel
+    python -m bench.uploads --url https://host:8002 --path blobs/ab/<sha>.pdf
+
+Sin --url levanta app1 en un servidor WSGI con threads sobre un directorio
+temporal y mide, por modo, cuánto tiempo pasa cada request dentro de la app
+(ocupación = workers ocupados en promedio). En modo "accel" la app sólo
+responde cabeceras (X-Accel-Redirect): no hay proxy que entregue los bytes,
+así que se mide el costo del worker, no el throughput. Con --url se descarga
+desde un despliegue real (con o sin nginx delante).
+"""
+import argparse
+import json
+import os
+import shutil
+import ssl
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.login import run_level
+
+MB = 1024 * 1024
+READ_SIZE = 256 * 1024
+
+
+class BusyMeter:
+    """Middleware WSGI: suma el tiempo que cada request ocupa un worker (hasta close())."""
+
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.busy = 0.0
+
+    def reset(self):
+        with self.lock:
+            self.busy = 0.0
+
+    def __call__(self, environ, start_response):
+        t0 = time.perf_counter()
+        body = self.app(environ, start_response)
+        meter = self
+
+        class Tracked:
+            def __iter__(self):
+                return iter(body)
+
+            def close(self):
+                if hasattr(body, "close"):
+                    body.close()
+                with meter.lock:
+                    meter.busy += time.perf_counter() - t0
+
+        return Tracked()
+
+
+def make_fixtures(folder, sizes_mb):
+    """Crea blobs de los tamaños pedidos; devuelve {etiqueta: ruta relativa}."""
+    paths = {}
+    for size in sizes_mb:
+        digest = f"{size:064x}"
+        rel = f"blobs/{digest[:2]}/{digest}.pdf"
+        full = os.path.join(folder, rel)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        chunk = os.urandom(MB)
+        with open(full, "wb") as f:
+            for _ in range(size):
+                f.write(chunk)
+        paths[f"{size}MB"] = rel
+    return paths
+
+
+def download_target(base_url, path, counter, range_header=None):
+    ctx = ssl.create_default_context()
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+    url = base_url.rstrip("/") + "/uploads/" + path
+    headers = {"Range": range_header} if range_header else {}
+
+    def download():
+        req = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(req, context=ctx, timeout=600) as resp:
+                received = 0
+                while True:
+                    chunk = resp.read(READ_SIZE)
+                    if not chunk:
+                        break
+                    received += len(chunk)
+            with counter["lock"]:
+                counter["bytes"] += received
+            return "ok"
+        except urllib.error.HTTPError as e:
+            return "rejected" if e.code in (429, 503) else "error"
+        except OSError:
+            return "error"
+
+    return download
+
+
+def run_scenario(base_url, path, level, total, meter=None, range_header=None):
+    counter = {"bytes": 0, "lock": threading.Lock()}
+    if meter:
+        meter.reset()
+    t0 = time.perf_counter()
+    r = run_level(download_target(base_url, path, counter, range_header), level, total)
+    wall = time.perf_counter() - t0
+    r["mb_per_s"] = round(counter["bytes"] / MB / wall, 1)
+    if meter:
+        r["worker_ms_per_req"] = round(meter.busy / total * 1000, 2)
+        r["occupancy"] = round(meter.busy / wall, 2)
+    return r
+
+
+def local_server(folder):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    import app1
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    app1.app.config["UPLOAD_FOLDER"] = folder
+    meter = BusyMeter(app1.app.wsgi_app)
+    app1.app.wsgi_app = meter
+    server = make_server("127.0.0.1", 0, app1.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return app1, server, meter, f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,200", help="tamaños en MB (local)")
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--requests", type=int, default=16, help="descargas por nivel")
+    parser.add_argument("--url")
+    parser.add_argument("--path", action="append", help="archivo bajo /uploads (con --url)")
+    parser.add_argument("--json", help="guardar resultados en este archivo")
+    args = parser.parse_args()
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    folder = None
+    if args.url:
+        meter = None
+        scenarios = [("remote", args.url, p, p) for p in args.path or []]
+    else:
+        folder = tempfile.mkdtemp(prefix="bench-uploads-")
+        app1, server, meter, base = local_server(folder)
+        files = make_fixtures(folder, [int(s) for s in args.sizes.split(",")])
+        scenarios = [(mode, base, label, rel) for mode in ("direct", "accel") for label, rel in files.items()]
+
+    results = []
+    print(f"{'modo':<8}{'archivo':<12}{'conc':>6}{'ok':>5}{'err':>5}{'req/s':>9}{'MB/s':>9}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'worker ms':>11}{'ocup.':>7}")
+    try:
+        for mode, base, label, path in scenarios:
+            if not args.url:
+                app1.UPLOADS_ACCEL = "nginx" if mode == "accel" else ""
+            for level in levels:
+                r = run_scenario(base, path, level, args.requests, meter)
+                r.update(mode=mode, file=label)
+                results.append(r)
+                print(f"{mode:<8}{label[:11]:<12}{level:>6}{r['ok']:>5}{r['error']:>5}{r['throughput_rps']:>9}"
+                      f"{r['mb_per_s']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}"
+                      f"{r.get('worker_ms_per_req', '-'):>11}{r.get('occupancy', '-'):>7}")
+    finally:
+        if folder:
+            server.shutdown()
+            shutil.rmtree(folder, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
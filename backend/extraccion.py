@@ -0,0 +1,82 @@
+"""
+Extracción de texto de archivos subidos (PDF, DOCX, texto plano).
+
+Se ejecuta en los procesos del pool de indexer.py: no importa app1 para que
+los workers arranquen livianos. PDF usa pypdf si está instalado, o el
+comando pdftotext (poppler-utils) como alternativa.
+"""
+import html
+import os
+import re
+import shutil
+import subprocess
+import zipfile
+
+INDEX_MAX_CHARS = int(os.getenv("INDEX_MAX_CHARS", "400000"))  # tsvector admite hasta 1 MB
+PDFTOTEXT_TIMEOUT = 300
+
+TEXT_EXTENSIONS = (".txt", ".csv", ".md")
+
+
+class SinTexto(Exception):
+    """El archivo no tiene texto extraíble (tipo no soportado, escaneado, etc.): no se reintenta."""
+
+
+def _read_plain(path):
+    with open(path, "rb") as f:
+        raw = f.read()
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("latin-1")
+
+
+def _read_docx(path):
+    try:
+        with zipfile.ZipFile(path) as z:
+            xml = z.read("word/document.xml").decode("utf-8")
+    except (zipfile.BadZipFile, KeyError):
+        raise SinTexto("DOCX inválido")
+    xml = re.sub(r"</w:p>|<w:br[^>]*/>|<w:tab[^>]*/>", "\n", xml)
+    return html.unescape(re.sub(r"<[^>]+>", "", xml))
+
+
+def _read_pdf(path):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        PdfReader = None
+    if PdfReader is not None:
+        reader = PdfReader(path)
+        parts, size = [], 0
+        for page in reader.pages:
+            text = page.extract_text() or ""
+            parts.append(text)
+            size += len(text)
+            if size >= INDEX_MAX_CHARS:
+                break
+        return "\n".join(parts)
+    if shutil.which("pdftotext"):
+        out = subprocess.run(["pdftotext", "-enc", "UTF-8", path, "-"], capture_output=True,
+                             timeout=PDFTOTEXT_TIMEOUT, check=True)
+        return out.stdout.decode("utf-8", errors="replace")
+    raise SinTexto("Sin extractor de PDF (instalar pypdf o poppler-utils)")
+
+
+def extraer_texto(path):
+    """Devuelve {"texto", "bytes"} con el texto normalizado y el tamaño leído."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".pdf":
+        text = _read_pdf(path)
+    elif ext == ".docx":
+        text = _read_docx(path)
+    elif ext in TEXT_EXTENSIONS:
+        text = _read_plain(path)
+    else:
+        raise SinTexto(f"Tipo no soportado: {ext or 'sin extensión'}")
+
+    # Postgres no admite NUL en TEXT; espacios colapsados para no inflar el índice
+    text = re.sub(r"\s+", " ", text.replace("\x00", " ")).strip()[:INDEX_MAX_CHARS]
+    if not text:
+        raise SinTexto("El archivo no contiene texto")
+    return {"texto": text, "bytes": os.path.getsize(path)}
@@ -0,0 +1,253 @@
+"""
+Indexador de documentos: consume cola_indexacion, extrae el texto de los
+archivos en un pool de procesos y lo guarda en textos_indexados, donde
+/repositorio/search lo encuentra.
+
+    cd backend
+    python indexer.py                 # procesa la cola hasta Ctrl+C / SIGTERM
+    python indexer.py --backfill      # además encola archivos subidos antes del indexador
+
+Varios indexadores pueden correr a la vez: los trabajos se toman con
+FOR UPDATE SKIP LOCKED. Un trabajo tomado por un indexador que murió vuelve a
+la cola al vencer INDEX_LEASE_SECONDS. Los fallos se reintentan con backoff
+exponencial hasta INDEX_MAX_ATTEMPTS; los archivos sin texto no se reintentan.
+La extracción nunca corre en el servidor web: add_repositorio y upload_file
+sólo insertan el trabajo y hacen NOTIFY.
+"""
+import argparse
+import os
+import select
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+
+from extraccion import SinTexto, extraer_texto
+
+INDEX_WORKERS = int(os.getenv("INDEX_WORKERS", "2"))
+INDEX_BATCH = int(os.getenv("INDEX_BATCH", str(INDEX_WORKERS * 2)))  # trabajos en vuelo
+INDEX_MAX_ATTEMPTS = int(os.getenv("INDEX_MAX_ATTEMPTS", "5"))
+INDEX_BACKOFF_BASE = float(os.getenv("INDEX_BACKOFF_BASE", "30"))
+INDEX_BACKOFF_MAX = float(os.getenv("INDEX_BACKOFF_MAX", "3600"))
+INDEX_LEASE_SECONDS = float(os.getenv("INDEX_LEASE_SECONDS", "900"))
+INDEX_POLL_SECONDS = float(os.getenv("INDEX_POLL_SECONDS", "5"))
+INDEX_STATS_INTERVAL = float(os.getenv("INDEX_STATS_INTERVAL", "60"))
+
+CHANNEL = "cola_indexacion"
+
+
+class Contadores:
+    """Throughput por etapa (toma, extracción, guardado), impreso cada INDEX_STATS_INTERVAL."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started = time.monotonic()
+        self.counts = {"tomados": 0, "extraidos": 0, "guardados": 0, "reintentos": 0,
+                       "fallidos": 0, "sin_texto": 0}
+        self.bytes = 0
+        self.extract_seconds = 0.0
+        self.store_seconds = 0.0
+
+    def report(self):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        c = self.counts
+        extract_ms = self.extract_seconds / c["extraidos"] * 1000 if c["extraidos"] else 0
+        store_ms = self.store_seconds / c["guardados"] * 1000 if c["guardados"] else 0
+        print(f"[indexador] {elapsed:.0f}s: " + " ".join(f"{k}={v}" for k, v in c.items())
+              + f" | extracción {c['extraidos'] / elapsed:.2f} docs/s {self.bytes / elapsed / 1048576:.2f} MB/s"
+              f" {extract_ms:.0f} ms/doc | guardado {store_ms:.1f} ms/doc", flush=True)
+        self.reset()
+
+
+def claim_jobs(app1, n):
+    with app1.db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        # Trabajos abandonados que ya agotaron los intentos: no se vuelven a tomar
+        cur.execute("""
+            UPDATE cola_indexacion
+            SET estado = 'error', ultimo_error = 'Tiempo de procesamiento excedido', updated_at = NOW()
+            WHERE estado = 'procesando' AND intentos >= %s
+              AND tomado_en < NOW() - make_interval(secs => %s)
+        """, (INDEX_MAX_ATTEMPTS, INDEX_LEASE_SECONDS))
+        cur.execute("""
+            UPDATE cola_indexacion c
+            SET estado = 'procesando', intentos = c.intentos + 1, tomado_en = NOW(), updated_at = NOW()
+            WHERE c.id IN (
+                SELECT id FROM cola_indexacion
+                WHERE (estado = 'pendiente' AND disponible_en <= NOW())
+                   OR (estado = 'procesando' AND tomado_en < NOW() - make_interval(secs => %s))
+                ORDER BY disponible_en, id
+                FOR UPDATE SKIP LOCKED
+                LIMIT %s
+            )
+            RETURNING c.id, c.documento_id, c.repositorio_id, c.ruta_archivo, c.intentos
+        """, (INDEX_LEASE_SECONDS, n))
+        jobs = cur.fetchall()
+        conn.commit()
+    return jobs
+
+
+def store_text(app1, job, texto):
+    owner = "repositorio_id" if job["repositorio_id"] else "documento_id"
+    with app1.db_connection() as conn, conn.cursor() as cur:
+        cur.execute(f"""
+            INSERT INTO textos_indexados ({owner}, texto) VALUES (%s, %s)
+            ON CONFLICT ({owner}) DO UPDATE SET texto = EXCLUDED.texto, indexed_at = NOW()
+        """, (job[owner], texto))
+        if job["repositorio_id"]:
+            cur.execute("UPDATE repositorio_documentos SET estado_procesamiento = 'Indexado' WHERE id = %s",
+                        (job["repositorio_id"],))
+        cur.execute("UPDATE cola_indexacion SET estado = 'hecho', ultimo_error = NULL, updated_at = NOW() WHERE id = %s",
+                    (job["id"],))
+        conn.commit()
+
+
+def fail_job(app1, job, error, permanent=False):
+    """Reprograma el trabajo con backoff, o lo cierra si es permanente o agotó intentos. Devuelve la etapa."""
+    with app1.db_connection() as conn, conn.cursor() as cur:
+        if permanent or job["intentos"] >= INDEX_MAX_ATTEMPTS:
+            estado, doc_estado = ("sin_texto", "Sin texto") if permanent else ("error", "Error")
+            cur.execute("UPDATE cola_indexacion SET estado = %s, ultimo_error = %s, updated_at = NOW() WHERE id = %s",
+                        (estado, error, job["id"]))
+            if job["repositorio_id"]:
+                cur.execute("UPDATE repositorio_documentos SET estado_procesamiento = %s WHERE id = %s",
+                            (doc_estado, job["repositorio_id"]))
+            result = "sin_texto" if permanent else "fallidos"
+        else:
+            delay = min(INDEX_BACKOFF_BASE * 2 ** (job["intentos"] - 1), INDEX_BACKOFF_MAX)
+            cur.execute("""
+                UPDATE cola_indexacion
+                SET estado = 'pendiente', ultimo_error = %s, updated_at = NOW(),
+                    disponible_en = NOW() + make_interval(secs => %s)
+                WHERE id = %s
+            """, (error, delay, job["id"]))
+            result = "reintentos"
+        conn.commit()
+    return result
+
+
+def release_jobs(app1, jobs):
+    """Al apagar: devuelve a la cola lo tomado y no terminado, sin gastar el intento."""
+    if not jobs:
+        return
+    with app1.db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            UPDATE cola_indexacion SET estado = 'pendiente', intentos = GREATEST(intentos - 1, 0), updated_at = NOW()
+            WHERE id = ANY(%s) AND estado = 'procesando'
+        """, ([job["id"] for job in jobs],))
+        conn.commit()
+
+
+def backfill(app1):
+    with app1.db_connection() as conn, conn.cursor() as cur:
+        for owner, table in (("repositorio_id", "repositorio_documentos"), ("documento_id", "documentos")):
+            cur.execute(f"""
+                INSERT INTO cola_indexacion ({owner}, ruta_archivo)
+                SELECT d.id, d.ruta_archivo FROM {table} d
+                WHERE d.ruta_archivo IS NOT NULL
+                  AND NOT EXISTS (SELECT 1 FROM cola_indexacion c WHERE c.{owner} = d.id)
+                  AND NOT EXISTS (SELECT 1 FROM textos_indexados t WHERE t.{owner} = d.id)
+            """)
+            print(f"[indexador] backfill {table}: {cur.rowcount} trabajos encolados")
+        conn.commit()
+
+
+def listen_connection(app1):
+    conn = psycopg2.connect(app1.DB_CONNECTION_STRING)
+    conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    with conn.cursor() as cur:
+        cur.execute(f"LISTEN {CHANNEL}")
+    return conn
+
+
+def wait_for_work(conn, timeout):
+    """Duerme hasta un NOTIFY de un upload nuevo o hasta timeout (reintentos programados)."""
+    if select.select([conn], [], [], timeout)[0]:
+        conn.poll()
+        conn.notifies.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backfill", action="store_true", help="encolar archivos existentes sin indexar")
+    args = parser.parse_args()
+
+    # app1 se importa aquí y no arriba: los procesos del pool sólo cargan extraccion
+    import app1
+
+    if args.backfill:
+        backfill(app1)
+
+    running = [True]
+    signal.signal(signal.SIGTERM, lambda *_: running.__setitem__(0, False))
+
+    listener = listen_connection(app1)
+    pool = ProcessPoolExecutor(max_workers=INDEX_WORKERS)
+    in_flight = {}  # future -> (job, enviado_en)
+    stats = Contadores()
+    print(f"[indexador] {INDEX_WORKERS} procesos, hasta {INDEX_BATCH} trabajos en vuelo", flush=True)
+
+    try:
+        while running[0]:
+            free = INDEX_BATCH - len(in_flight)
+            if free > 0:
+                for job in claim_jobs(app1, free):
+                    path = os.path.join(app1.app.config['UPLOAD_FOLDER'], job["ruta_archivo"])
+                    try:
+                        future = pool.submit(extraer_texto, path)
+                    except BrokenProcessPool:
+                        pool = ProcessPoolExecutor(max_workers=INDEX_WORKERS)
+                        future = pool.submit(extraer_texto, path)
+                    in_flight[future] = (job, time.monotonic())
+                    stats.counts["tomados"] += 1
+
+            if not in_flight:
+                wait_for_work(listener, INDEX_POLL_SECONDS)
+            else:
+                done, _ = wait(in_flight, timeout=INDEX_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    job, submitted = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                        stats.counts["extraidos"] += 1
+                        stats.bytes += result["bytes"]
+                        stats.extract_seconds += time.monotonic() - submitted
+                        t0 = time.monotonic()
+                        store_text(app1, job, result["texto"])
+                        stats.store_seconds += time.monotonic() - t0
+                        stats.counts["guardados"] += 1
+                    except SinTexto as e:
+                        stats.counts[fail_job(app1, job, str(e), permanent=True)] += 1
+                    except FileNotFoundError:
+                        stats.counts[fail_job(app1, job, "Archivo no encontrado", permanent=True)] += 1
+                    except BrokenProcessPool as e:
+                        broken = True
+                        stats.counts[fail_job(app1, job, f"Proceso de extracción caído: {e}")] += 1
+                    except Exception as e:
+                        stats.counts[fail_job(app1, job, f"{type(e).__name__}: {e}")] += 1
+
+                if broken:
+                    # Un PDF que mata al worker rompe todo el pool: se recrea y lo que quedaba en él se reintenta
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = ProcessPoolExecutor(max_workers=INDEX_WORKERS)
+
+            if time.monotonic() - stats.started >= INDEX_STATS_INTERVAL:
+                stats.report()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("[indexador] deteniendo...", flush=True)
+        pool.shutdown(wait=False, cancel_futures=True)
+        release_jobs(app1, [job for job, _ in in_flight.values()])
+        listener.close()
+        stats.report()
+
+
+if __name__ == "__main__":
+    main()
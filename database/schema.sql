@@ -1,6 +1,23 @@
 -- Esquema de Base de Datos para Gestión de Consultorías (GWP)
 -- Dialecto: PostgreSQL
 -- Enfoque: Simplificado, sin roles, solo usuarios simples.
+--
+-- Después de cargar este archivo correr "python backend/migraciones.py": lo que
+-- aquí ya existe se saltea y se crean los triggers que se generan en
+-- migraciones.py (no se copian aquí para que no se desincronicen).
+
+-- Búsqueda de texto: español sin acentos (es_unaccent) y trigramas
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE TEXT SEARCH CONFIGURATION es_unaccent (COPY = spanish);
+ALTER TEXT SEARCH CONFIGURATION es_unaccent
+    ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+
+-- unaccent() no es IMMUTABLE; este envoltorio permite usarlo en índices
+CREATE OR REPLACE FUNCTION inmutable_unaccent(text)
+RETURNS text AS $$ SELECT public.unaccent('public.unaccent', $1) $$
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT;
 
 -- 1. Tabla de Usuarios (Simple, sin roles)
 CREATE TABLE usuarios (
@@ -12,6 +29,26 @@ CREATE TABLE usuarios (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- 1b. Sesiones (token hasheado, expiración deslizante)
+CREATE TABLE sesiones (
+    token_hash CHAR(64) PRIMARY KEY,
+    usuario_id INTEGER NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    last_seen_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+CREATE INDEX idx_sesiones_expires_at ON sesiones(expires_at);
+
+-- 1c. Tickets de un solo uso para GET /events (EventSource no manda headers)
+CREATE TABLE tickets_sesion (
+    ticket_hash CHAR(64) PRIMARY KEY,
+    token_hash CHAR(64) NOT NULL REFERENCES sesiones(token_hash) ON DELETE CASCADE,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+CREATE INDEX idx_tickets_sesion_token ON tickets_sesion(token_hash);
+
 -- 2. Tabla Principal: Plan Maestro
 CREATE TABLE plan_maestro (
     id SERIAL PRIMARY KEY,
@@ -33,6 +70,13 @@ CREATE TABLE plan_maestro (
     
     status VARCHAR(50) DEFAULT 'Pendiente',
     has_file_uploaded BOOLEAN DEFAULT FALSE,
+
+    -- Contadores mantenidos por triggers (ver más abajo)
+    n_hitos INTEGER NOT NULL DEFAULT 0,
+    n_hitos_pendientes INTEGER NOT NULL DEFAULT 0,
+    n_documentos INTEGER NOT NULL DEFAULT 0,
+    n_observaciones INTEGER NOT NULL DEFAULT 0,
+    last_activity_at TIMESTAMP WITH TIME ZONE,
     
     fecha_inicio DATE,
     fecha_fin DATE,
@@ -41,7 +85,9 @@ CREATE TABLE plan_maestro (
     created_by INTEGER REFERENCES usuarios(id),
     updated_by INTEGER REFERENCES usuarios(id),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    -- txid de la última escritura (sync por ?since=, migración 12)
+    updated_txid BIGINT
 );
 
 CREATE INDEX idx_plan_activity_code ON plan_maestro(activity_code);
@@ -63,20 +109,28 @@ CREATE TABLE hitos (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Índices de migraciones.py (versiones 1-3), para instalaciones nuevas
+CREATE INDEX idx_hitos_plan_fecha ON hitos(plan_maestro_id, fecha_estimada);
+CREATE INDEX idx_hitos_orden ON hitos((COALESCE(fecha_estimada, 'infinity'::date)), id);
+
 -- 4. Tabla de Documentos
 CREATE TABLE documentos (
     id SERIAL PRIMARY KEY,
     plan_maestro_id INTEGER NOT NULL REFERENCES plan_maestro(id) ON DELETE CASCADE,
     
     nombre_archivo VARCHAR(255) NOT NULL,
-    ruta_archivo TEXT NOT NULL,
-    tipo_archivo VARCHAR(50),
+    ruta_archivo TEXT NOT NULL, -- blobs/<aa>/<sha256>.<ext> (ver archivos_blob)
+    tipo_archivo VARCHAR(255), -- MIME type
     tamano_bytes BIGINT,
     
     uploaded_by INTEGER REFERENCES usuarios(id),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE INDEX idx_documentos_plan_created ON documentos(plan_maestro_id, created_at DESC);
+CREATE INDEX idx_documentos_created ON documentos(created_at DESC, id DESC);
+CREATE INDEX idx_documentos_uploaded_by ON documentos(uploaded_by);
+
 -- 5. Tabla de Observaciones (Bitácora)
 CREATE TABLE observaciones (
     id SERIAL PRIMARY KEY,
@@ -84,10 +138,13 @@ CREATE TABLE observaciones (
     usuario_id INTEGER REFERENCES usuarios(id),
     texto TEXT NOT NULL,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE INDEX idx_observaciones_plan_created ON observaciones(plan_maestro_id, created_at DESC);
+CREATE INDEX idx_observaciones_created ON observaciones(created_at DESC, id DESC);
+CREATE INDEX idx_observaciones_usuario ON observaciones(usuario_id);
+
 -- 6. Tabla de Repositorio de Documentos Estratégicos (Biblioteca)
 CREATE TABLE repositorio_documentos (
     id SERIAL PRIMARY KEY, -- id_documento
@@ -96,18 +153,75 @@ CREATE TABLE repositorio_documentos (
     descripcion TEXT, -- Resumen ejecutivo
     puntos_clave TEXT, -- JSON o Texto plano con bullets
     ruta_archivo VARCHAR(500), -- Path local uploads
+    tipo_archivo VARCHAR(255), -- MIME type
+    tamano_bytes BIGINT,
     fecha_publicacion DATE, -- anno_publicacion
     fuente_origen VARCHAR(100), -- CONAF, MMA, etc.
     tipo_fuente VARCHAR(50), -- Gobierno, Privado, ONG, etc.
     enlace_externo VARCHAR(500), -- URL Web
-    estado_procesamiento VARCHAR(50) DEFAULT 'Pendiente', -- Pendiente, Resumido, Indexado
+    estado_procesamiento VARCHAR(50) DEFAULT 'Pendiente', -- Pendiente, Resumido, Indexado, Sin texto, Error
     etiquetas VARCHAR(255), -- Tags separados por coma
     
     uploaded_by INTEGER REFERENCES usuarios(id),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+
+    -- Texto indexado para /repositorio/search (pesos: título > etiquetas > contenido > fuente)
+    busqueda tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('es_unaccent', coalesce(titulo, '')), 'A') ||
+        setweight(to_tsvector('es_unaccent', coalesce(etiquetas, '')), 'B') ||
+        setweight(to_tsvector('es_unaccent', coalesce(descripcion, '') || ' ' || coalesce(puntos_clave, '')), 'C') ||
+        setweight(to_tsvector('es_unaccent', coalesce(fuente_origen, '')), 'D')
+    ) STORED
 );
 
+CREATE INDEX idx_repo_busqueda ON repositorio_documentos USING GIN (busqueda);
+CREATE INDEX idx_repo_created ON repositorio_documentos(created_at DESC, id DESC);
+CREATE INDEX idx_repo_trgm ON repositorio_documentos
+    USING GIN (inmutable_unaccent(lower(coalesce(titulo, '') || ' ' || coalesce(etiquetas, ''))) gin_trgm_ops);
+
+-- 7. Archivos almacenados por contenido (SHA-256), compartidos entre documentos
+CREATE TABLE archivos_blob (
+    ruta VARCHAR(500) PRIMARY KEY, -- blobs/<aa>/<sha256>.<ext>
+    sha256 CHAR(64) NOT NULL,
+    tamano_bytes BIGINT NOT NULL,
+    tipo_mime VARCHAR(255),
+    ref_count INTEGER NOT NULL DEFAULT 1, -- documentos que lo referencian
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 8. Cola de indexación de archivos (consumida por backend/indexer.py)
+CREATE TABLE cola_indexacion (
+    id BIGSERIAL PRIMARY KEY,
+    documento_id INTEGER REFERENCES documentos(id) ON DELETE CASCADE,
+    repositorio_id INTEGER REFERENCES repositorio_documentos(id) ON DELETE CASCADE,
+    ruta_archivo VARCHAR(500) NOT NULL,
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente', -- pendiente, procesando, hecho, error, sin_texto
+    intentos INTEGER NOT NULL DEFAULT 0,
+    disponible_en TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP, -- backoff de reintentos
+    tomado_en TIMESTAMP WITH TIME ZONE,
+    ultimo_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    CHECK (num_nonnulls(documento_id, repositorio_id) = 1)
+);
+
+CREATE INDEX idx_cola_indexacion_disponible ON cola_indexacion(disponible_en, id)
+    WHERE estado IN ('pendiente', 'procesando');
+
+-- 9. Texto extraído de los archivos, buscable
+CREATE TABLE textos_indexados (
+    id SERIAL PRIMARY KEY,
+    documento_id INTEGER UNIQUE REFERENCES documentos(id) ON DELETE CASCADE,
+    repositorio_id INTEGER UNIQUE REFERENCES repositorio_documentos(id) ON DELETE CASCADE,
+    texto TEXT NOT NULL,
+    busqueda tsvector GENERATED ALWAYS AS (to_tsvector('es_unaccent', texto)) STORED,
+    indexed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    CHECK (num_nonnulls(documento_id, repositorio_id) = 1)
+);
+
+CREATE INDEX idx_textos_indexados_busqueda ON textos_indexados USING GIN (busqueda);
+
 -- Funciones de ayuda
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -121,7 +235,44 @@ CREATE TRIGGER update_usuarios_modtime BEFORE UPDATE ON usuarios FOR EACH ROW EX
 CREATE TRIGGER update_plan_maestro_modtime BEFORE UPDATE ON plan_maestro FOR EACH ROW EXECUTE PROCEDURE update_updated_at_column();
 CREATE TRIGGER update_hitos_modtime BEFORE UPDATE ON hitos FOR EACH ROW EXECUTE PROCEDURE update_updated_at_column();
 
+-- Sync incremental del Plan Maestro (GET /plan-maestro?since=)
+CREATE INDEX idx_plan_updated_at ON plan_maestro(updated_at);
+CREATE INDEX idx_plan_updated_txid ON plan_maestro(updated_txid);
+
+-- Ventanas de calendario/Gantt (GET /plan-maestro?from=&to=), migración 5
+CREATE INDEX idx_plan_rango_fechas ON plan_maestro USING gist
+    ((daterange(LEAST(fecha_inicio, fecha_fin), GREATEST(fecha_inicio, fecha_fin), '[]')))
+    WHERE (fecha_inicio IS NOT NULL OR fecha_fin IS NOT NULL);
+CREATE INDEX idx_plan_rango_semanas ON plan_maestro USING gist
+    ((int4range(LEAST(week_start, week_end), GREATEST(week_start, week_end), '[]')))
+    WHERE (week_start IS NOT NULL OR week_end IS NOT NULL);
+
+-- Tombstones: ids eliminados del plan, para que los clientes los quiten
+-- Los triggers que los registran y que guardan el txid de cada escritura los
+-- crean las migraciones 8 y 12 de backend/migraciones.py.
+CREATE TABLE plan_maestro_eliminados (
+    id INTEGER PRIMARY KEY,
+    deleted_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    deleted_txid BIGINT
+);
+
+CREATE INDEX idx_plan_eliminados_deleted_at ON plan_maestro_eliminados(deleted_at);
+CREATE INDEX idx_plan_eliminados_deleted_txid ON plan_maestro_eliminados(deleted_txid);
+
+-- Feed de cambios en tiempo real (GET /events): la secuencia cambios_seq, la
+-- función notificar_cambios() y sus triggers por sentencia en plan_maestro,
+-- hitos, documentos y observaciones los genera CHANGE_FEED_SQL en la
+-- migración 4 de backend/migraciones.py (con el límite CHANGE_FEED_MAX_ROWS).
+
+-- Contadores por actividad (n_hitos, n_hitos_pendientes, n_documentos,
+-- n_observaciones, last_activity_at, has_file_uploaded): las columnas están en
+-- plan_maestro; los triggers por sentencia que los mantienen los genera
+-- counter_trigger_sql en la migración 6 de backend/migraciones.py
+-- (--reconcile repara desvíos).
 
+-- Versión por tabla de la caché de listados de app1 (versiones_tablas y su
+-- trigger diferido, que avisa por pg_notify al hacer commit): migraciones 7,
+-- 11 y 14 de backend/migraciones.py, que se aplican después de este archivo.
 
 CREATE OR REPLACE FUNCTION actualizar_plan_maestro_por_fecha()
 RETURNS void AS $$
@@ -9,6 +9,7 @@ const App = {
 
         // Initial View
         App.navigate('dashboard');
+        LiveUpdates.connect();
     },
 
     setupNavigation: () => {
@@ -20,7 +21,8 @@ const App = {
             });
         });
 
-        document.getElementById('btnLogout').addEventListener('click', () => {
+        document.getElementById('btnLogout').addEventListener('click', async () => {
+            await API.post('/auth/logout'); // Revoke server-side session
             localStorage.clear();
             window.location.href = 'index.html';
         });
@@ -72,16 +74,26 @@ const App = {
 const API = {
     // Should match backend port
     BASE: 'https://186.67.61.251:8002',
+    // Versiones de tabla ya confirmadas que esta pestaña vio (X-Data-Version de
+    // sus escrituras, "version" de /events). Se reenvían en cada GET para que
+    // la caché de listados del servidor nunca devuelva algo anterior.
+    dataVersion: {},
 
-    request: async (endpoint, method = 'GET', body = null) => {
+    request: async (endpoint, method = 'GET', body = null, onResponse = null) => {
         const token = localStorage.getItem('token');
         const headers = { 'Content-Type': 'application/json' };
         if (token) headers['Authorization'] = `Bearer ${token}`;
+        if (method === 'GET') {
+            const versions = Object.entries(API.dataVersion).map(([t, v]) => `${t}=${v}`).join(',');
+            if (versions) headers['X-Min-Data-Version'] = versions;
+        }
 
         try {
             const res = await fetch(`${API.BASE}${endpoint}`, {
                 method, headers, body: body ? JSON.stringify(body) : null
             });
+            API.trackVersion(res);
+            if (onResponse) onResponse(res);
 
             if (res.status === 401) {
                 localStorage.clear();
@@ -95,9 +107,99 @@ const API = {
         }
     },
     get: (url) => API.request(url, 'GET'),
+    // GET que devuelve también X-Sync-Token, el token para el próximo ?since=
+    getSynced: async (url) => {
+        let syncToken = null;
+        const data = await API.request(url, 'GET', null, res => {
+            syncToken = res.headers.get('X-Sync-Token');
+        });
+        return { data, syncToken };
+    },
     post: (url, body) => API.request(url, 'POST', body),
     put: (url, body) => API.request(url, 'PUT', body),
-    delete: (url) => API.request(url, 'DELETE')
+    delete: (url) => API.request(url, 'DELETE'),
+
+    // Para las escrituras que usan fetch directo (uploads, importación)
+    trackVersion: (res) => {
+        (res.headers.get('X-Data-Version') || '').split(',').forEach(part => {
+            const [table, version] = part.split('=');
+            API.noteVersion(table, Number(version));
+        });
+    },
+    noteVersion: (table, version) => {
+        if (table && version > (API.dataVersion[table] || 0)) API.dataVersion[table] = version;
+    }
+};
+
+// Cambios de otros usuarios en tiempo real (GET /events, Server-Sent Events).
+// Los eventos se agrupan unos instantes: el plan se actualiza con ?since= y las
+// demás vistas se recargan sólo si están visibles y dependen de la tabla.
+// La URL lleva un ticket de un solo uso, no el token de sesión: al cortarse la
+// conexión se pide otro y el servidor retoma desde el último evento recibido.
+const LiveUpdates = {
+    RETRY_MS: 3000,
+    TABLES: ['plan_maestro', 'hitos', 'documentos', 'observaciones'],
+    VIEWS: {
+        hitos: ['hitos', 'calendar'],
+        documentos: ['documents'],
+        observaciones: ['observaciones'],
+        plan_maestro: ['gantt', 'calendar', 'dashboard']
+    },
+    pending: new Set(),
+    timer: null,
+    lastEventId: null,
+
+    connect: async () => {
+        if (!localStorage.getItem('token') || !window.EventSource) return;
+        const res = await API.post('/events/ticket');
+        if (!res || !res.ticket) {
+            setTimeout(LiveUpdates.connect, LiveUpdates.RETRY_MS);
+            return;
+        }
+        let url = `${API.BASE}/events?ticket=${encodeURIComponent(res.ticket)}`;
+        if (LiveUpdates.lastEventId) url += `&last_event_id=${encodeURIComponent(LiveUpdates.lastEventId)}`;
+        const source = new EventSource(url);
+        // El ticket ya se usó: la reconexión automática de EventSource daría 401
+        source.onerror = () => {
+            source.close();
+            setTimeout(LiveUpdates.connect, LiveUpdates.RETRY_MS);
+        };
+        source.addEventListener('cambio', (e) => {
+            LiveUpdates.lastEventId = e.lastEventId;
+            LiveUpdates.queue(JSON.parse(e.data).table);
+        });
+        // "tabla:versión", llega junto con los cambios de la misma transacción
+        source.addEventListener('version', (e) => {
+            const [table, version] = e.data.split(':');
+            API.noteVersion(table, Number(version));
+        });
+        // El servidor no pudo retomar: puede faltar cualquier cosa
+        source.addEventListener('reset', () => LiveUpdates.TABLES.forEach(LiveUpdates.queue));
+    },
+
+    queue: (table) => {
+        LiveUpdates.pending.add(table);
+        clearTimeout(LiveUpdates.timer);
+        LiveUpdates.timer = setTimeout(LiveUpdates.flush, 500);
+    },
+
+    flush: () => {
+        const tables = LiveUpdates.pending;
+        LiveUpdates.pending = new Set();
+        if (tables.has('plan_maestro') && window.appData?.plan) PlanModule.applyChanges();
+
+        const views = new Set();
+        tables.forEach(table => (LiveUpdates.VIEWS[table] || []).forEach(v => views.add(v)));
+        if (!views.has(window.currentView)) return;
+        switch (window.currentView) {
+            case 'dashboard': StatsModule.init(); break;
+            case 'gantt': GanttModule.init(); break;
+            case 'calendar': CalendarModule.init(); break;
+            case 'hitos': HitosModule.init(); break;
+            case 'observaciones': ObservacionesModule.loadData(); break;
+            case 'documents': DocumentsModule.init(); break;
+        }
+    }
 };
 
 // Modal closers
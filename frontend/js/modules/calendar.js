@@ -2,12 +2,25 @@
 const CalendarModule = {
     events: [],
     currentView: 'month',
+    // Ventana visible: WINDOW_MONTHS meses desde windowStart (día 1, UTC)
+    WINDOW_MONTHS: 3,
+    windowStart: null,
 
     init: async () => {
-        // Fetch Data
+        if (!CalendarModule.windowStart) {
+            const now = new Date();
+            CalendarModule.windowStart = new Date(Date.UTC(now.getUTCFullYear(), now.getUTCMonth(), 1));
+        }
+        const start = CalendarModule.windowStart;
+        const end = new Date(Date.UTC(start.getUTCFullYear(), start.getUTCMonth() + CalendarModule.WINDOW_MONTHS, 0));
+        const from = Utils.formatDateForInput(start);
+        const to = Utils.formatDateForInput(end);
+        CalendarModule.updateRangeLabel(start, end);
+
+        // Sólo lo que cae en la ventana (?from=&to=, filtrado en el servidor)
         const [plan, hitos] = await Promise.all([
-            API.get('/plan-maestro'),
-            API.get('/hitos')
+            API.get(`/plan-maestro?from=${from}&to=${to}`),
+            API.get(`/hitos?from=${from}&to=${to}`)
         ]);
 
         const events = [];
@@ -15,7 +28,8 @@ const CalendarModule = {
         // Process Plan Activities (End Dates)
         if (plan && Array.isArray(plan)) {
             plan.forEach(p => {
-                if (p.fecha_fin) {
+                // La actividad se superpone con la ventana, pero su entrega puede caer fuera
+                if (p.fecha_fin && p.fecha_fin >= from && p.fecha_fin <= to) {
                     events.push({
                         date: new Date(p.fecha_fin),
                         title: p.task_name,
@@ -49,6 +63,19 @@ const CalendarModule = {
         CalendarModule.render('month');
     },
 
+    shiftWindow: (months) => {
+        const start = CalendarModule.windowStart;
+        CalendarModule.windowStart = new Date(Date.UTC(start.getUTCFullYear(), start.getUTCMonth() + months, 1));
+        CalendarModule.init();
+    },
+
+    updateRangeLabel: (start, end) => {
+        const label = document.getElementById('calRangeLabel');
+        if (!label) return;
+        const fmt = (d) => d.toLocaleDateString('es-ES', { month: 'short', year: 'numeric', timeZone: 'UTC' });
+        label.textContent = `${fmt(start)} – ${fmt(end)}`;
+    },
+
     render: (view = 'month') => {
         CalendarModule.currentView = view;
         const container = document.getElementById('calendarView');
@@ -174,6 +174,7 @@ const DocumentsModule = {
                 headers: { 'Authorization': `Bearer ${token}` },
                 body: formData
             });
+            API.trackVersion(res);
             const json = await res.json();
 
             if (res.ok) {
@@ -18,7 +18,7 @@ const GanttModule = {
 
 
         // Always fetch fresh data to define single source of truth from Server
-        const data = await API.get('/plan-maestro?t=' + Date.now());
+        const data = await API.get('/plan-maestro');
         window.appData = window.appData || {};
         window.appData.plan = data;
 
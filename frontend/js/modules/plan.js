@@ -12,45 +12,70 @@ const PlanModule = {
         if (tbody) tbody.innerHTML = '<tr><td colspan="7" class="text-center p-4">Actualizando datos...</td></tr>';
 
         // Prevent cache with timestamp
-        const data = await API.get('/plan-maestro?t=' + new Date().getTime());
+        const { data, syncToken } = await API.getSynced('/plan-maestro');
         if (data) {
-            window.appData = window.appData || {};
-            window.appData.plan = data;
-
-            // Cascading Filters Setup
-            Utils.setupCascadingFilters({
-                data: data,
-                filters: [
-                    { id: 'filterProduct', key: 'product_code' },
-                    { id: 'filterResp', key: 'primary_responsible' },
-                    { id: 'filterStatus', key: 'status' }
-                    // Note: Search Input logic is complex for 1:1 key. 
-                    // We leave it out of cascade for now or handle separately?
-                    // Let's keep Search separate listener to just filter the result of Cascade?
-                    // Or pass it as custom filter. 
-                    // For simplicity, let's keep Dropdowns cascading mainly.
-                ],
-                onFilter: (filtered) => {
-                    // Apply Search Text Filter manually on top
-                    const search = document.getElementById('searchPlan')?.value.toLowerCase();
-                    const final = !search ? filtered : filtered.filter(item =>
-                        (item.task_name || '').toLowerCase().includes(search) ||
-                        (item.activity_code || '').toLowerCase().includes(search)
-                    );
-                    PlanModule.renderTable(final);
-                }
-            });
-
-            // Dictionary Search Listener (non-cascading input triggers redraw)
-            document.getElementById('searchPlan')?.addEventListener('keyup', () => {
-                // Trigger change on one of the dropdowns to force re-eval? 
-                // Or just re-run render using current cascade state?
-                // The cascade "onFilter" runs when dropdowns change.
-                document.getElementById('filterProduct').dispatchEvent(new Event('change'));
-            });
+            PlanModule.syncedAt = syncToken;
+            PlanModule.showData(data);
         }
     },
 
+    // Cambios de otros usuarios (LiveUpdates): se piden sólo las filas
+    // modificadas con ?since= y se mezclan con las que ya están cargadas.
+    // syncedAt es el token de sync del servidor (X-Sync-Token / sync_token);
+    // sin él se usa el updated_at más nuevo, con la ventana de solapamiento.
+    applyChanges: async () => {
+        const plan = window.appData?.plan;
+        if (!plan) return;
+        const since = PlanModule.syncedAt ||
+            plan.reduce((max, item) => (item.updated_at > max ? item.updated_at : max), '');
+        if (!since) return PlanModule.loadData();
+
+        const delta = await API.get(`/plan-maestro?since=${encodeURIComponent(since)}`);
+        if (!delta || !delta.items) return;
+        const byId = new Map(plan.map(item => [item.id, item]));
+        delta.items.forEach(item => byId.set(item.id, item));
+        delta.deleted.forEach(id => byId.delete(id));
+        PlanModule.syncedAt = delta.sync_token || delta.server_time;
+        PlanModule.showData([...byId.values()].sort((a, b) => a.id - b.id));
+    },
+
+    showData: (data) => {
+        window.appData = window.appData || {};
+        window.appData.plan = data;
+
+        // Cascading Filters Setup
+        Utils.setupCascadingFilters({
+            data: data,
+            filters: [
+                { id: 'filterProduct', key: 'product_code' },
+                { id: 'filterResp', key: 'primary_responsible' },
+                { id: 'filterStatus', key: 'status' }
+                // Note: Search Input logic is complex for 1:1 key. 
+                // We leave it out of cascade for now or handle separately?
+                // Let's keep Search separate listener to just filter the result of Cascade?
+                // Or pass it as custom filter. 
+                // For simplicity, let's keep Dropdowns cascading mainly.
+            ],
+            onFilter: (filtered) => {
+                // Apply Search Text Filter manually on top
+                const search = document.getElementById('searchPlan')?.value.toLowerCase();
+                const final = !search ? filtered : filtered.filter(item =>
+                    (item.task_name || '').toLowerCase().includes(search) ||
+                    (item.activity_code || '').toLowerCase().includes(search)
+                );
+                PlanModule.renderTable(final);
+            }
+        });
+
+        // Dictionary Search Listener (non-cascading input triggers redraw)
+        document.getElementById('searchPlan')?.addEventListener('keyup', () => {
+            // Trigger change on one of the dropdowns to force re-eval? 
+            // Or just re-run render using current cascade state?
+            // The cascade "onFilter" runs when dropdowns change.
+            document.getElementById('filterProduct').dispatchEvent(new Event('change'));
+        });
+    },
+
 
     deleteHito: async (hitoId, planId) => {
         if (!confirm('¿Eliminar este hito?')) return;
@@ -164,6 +189,9 @@ const PlanModule = {
                     ${item.has_file_uploaded
                     ? '<div style="width:32px; height:32px; background:#eff6ff; border-radius:8px; display:inline-flex; align-items:center; justify-content:center; color:#2563eb;"><i class="fas fa-paperclip"></i></div>'
                     : '<div style="width:32px; height:32px; background:#f8fafc; border-radius:8px; display:inline-flex; align-items:center; justify-content:center; color:#cbd5e1;"><i class="fas fa-minus"></i></div>'}
+                    ${item.n_hitos !== undefined
+                    ? `<div class="text-xs text-slate-400 mt-1" title="Hitos (pendientes) · documentos · observaciones">${item.n_hitos}${item.n_hitos_pendientes ? ` (${item.n_hitos_pendientes})` : ''} · ${item.n_documentos} · ${item.n_observaciones}</div>`
+                    : ''}
                 </td>
                 <td>
                     <div class="flex gap-1 justify-center">
@@ -184,6 +212,13 @@ const PlanModule = {
         const btn = document.getElementById('btnNewActivity');
         if (btn) btn.addEventListener('click', () => PlanModule.openModal());
 
+        const importBtn = document.getElementById('btnImportPlan');
+        const importInput = document.getElementById('planImportFile');
+        if (importBtn && importInput) {
+            importBtn.onclick = () => importInput.click();
+            importInput.onchange = () => PlanModule.importFile(importInput);
+        }
+
         const form = document.getElementById('activityForm');
         if (form) {
             // Remove previous listeners using clone trick or just direct
@@ -466,6 +501,7 @@ const PlanModule = {
                 },
                 body: formData
             });
+            API.trackVersion(res);
             const json = await res.json();
 
             if (res.ok) {
@@ -480,9 +516,61 @@ const PlanModule = {
         }
     },
 
+    // --- IMPORTACIÓN ---
+    // Primero un dry_run para mostrar el resumen; sólo si se confirma se aplica
+    importFile: async (input) => {
+        const file = input.files[0];
+        if (!file) return;
+        const token = localStorage.getItem('token');
+        const send = async (query) => {
+            const formData = new FormData();
+            formData.append('file', file);
+            const res = await fetch(`${API.BASE}/plan-maestro/import${query}`, {
+                method: 'POST',
+                headers: { 'Authorization': `Bearer ${token}` },
+                body: formData
+            });
+            API.trackVersion(res);
+            return { ok: res.ok, json: await res.json() };
+        };
+        const describeErrors = (json) => (json.errors || []).slice(0, 10)
+            .map(e => `Fila ${e.row} (${e.column}): ${e.error}`).join('\n');
+
+        try {
+            const preview = await send('?dry_run=1');
+            if (!preview.ok) {
+                alert("Error: " + preview.json.error);
+                return;
+            }
+            const p = preview.json;
+            let msg = `Filas: ${p.rows}\nNuevas: ${p.created}\nModificadas: ${p.updated}\nSin cambios: ${p.unchanged}`;
+            if (p.error_count) {
+                msg += `\n\n${p.error_count} filas con errores (se omitirán):\n${describeErrors(p)}`;
+            }
+            if (!p.created && !p.updated) {
+                alert(msg + "\n\nNo hay cambios para importar.");
+                return;
+            }
+            if (!confirm(msg + "\n\n¿Importar?")) return;
+
+            const result = await send(p.error_count ? '?partial=1' : '');
+            if (!result.ok) {
+                alert("Error: " + result.json.error + "\n" + describeErrors(result.json));
+                return;
+            }
+            alert(`Importación lista: ${result.json.created} nuevas, ${result.json.updated} modificadas`);
+            PlanModule.loadData();
+        } catch (e) {
+            alert("Error de red al importar");
+        } finally {
+            input.value = '';
+        }
+    },
+
     viewDetails: async (id) => {
-        if (!window.appData.plan) return;
-        const item = window.appData.plan.find(i => i.id === id);
+        // Actividad, hitos, documentos y bitácora en un solo request
+        const full = await API.get(`/plan-maestro/${id}/full`);
+        const item = (full && full.plan) || (window.appData.plan || []).find(i => i.id === id);
         if (!item) return;
 
         // Populate Info General
@@ -591,7 +679,7 @@ const PlanModule = {
         hDiv.innerHTML = '<div style="text-align:center; padding:20px; color:#cbd5e1; font-style:italic;">Cargando línea de tiempo...</div>';
 
         try {
-            const hitos = await API.get(`/plan-maestro/${id}/hitos`);
+            const hitos = full.hitos;
             if (hitos && hitos.length > 0) {
                 hDiv.innerHTML = hitos.map(h => {
                     const isDone = h.estado === 'Completado';
@@ -650,7 +738,7 @@ const PlanModule = {
         dDiv.innerHTML = '<div style="text-align:center; padding:20px; color:#cbd5e1;">Cargando documentos...</div>';
 
         try {
-            const docs = await API.get(`/plan-maestro/${id}/documentos`);
+            const docs = full.documentos;
             if (docs && docs.length > 0) {
                 dDiv.innerHTML = docs.map(d => {
                     const isPdf = d.nombre_archivo.toLowerCase().endsWith('.pdf');
@@ -728,7 +816,7 @@ const PlanModule = {
 
             // Load Items
             try {
-                const obs = await API.get(`/plan-maestro/${id}/observaciones`);
+                const obs = full.observaciones;
                 const itemsList = document.getElementById('obsItemsList');
                 if (obs && obs.length > 0) {
                     itemsList.innerHTML = obs.map(o => `
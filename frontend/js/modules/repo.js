@@ -26,24 +26,36 @@ const RepoModule = {
     setupFilters: () => {
         const searchInput = document.getElementById('searchRepo');
         const typeSelect = document.getElementById('repoFilterType');
+        let timer = null;
+        let seq = 0;
+
+        // Text search runs server-side (/repositorio/search, ranked + snippets);
+        // with an empty box only the type filter applies over the loaded list
+        const filter = async () => {
+            const s = (searchInput?.value || '').trim();
+            const t = typeSelect?.value || '';
+
+            if (!s) {
+                const filtered = RepoModule.data.filter(item =>
+                    !t || (item.tipo_documento || '').toLowerCase().includes(t.toLowerCase()));
+                RepoModule.render(filtered);
+                return;
+            }
 
-        const filter = () => {
-            const s = (searchInput?.value || '').toLowerCase();
-            const t = (typeSelect?.value || '').toLowerCase();
-
-            const filtered = RepoModule.data.filter(item => {
-                const matchText = (item.titulo || '').toLowerCase().includes(s) ||
-                    (item.descripcion || '').toLowerCase().includes(s) ||
-                    (item.etiquetas || '').toLowerCase().includes(s);
-
-                const matchType = !t || (item.tipo_documento || '').toLowerCase().includes(t);
+            const current = ++seq;
+            const params = new URLSearchParams({ q: s, limit: 50 });
+            if (t) params.set('tipo', t);
+            const res = await API.get(`/repositorio/search?${params}`);
+            if (current !== seq) return; // a newer keystroke already answered
+            RepoModule.render(res?.items || []);
+        };
 
-                return matchText && matchType;
-            });
-            RepoModule.render(filtered);
+        const debounced = () => {
+            clearTimeout(timer);
+            timer = setTimeout(filter, 250);
         };
 
-        if (searchInput) searchInput.addEventListener('input', filter);
+        if (searchInput) searchInput.addEventListener('input', debounced);
         if (typeSelect) typeSelect.addEventListener('change', filter);
     },
 
@@ -105,7 +117,7 @@ const RepoModule = {
                             </div>
                             <div>
                                 <span class="block text-[10px] uppercase font-bold text-slate-400 tracking-wider">${item.tipo_documento || 'Documento'}</span>
-                                <h3 class="font-bold text-slate-800 text-sm leading-tight line-clamp-2" title="${item.titulo}">${item.titulo}</h3>
+                                <h3 class="font-bold text-slate-800 text-sm leading-tight line-clamp-2" title="${item.titulo}">${item.titulo_resaltado || item.titulo}</h3>
                             </div>
                         </div>
                          <!-- Options -->
@@ -116,7 +128,7 @@ const RepoModule = {
                     </div>
 
                     <div class="text-xs text-slate-500 mb-4 line-clamp-3 h-[4.5em] leading-relaxed">
-                        ${item.descripcion || 'Sin descripción disponible.'}
+                        ${item.fragmento || item.descripcion || 'Sin descripción disponible.'}
                     </div>
 
                     <div class="flex flex-wrap gap-1 mb-4 h-[24px] overflow-hidden">
@@ -212,6 +224,7 @@ const RepoModule = {
                     headers: { 'Authorization': `Bearer ${token}`, 'Content-Type': 'application/json' },
                     body: JSON.stringify(payload)
                 });
+                API.trackVersion(res);
                 const json = await res.json();
                 if (res.ok) {
                     Utils.closeModal('repoModal');
@@ -237,6 +250,7 @@ const RepoModule = {
                 headers: { 'Authorization': `Bearer ${token}` },
                 body: formData
             });
+            API.trackVersion(res);
             const json = await res.json();
 
             if (res.ok) {
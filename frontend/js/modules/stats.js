@@ -3,44 +3,29 @@ const StatsModule = {
     charts: {},
 
     init: async () => {
-        // Ensure data exists
-        if (!window.appData?.plan) {
-            await PlanModule.loadData();
+        // KPIs aggregated server-side (/stats) instead of downloading plan + hitos
+        const stats = await API.get('/stats');
+        if (!stats || stats.error) {
+            console.log('Error fetching stats');
+            return;
         }
-        const plan = window.appData.plan || [];
-
-        // Also fetch milestones specifically if needed, but let's count from plan for now or fetch
-        // For Hitos Total, we can fetch /hitos count or assume. Let's fetch to be accurate.
-        let hitosCount = 0;
-        try {
-            const hRes = await API.get('/hitos'); // Assuming endpoint returns all
-            hitosCount = hRes ? hRes.length : 0;
-        } catch (e) { console.log('Error fetching hitos stats'); }
-
-        StatsModule.renderKPIs(plan, hitosCount);
-        StatsModule.renderCharts(plan);
-        StatsModule.renderUpcoming(plan);
-    },
 
-    renderKPIs: (data, hitosCount) => {
-        const total = data.length;
-        const done = data.filter(i => i.status === 'COMPLETADO' || i.status === 'FINALIZADO').length;
-        const process = data.filter(i => i.status === 'EN PROGRESO').length;
+        StatsModule.renderKPIs(stats);
+        StatsModule.renderCharts(stats);
+        StatsModule.renderUpcoming(stats.upcoming || []);
+    },
 
+    renderKPIs: (stats) => {
         // Animating Numbers
-        Utils.animateValue('kpiTotal', 0, total, 1000);
-        Utils.animateValue('kpiDone', 0, done, 1000);
-        Utils.animateValue('kpiProcess', 0, process, 1000);
-        Utils.animateValue('kpiMilestones', 0, hitosCount, 1000);
+        Utils.animateValue('kpiTotal', 0, stats.total, 1000);
+        Utils.animateValue('kpiDone', 0, stats.completed, 1000);
+        Utils.animateValue('kpiProcess', 0, stats.in_progress, 1000);
+        Utils.animateValue('kpiMilestones', 0, stats.milestones, 1000);
     },
 
-    renderCharts: (data) => {
+    renderCharts: (stats) => {
         // 1. Status Chart (Doughnut)
-        const statusCounts = {};
-        data.forEach(i => {
-            const s = i.status || 'PENDIENTE';
-            statusCounts[s] = (statusCounts[s] || 0) + 1;
-        });
+        const statusCounts = stats.by_status || {};
 
         const ctxStatus = document.getElementById('chartStatus');
         if (ctxStatus) {
@@ -69,20 +54,8 @@ const StatsModule = {
 
 
         // 2. Product/Component Chart (Bar)
-        // Group by product/component (extract from task_name or a field)
-        // Assuming 'product_name' isn't explicitly available, we might group by 'activity_code' prefix or similar.
-        // Actually, let's group by RESPONSABLE for better utility? Or 'product_code' if available.
-        // The endpoint returns `product_code`.
-
-        const prodCounts = {};
-        data.forEach(i => {
-            // Simplify Product Code (e.g., '1.1' from '1.1 | Coord...')
-            let p = i.product_code || 'General';
-            // Try to make it shorter
-            if (p.includes('|')) p = p.split('|')[0].trim();
-
-            prodCounts[p] = (prodCounts[p] || 0) + 1;
-        });
+        // Product code already shortened server-side ('1.1' from '1.1 | Coord...')
+        const prodCounts = stats.by_product || {};
 
         const ctxProd = document.getElementById('chartProduct');
         if (ctxProd) {
@@ -114,44 +87,34 @@ const StatsModule = {
         }
     },
 
-    renderUpcoming: (data) => {
+    renderUpcoming: (upcoming) => {
         const container = document.getElementById('statsUpcoming');
         if (!container) return;
 
-        // Filter: End date in next 30 days && Not Completed
-        const now = new Date();
-        const future = new Date();
-        future.setDate(now.getDate() + 30);
-
-        const upcoming = data.filter(i => {
-            if (!i.end_date) return false;
-            if (i.status === 'COMPLETADO') return false;
-            const d = new Date(i.end_date);
-            return d >= now && d <= future;
-        }).sort((a, b) => new Date(a.end_date) - new Date(b.end_date));
+        // Already filtered server-side: end date in next 30 days && not completed
 
         if (upcoming.length === 0) {
             container.innerHTML = '<div class="p-6 text-center text-slate-400 text-sm">No hay vencimientos próximos.</div>';
             return;
         }
 
-        container.innerHTML = upcoming.slice(0, 5).map(i => ` // Top 5
+        container.innerHTML = upcoming.map(i => `
             <div class="px-6 py-4 border-b border-slate-50 flex justify-between items-center hover:bg-slate-50 transition-colors">
                 <div class="flex items-center gap-4">
                     <div class="w-10 h-10 rounded-full bg-red-50 text-red-500 flex items-center justify-center font-bold text-xs">
-                        ${new Date(i.end_date).getDate()}
+                        ${new Date(i.fecha_fin).getUTCDate()}
                     </div>
                     <div>
                         <div class="text-sm font-bold text-slate-700 line-clamp-1">${i.task_name}</div>
                         <div class="text-xs text-slate-400 flex gap-2">
                              <span>${i.activity_code}</span>
                              <span>•</span>
-                             <span>${i.responsable || 'Sin asignar'}</span>
+                             <span>${i.primary_responsible || 'Sin asignar'}</span>
                         </div>
                     </div>
                 </div>
                 <div class="text-xs font-semibold text-slate-500 bg-slate-100 px-2 py-1 rounded">
-                    ${Utils.formatDate(i.end_date)}
+                    ${Utils.formatDate(i.fecha_fin)}
                 </div>
             </div>
         `).join('');